@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class BudgetingConfig(AppConfig):
+    name = 'budgeting'
+
+    def ready(self):
+        # Keep the maintained aggregates in sync with transaction writes
+        import budgeting.signals  # noqa
@@ -0,0 +1,219 @@
+from collections import namedtuple, defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Count
+from django.db.models.functions import TruncDate
+
+from budgeting.business.budget import BudgetProgressBusiness
+from budgeting.constants import DIRECTION
+from budgeting.models import Transaction, TransactionDailyRollup, TransactionMonthlyBalance, WalletBalanceCounter
+from common.business import to_utc_date, round_currency
+from common.query_cache import bump_generation
+
+
+class TransactionEntry(namedtuple('TransactionEntry',
+                                  ['user_id', 'wallet_id', 'category_id', 'direction', 'day', 'amount', 'count'])):
+    """
+    What one transaction, or a group of transactions sharing the same key, contributes to the aggregates.
+    """
+
+    @staticmethod
+    def from_instance(instance: Transaction):
+        return TransactionEntry(
+            user_id=instance.user_id,
+            wallet_id=instance.wallet_id,
+            category_id=instance.category_id,
+            direction=instance.direction,
+            day=to_utc_date(instance.transaction_at),
+            amount=round_currency(Decimal(str(instance.amount))),
+            count=1,
+        )
+
+    @staticmethod
+    def from_values(values: dict):
+        return TransactionEntry(
+            user_id=values['user_id'],
+            wallet_id=values['wallet_id'],
+            category_id=values['category_id'],
+            direction=values['direction'],
+            day=to_utc_date(values['transaction_at']),
+            amount=values['amount'],
+            count=1,
+        )
+
+    @staticmethod
+    def aggregate(qs) -> list:
+        rows = qs.order_by() \
+            .annotate(day=TruncDate('transaction_at')) \
+            .values('user_id', 'wallet_id', 'category_id', 'direction', 'day') \
+            .annotate(amount_sum=Sum('amount'), row_count=Count('id'))
+
+        return [TransactionEntry(
+            user_id=row['user_id'],
+            wallet_id=row['wallet_id'],
+            category_id=row['category_id'],
+            direction=row['direction'],
+            day=row['day'],
+            amount=row['amount_sum'],
+            count=row['row_count'],
+        ) for row in rows]
+
+
+ENTRY_FIELDS = ('user_id', 'wallet_id', 'category_id', 'direction', 'amount', 'transaction_at')
+
+
+def increment(model, key: dict, **deltas):
+    """
+    Add deltas to the row identified by key, creating the row if it does not exist yet.
+    """
+    changes = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**key).update(**changes):
+        return
+
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Created by a concurrent writer in between
+        model.objects.filter(**key).update(**changes)
+
+
+class TransactionAggregateBusiness:
+    @staticmethod
+    @transaction.atomic
+    def apply(removed=(), added=()):
+        """
+        Move the aggregates from the removed entries (old state of the rows) to the added ones (new state).
+        """
+        rollup = defaultdict(lambda: [Decimal(0), 0])
+        ledger = defaultdict(lambda: {DIRECTION.income: Decimal(0), DIRECTION.expense: Decimal(0)})
+        wallets = defaultdict(lambda: {DIRECTION.income: Decimal(0), DIRECTION.expense: Decimal(0)})
+        budgets = defaultdict(Decimal)
+        for sign, entries in ((-1, removed), (1, added)):
+            for entry in entries:
+                # Undated transactions still count in the wallet balance
+                wallets[(entry.user_id, entry.wallet_id or 0)][entry.direction] += sign * entry.amount
+                if entry.day is None:
+                    continue
+                key = (entry.user_id, entry.wallet_id or 0, entry.day, entry.category_id or 0, entry.direction)
+                rollup[key][0] += sign * entry.amount
+                rollup[key][1] += sign * entry.count
+                if entry.category_id:
+                    budgets[(entry.user_id, entry.wallet_id or 0, entry.category_id, entry.day)] += \
+                        sign * entry.amount
+
+                month = entry.day.replace(day=1)
+                for wallet_id in (entry.wallet_id or 0, TransactionMonthlyBalance.ALL_WALLETS):
+                    ledger[(entry.user_id, wallet_id, month)][entry.direction] += sign * entry.amount
+
+        for (user_id, wallet_id, day, category_id, direction), (amount, count) in rollup.items():
+            if not amount and not count:
+                continue
+            increment(TransactionDailyRollup,
+                      {'user_id': user_id, 'wallet_id': wallet_id, 'day': day,
+                       'category_id': category_id, 'direction': direction},
+                      amount=amount, count=count)
+
+        for (user_id, wallet_id), amounts in sorted(wallets.items()):
+            income, expense = amounts[DIRECTION.income], amounts[DIRECTION.expense]
+            if income or expense:
+                increment(WalletBalanceCounter, {'user_id': user_id, 'wallet_id': wallet_id},
+                          income_amount=income, expense_amount=expense, balance=income - expense)
+
+        # Sorted so that concurrent writers lock the ledger rows in the same order
+        for (user_id, wallet_id, month), amounts in sorted(ledger.items()):
+            TransactionAggregateBusiness.apply_monthly_balance(user_id, wallet_id, month,
+                                                               amounts[DIRECTION.income], amounts[DIRECTION.expense])
+
+        BudgetProgressBusiness.apply(budgets)
+
+        for user_id in sorted({entry.user_id for entries in (removed, added) for entry in entries}):
+            bump_generation(user_id)
+
+    @staticmethod
+    def apply_monthly_balance(user_id: int, wallet_id: int, month, income: Decimal, expense: Decimal):
+        """
+        Add income/expense to a month of the ledger and carry the net forward to the closing balance
+        of that month and of every later month, earlier months are untouched.
+        """
+        if not income and not expense:
+            return
+        net = income - expense
+
+        qs = TransactionMonthlyBalance.objects.filter(user_id=user_id, wallet_id=wallet_id)
+        if not qs.filter(month=month).exists():
+            previous_balance = qs.filter(month__lt=month).order_by('-month') \
+                .values_list('closing_balance', flat=True).first()
+            try:
+                with transaction.atomic():
+                    TransactionMonthlyBalance.objects.create(user_id=user_id, wallet_id=wallet_id, month=month,
+                                                             closing_balance=previous_balance or 0)
+            except IntegrityError:
+                # Created by a concurrent writer in between
+                pass
+
+        qs.filter(month=month).update(income_amount=F('income_amount') + income,
+                                      expense_amount=F('expense_amount') + expense)
+        if net:
+            qs.filter(month__gte=month).update(closing_balance=F('closing_balance') + net)
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild_user(user_id: int):
+        entries = TransactionEntry.aggregate(Transaction.objects.filter(user_id=user_id))
+
+        counters = defaultdict(lambda: {DIRECTION.income: Decimal(0), DIRECTION.expense: Decimal(0)})
+        for entry in entries:
+            counters[entry.wallet_id or 0][entry.direction] += entry.amount
+
+        WalletBalanceCounter.objects.filter(user_id=user_id).delete()
+        WalletBalanceCounter.objects.bulk_create([
+            WalletBalanceCounter(
+                user_id=user_id,
+                wallet_id=wallet_id,
+                income_amount=amounts[DIRECTION.income],
+                expense_amount=amounts[DIRECTION.expense],
+                balance=amounts[DIRECTION.income] - amounts[DIRECTION.expense],
+            ) for wallet_id, amounts in counters.items()
+        ])
+
+        # Undated transactions only count in the wallet balance
+        entries = [entry for entry in entries if entry.day is not None]
+
+        TransactionDailyRollup.objects.filter(user_id=user_id).delete()
+        TransactionDailyRollup.objects.bulk_create([
+            TransactionDailyRollup(
+                user_id=entry.user_id,
+                wallet_id=entry.wallet_id or 0,
+                category_id=entry.category_id or 0,
+                direction=entry.direction,
+                day=entry.day,
+                amount=entry.amount,
+                count=entry.count,
+            ) for entry in entries
+        ], batch_size=1000)
+
+        months = defaultdict(lambda: {DIRECTION.income: Decimal(0), DIRECTION.expense: Decimal(0)})
+        for entry in entries:
+            month = entry.day.replace(day=1)
+            for wallet_id in (entry.wallet_id or 0, TransactionMonthlyBalance.ALL_WALLETS):
+                months[(wallet_id, month)][entry.direction] += entry.amount
+
+        balances = []
+        closing_balances = defaultdict(Decimal)
+        for (wallet_id, month), amounts in sorted(months.items()):
+            closing_balances[wallet_id] += amounts[DIRECTION.income] - amounts[DIRECTION.expense]
+            balances.append(TransactionMonthlyBalance(
+                user_id=user_id,
+                wallet_id=wallet_id,
+                month=month,
+                income_amount=amounts[DIRECTION.income],
+                expense_amount=amounts[DIRECTION.expense],
+                closing_balance=closing_balances[wallet_id],
+            ))
+
+        TransactionMonthlyBalance.objects.filter(user_id=user_id).delete()
+        TransactionMonthlyBalance.objects.bulk_create(balances, batch_size=1000)
+
+        BudgetProgressBusiness.refresh_user(user_id)
@@ -0,0 +1,114 @@
+from django.db.models import Sum, Case, When, F, Value, BooleanField
+
+from budgeting.business.notification import BudgetingNotification
+from budgeting.constants import TASK_NOTE, NOTIFICATION_TYPE
+from budgeting.models import Budget, BudgetProgress, TransactionDailyRollup, TaskNote
+from common.business import to_utc_date
+
+
+class BudgetProgressBusiness:
+    @staticmethod
+    def refresh(budget: Budget):
+        """
+        Recompute the progress of a budget from the daily rollup, after the budget itself changed.
+        """
+        from_date, to_date = to_utc_date(budget.from_date), to_utc_date(budget.to_date)
+        current_amount = 0
+        if budget.category_id:
+            current_amount = TransactionDailyRollup.objects.filter(
+                user_id=budget.user_id,
+                wallet_id=budget.wallet_id or 0,
+                category_id=budget.category_id,
+                day__gte=from_date,
+                day__lte=to_date,
+            ).aggregate(amount_sum=Sum('amount'))['amount_sum'] or 0
+
+        BudgetProgress.objects.update_or_create(budget_id=budget.id, defaults={
+            'user_id': budget.user_id,
+            'wallet_id': budget.wallet_id or 0,
+            'category_id': budget.category_id or 0,
+            'amount': budget.amount,
+            'current_amount': current_amount,
+            'is_over': current_amount > budget.amount,
+            'from_date': from_date,
+            'to_date': to_date,
+        })
+
+    @staticmethod
+    def refresh_user(user_id: int):
+        for budget in Budget.objects.filter(user_id=user_id):
+            BudgetProgressBusiness.refresh(budget)
+
+    @staticmethod
+    def apply(deltas: dict):
+        """
+        Add the transaction amounts of deltas, keyed by (user_id, wallet_id, category_id, day),
+        to the budgets whose window contains the day.
+        """
+        if not deltas:
+            return
+
+        user_ids = {user_id for user_id, _, _, _ in deltas}
+        tracked = set(BudgetProgress.objects.filter(user_id__in=user_ids)
+                      .values_list('user_id', 'wallet_id', 'category_id'))
+
+        for (user_id, wallet_id, category_id, day), amount in sorted(deltas.items()):
+            if not amount or (user_id, wallet_id, category_id) not in tracked:
+                continue
+            qs = BudgetProgress.objects.filter(user_id=user_id, wallet_id=wallet_id, category_id=category_id,
+                                               from_date__lte=day, to_date__gte=day)
+            # Two statements, is_over has to see the new current_amount
+            if qs.update(current_amount=F('current_amount') + amount):
+                qs.update(is_over=Case(When(current_amount__gt=F('amount'), then=Value(True)),
+                                       default=Value(False), output_field=BooleanField()))
+
+    @staticmethod
+    def get_over_budgets(entries: list) -> list:
+        """
+        Over budget progress rows whose user, wallet, category and window match one of the
+        transaction entries, in one query whatever the number of budgets.
+        """
+        entries = [entry for entry in entries if entry.category_id]
+        if not entries:
+            return []
+
+        days = {}
+        for entry in entries:
+            days.setdefault((entry.user_id, entry.wallet_id or 0, entry.category_id), set()).add(entry.day)
+
+        qs = BudgetProgress.objects.filter(user_id__in={key[0] for key in days},
+                                           wallet_id__in={key[1] for key in days},
+                                           category_id__in={key[2] for key in days},
+                                           is_over=True,
+                                           from_date__lte=max(entry.day for entry in entries),
+                                           to_date__gte=min(entry.day for entry in entries))
+        return [progress for progress in qs
+                if any(progress.from_date <= day <= progress.to_date
+                       for day in days.get((progress.user_id, progress.wallet_id, progress.category_id), ()))]
+
+    @staticmethod
+    def notify_over_budgets(entries: list) -> list:
+        """
+        Notify the users of the budgets the entries pushed over, once per budget. Runs in the
+        transaction that wrote the entries, the notifications go to the outbox with them.
+        """
+        over_budgets = BudgetProgressBusiness.get_over_budgets(entries)
+        if not over_budgets:
+            return []
+
+        notified = set(TaskNote.objects.filter(task=TASK_NOTE.over_budget_notification,
+                                               obj_id__in=[progress.budget_id for progress in over_budgets])
+                       .values_list('obj_id', flat=True))
+        to_notify = [progress for progress in over_budgets if progress.budget_id not in notified]
+        TaskNote.objects.bulk_create([TaskNote(user_id=progress.user_id,
+                                               task=TASK_NOTE.over_budget_notification,
+                                               obj_id=progress.budget_id,
+                                               count=1) for progress in to_notify])
+
+        BudgetingNotification.bulk_enqueue(NOTIFICATION_TYPE.budget_over, [
+            (progress.user_id, {
+                'budget_id': progress.budget_id,
+                'wallet_id': progress.wallet_id,
+                'category_id': progress.category_id,
+            }) for progress in to_notify])
+        return to_notify
@@ -1,5 +1,6 @@
 from django.db import transaction
 
+from budgeting.business.aggregate import TransactionAggregateBusiness, TransactionEntry
 from budgeting.constants import DIRECTION
 from budgeting.models import CategoryMapping, Category, Transaction
 from common.business import get_now
@@ -16,8 +17,15 @@ class CategoryBusiness:
 
         direction = category.direction
         default_category = CategoryBusiness.category_default[direction]
-        Transaction.objects.filter(user_id=category.user_id, direction=direction, category=category)\
-            .update(category=default_category, updated_at=get_now())
+        # Bulk update skips the model signals, move the aggregates of the moved rows explicitly.
+        # The rows left (other users, other direction) are moved to no category by the delete signal.
+        qs = Transaction.objects.filter(user_id=category.user_id, direction=direction, category=category)
+        entries = TransactionEntry.aggregate(qs)
+        qs.update(category=default_category, updated_at=get_now())
+        TransactionAggregateBusiness.apply(removed=entries, added=[
+            entry._replace(category_id=default_category.id if default_category else None) for entry in entries
+        ])
+
         category.delete()
 
     @staticmethod
@@ -0,0 +1,106 @@
+import heapq
+import logging
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+from budgeting.models import Category, CategoryGroup
+from budgeting.serializers import CategorySerializer
+from common.query_cache import get_cache, get_generation_values, GLOBAL
+
+
+def category_scope(user_id: int) -> str:
+    # Bumped on writes of the user's own categories only, transactions do not change the tree
+    return 'category:{}'.format(user_id)
+
+
+class CategoryTreeBusiness:
+    """
+    The category groups with their categories, as listed by CategoryGroupViewSet. The global part is
+    the same for everyone: it is built once per GLOBAL generation and cached, the caller's custom
+    categories are cached on their own and merged in by order. The generations make the ETag.
+    """
+
+    @staticmethod
+    def get_versions(user_id: int):
+        """
+        (global generation, user's category generation), None when the cache is unavailable.
+        """
+        try:
+            return tuple(get_generation_values([GLOBAL, category_scope(user_id)]))
+        except Exception as ex:
+            # The cache is an optimization, never fail the request because of it
+            logging.exception(ex)
+            return None
+
+    @staticmethod
+    def get_etag(versions, direction: str = None) -> str:
+        return '"{}-{}-{}"'.format(versions[0], versions[1], direction or 'all')
+
+    @staticmethod
+    def get_tree(user_id: int, versions=None, direction: str = None) -> list:
+        """
+        [group with its categories], groups without category are left out.
+        """
+        groups = CategoryTreeBusiness.cached('category_tree:{}'.format(versions[0]) if versions else None,
+                                             CategoryTreeBusiness.build_global_tree)
+        custom = CategoryTreeBusiness.cached(
+            'category_tree:{}:{}'.format(user_id, versions[1]) if versions else None,
+            lambda: CategoryTreeBusiness.build_user_categories(user_id))
+
+        result = []
+        for group in groups:
+            items = heapq.merge(group['categories'], custom.get(group['id'], []), key=lambda item: item[:2])
+            categories = [data for _, _, data in items if not direction or data['direction'] == direction]
+            if categories:
+                result.append(dict(group, categories=categories))
+        return result
+
+    @staticmethod
+    def cached(key, build):
+        if not key or not settings.QUERY_CACHE['ENABLED']:
+            return build()
+        try:
+            value = get_cache().get(key)
+        except Exception as ex:
+            logging.exception(ex)
+            return build()
+        if value is None:
+            value = build()
+            try:
+                get_cache().set(key, value, settings.QUERY_CACHE['TIMEOUT'])
+            except Exception as ex:
+                logging.exception(ex)
+        return value
+
+    @staticmethod
+    def entry(category: Category) -> tuple:
+        # Sort key first, the merge keeps the order of the old per-group query
+        return category.order, category.id, dict(CategorySerializer(category).data)
+
+    @staticmethod
+    def build_global_tree() -> list:
+        """
+        The groups with their global categories, in one prefetch query.
+        """
+        categories = Category.objects.filter(deleted_at__isnull=True, user_id__isnull=True).order_by('order', 'id')
+        groups = CategoryGroup.objects.filter(deleted_at__isnull=True) \
+            .order_by('order') \
+            .prefetch_related(Prefetch('group_categories', queryset=categories, to_attr='global_categories'))
+        return [{
+            'id': group.id,
+            'name': group.name,
+            'code': group.code,
+            'categories': [CategoryTreeBusiness.entry(category) for category in group.global_categories],
+        } for group in groups]
+
+    @staticmethod
+    def build_user_categories(user_id: int) -> dict:
+        """
+        {group id: [custom categories of the user]}
+        """
+        result = {}
+        for category in Category.objects.filter(user_id=user_id, deleted_at__isnull=True, group__isnull=False) \
+                .order_by('order', 'id'):
+            result.setdefault(category.group_id, []).append(CategoryTreeBusiness.entry(category))
+        return result
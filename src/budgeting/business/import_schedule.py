@@ -0,0 +1,101 @@
+import logging
+import math
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q, Sum
+
+from budgeting.models import Wallet, TransactionDailyRollup
+from common.business import get_now
+from common.ttl_cache import TTLCache
+
+# Users whose last-seen time this process wrote recently, so that it is written once per LAST_SEEN_RESOLUTION
+_touched = TTLCache(max_size=10000)
+
+
+class ImportScheduler:
+    """
+    Order the due Plaid wallets by the value of importing them now: how stale they are, how many
+    transactions they had lately and whether their user uses the app. Wallets that keep failing are
+    held back with an exponential backoff (Wallet.retry_at) so that they do not take healthy ones' slots.
+    """
+
+    @staticmethod
+    def get_due_wallets(limit: int) -> list:
+        config = settings.IMPORT_SCHEDULER
+        now = get_now()
+        candidates = list(Wallet.objects.filter(plaid_id__isnull=False,
+                                                deleted_at__isnull=True,
+                                                last_import__lt=now.today())
+                          .filter(Q(retry_at__isnull=True) | Q(retry_at__lte=now))
+                          .order_by('last_import', 'id')[:config['CANDIDATES']])
+        if not candidates:
+            return []
+
+        activity = ImportScheduler.get_activity(candidates, now.date() - timedelta(days=config['ACTIVITY_DAYS']))
+        last_seen = ImportScheduler.get_last_seen({wallet.user_id for wallet in candidates})
+        engaged_since = time.time() - config['ENGAGED_DAYS'] * 86400
+
+        def score(wallet):
+            value = config['STALENESS_WEIGHT'] * (now.date() - wallet.last_import).days
+            value += config['ACTIVITY_WEIGHT'] * math.log1p(activity.get(wallet.id, 0))
+            if last_seen.get(wallet.user_id, 0) >= engaged_since:
+                value += config['ENGAGEMENT_WEIGHT']
+            # A wallet that failed before is less likely to succeed now
+            return value / (1 + wallet.error_count)
+
+        # Stable sort, ties stay the least recently imported first
+        return sorted(candidates, key=score, reverse=True)[:limit]
+
+    @staticmethod
+    def get_activity(wallets: list, from_day) -> dict:
+        """
+        {wallet id: transaction count since from_day}, from the daily rollup.
+        """
+        qs = TransactionDailyRollup.objects.filter(user_id__in={wallet.user_id for wallet in wallets},
+                                                   wallet_id__in=[wallet.id for wallet in wallets],
+                                                   day__gte=from_day) \
+            .order_by() \
+            .values('wallet_id') \
+            .annotate(total=Sum('count'))
+        return {item['wallet_id']: item['total'] for item in qs}
+
+    @staticmethod
+    def get_retry_at(error_count: int):
+        config = settings.IMPORT_SCHEDULER
+        backoff = min(config['ERROR_BACKOFF'] * 2 ** (error_count - 1), config['ERROR_BACKOFF_MAX'])
+        return get_now() + timedelta(seconds=backoff)
+
+    @staticmethod
+    def last_seen_key(user_id: int) -> str:
+        return 'import_scheduler:last_seen:{}'.format(user_id)
+
+    @staticmethod
+    def touch(user_id: int):
+        """
+        Record that the user used the app, called on every authenticated request.
+        """
+        config = settings.IMPORT_SCHEDULER
+        if _touched.get(user_id):
+            return
+        _touched.set(user_id, True, config['LAST_SEEN_RESOLUTION'])
+        try:
+            caches[config['CACHE_ALIAS']].set(ImportScheduler.last_seen_key(user_id), int(time.time()),
+                                              config['ENGAGED_DAYS'] * 86400)
+        except Exception as ex:
+            logging.exception(ex)
+
+    @staticmethod
+    def get_last_seen(user_ids) -> dict:
+        """
+        {user id: unix time last seen}, users not seen within ENGAGED_DAYS are missing.
+        """
+        keys = {ImportScheduler.last_seen_key(user_id): user_id for user_id in user_ids}
+        try:
+            values = caches[settings.IMPORT_SCHEDULER['CACHE_ALIAS']].get_many(list(keys))
+        except Exception as ex:
+            logging.exception(ex)
+            return {}
+        return {keys[key]: value for key, value in values.items()}
@@ -1,26 +1,137 @@
-from budgeting.constants import NOTIFICATION_TYPE
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+
+from budgeting.constants import NOTIFICATION_TYPE, OUTBOX_STATUS
+from budgeting.models import NotificationOutbox
+from common.business import get_now
+from common.metrics import metrics
 from constant_core.business import ConstantCoreBusiness
 from integration_3rdparty.const_hook import ConstantHookManagement
 
 
 class BudgetingNotification:
+    """
+    Notifications go to the outbox in the caller's transaction, NotificationDispatcher sends them.
+    """
+
+    @staticmethod
+    def enqueue(user_id, notification_type: str, data=None) -> NotificationOutbox:
+        return NotificationOutbox.objects.create(user_id=user_id,
+                                                 notification_type=notification_type,
+                                                 data=json.dumps(data or {}, cls=DjangoJSONEncoder))
+
+    @staticmethod
+    def bulk_enqueue(notification_type: str, items: list):
+        """
+        items: [(user_id, data)], one insert.
+        """
+        NotificationOutbox.objects.bulk_create([
+            NotificationOutbox(user_id=user_id,
+                               notification_type=notification_type,
+                               data=json.dumps(data or {}, cls=DjangoJSONEncoder))
+            for user_id, data in items])
+
     @staticmethod
     def noti_transaction_imported(user_id, data=None):
-        data['user_id'] = user_id
-        data['type'] = NOTIFICATION_TYPE.transaction_imported
-        data['player_ids'] = ConstantCoreBusiness.get_device_tokens([user_id])
-        ConstantHookManagement.send_notification(data)
+        return BudgetingNotification.enqueue(user_id, NOTIFICATION_TYPE.transaction_imported, data)
 
     @staticmethod
     def noti_budget_end(user_id, data=None):
-        data['user_id'] = user_id
-        data['type'] = NOTIFICATION_TYPE.budget_end
-        data['player_ids'] = ConstantCoreBusiness.get_device_tokens([user_id])
-        ConstantHookManagement.send_notification(data)
+        return BudgetingNotification.enqueue(user_id, NOTIFICATION_TYPE.budget_end, data)
 
     @staticmethod
     def noti_budget_over(user_id, data=None):
-        data['user_id'] = user_id
-        data['type'] = NOTIFICATION_TYPE.budget_over
-        data['player_ids'] = ConstantCoreBusiness.get_device_tokens([user_id])
-        ConstantHookManagement.send_notification(data)
+        return BudgetingNotification.enqueue(user_id, NOTIFICATION_TYPE.budget_over, data)
+
+
+class NotificationDispatcher:
+    """
+    Send the outbox in batches: one query claims a batch, one query resolves the device tokens of its
+    users. A failed send is retried with exponential backoff until NOTIFICATION_OUTBOX['MAX_ATTEMPTS'].
+    A claim pushes next_attempt_at by LEASE_SECONDS so that a dispatcher that dies does not lose it.
+    """
+
+    @staticmethod
+    def claim(batch_size: int) -> list:
+        now = get_now()
+        with transaction.atomic():
+            items = list(NotificationOutbox.objects.select_for_update(skip_locked=True)
+                         .filter(status=OUTBOX_STATUS.pending, next_attempt_at__lte=now)
+                         .order_by('next_attempt_at', 'id')[:batch_size])
+            if items:
+                NotificationOutbox.objects.filter(id__in=[item.id for item in items]).update(
+                    attempts=F('attempts') + 1,
+                    next_attempt_at=now + timedelta(seconds=settings.NOTIFICATION_OUTBOX['LEASE_SECONDS']))
+        for item in items:
+            item.attempts += 1
+        return items
+
+    @staticmethod
+    def dispatch(batch_size: int = None) -> dict:
+        """
+        Send one batch, returns the sent and failed counts.
+        """
+        items = NotificationDispatcher.claim(batch_size or settings.NOTIFICATION_OUTBOX['BATCH_SIZE'])
+        if not items:
+            return {'sent': 0, 'failed': 0}
+
+        profiles = ConstantCoreBusiness.get_user_profiles(list({item.user_id for item in items}))
+        sent_ids = []
+        failed_count = 0
+        for item in items:
+            profile = profiles.get(item.user_id)
+            if not profile or not profile.device_token:
+                # No device to deliver to
+                sent_ids.append(item.id)
+                continue
+
+            data = json.loads(item.data) if item.data else {}
+            data['user_id'] = item.user_id
+            data['type'] = item.notification_type
+            data['player_ids'] = [profile.device_token]
+            try:
+                ConstantHookManagement.send_notification(data)
+                sent_ids.append(item.id)
+            except Exception as ex:
+                logging.exception(ex)
+                failed_count += 1
+                NotificationDispatcher.retry(item, ex)
+
+        NotificationOutbox.objects.filter(id__in=sent_ids).update(status=OUTBOX_STATUS.sent, sent_at=get_now(),
+                                                                  error=None, updated_at=get_now())
+        metrics.incr('notification.sent', len(sent_ids))
+        metrics.incr('notification.send_error', failed_count)
+        return {'sent': len(sent_ids), 'failed': failed_count}
+
+    @staticmethod
+    def retry(item: NotificationOutbox, ex: Exception):
+        config = settings.NOTIFICATION_OUTBOX
+        if item.attempts >= config['MAX_ATTEMPTS']:
+            metrics.incr('notification.failed')
+            NotificationOutbox.objects.filter(id=item.id).update(status=OUTBOX_STATUS.failed, error=str(ex),
+                                                                 updated_at=get_now())
+            return
+
+        backoff = config['RETRY_BACKOFF'] * 2 ** (item.attempts - 1)
+        NotificationOutbox.objects.filter(id=item.id).update(next_attempt_at=get_now() + timedelta(seconds=backoff),
+                                                             error=str(ex), updated_at=get_now())
+
+    @staticmethod
+    def drain(max_batches: int = 100) -> dict:
+        """
+        Send batches until nothing is due.
+        """
+        total = {'sent': 0, 'failed': 0}
+        for _ in range(max_batches):
+            result = NotificationDispatcher.dispatch()
+            total['sent'] += result['sent']
+            total['failed'] += result['failed']
+            if not result['sent'] and not result['failed']:
+                break
+        return total
@@ -0,0 +1,158 @@
+import logging
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from budgeting.business.import_schedule import ImportScheduler
+from budgeting.business.notification import BudgetingNotification
+from budgeting.business.transaction import TransactionBusiness
+from budgeting.business.wallet import WalletBusiness
+from budgeting.constants import TASK_NOTE
+from budgeting.models import Wallet, TaskNote
+from common.business import get_now
+from constant_core.business import ConstantCoreBusiness
+
+
+class PlaidImportRunner:
+    """
+    Import the due Plaid wallets on a bounded thread pool, the most valuable ones first (ImportScheduler).
+    Wallets sharing an access token and a date window are fetched from Plaid once, as one group.
+    Each group runs on its own DB connection and a failure is recorded on its wallets only. Groups
+    not started when the time budget runs out are left for the next run.
+    """
+
+    def __init__(self, max_workers: int = None, time_budget: float = None, max_wallets: int = None):
+        self.max_workers = max_workers or settings.PLAID_IMPORT['MAX_WORKERS']
+        self.time_budget = time_budget or settings.PLAID_IMPORT['TIME_BUDGET']
+        self.max_wallets = max_wallets or settings.PLAID_IMPORT['MAX_WALLETS']
+        self.deadline = None
+
+    def get_due_groups(self) -> list:
+        """
+        [(access token, wallets)] in the order of ImportScheduler, most valuable first. The access
+        token is None for wallets whose Plaid account is gone.
+        """
+        wallets = ImportScheduler.get_due_wallets(self.max_wallets)
+        plaid_accounts = ConstantCoreBusiness.get_plaid_accounts([wallet.plaid_id for wallet in wallets])
+
+        groups = OrderedDict()
+        for wallet in wallets:
+            plaid_account = plaid_accounts.get(wallet.plaid_id)
+            key = (plaid_account.access_token, wallet.last_import) if plaid_account else (None, wallet.id)
+            groups.setdefault(key, []).append(wallet)
+        return [(access_token, group) for (access_token, _), group in groups.items()]
+
+    def run(self) -> dict:
+        started = time.perf_counter()
+        self.deadline = started + self.time_budget
+        groups = self.get_due_groups()
+
+        if self.max_workers <= 1:
+            results = [self.run_group(access_token, wallets, close_connections=False)
+                       for access_token, wallets in groups]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(lambda group: self.run_group(*group), groups))
+
+        elapsed = time.perf_counter() - started
+        statuses = [status for group_statuses, _ in results for status in group_statuses]
+        latencies = sorted(latency for group_statuses, latency in results if latency is not None)
+        success_count = statuses.count('success')
+        failed_count = statuses.count('failed')
+        return {
+            'success': success_count,
+            'failed': failed_count,
+            'skipped': statuses.count('skipped'),
+            'fetches': len(latencies),
+            'elapsed': round(elapsed, 3),
+            'wallets_per_second': round((success_count + failed_count) / elapsed, 2) if elapsed else 0,
+            'latency': {
+                'avg': round(sum(latencies) / len(latencies), 3) if latencies else 0,
+                'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3)
+                if latencies else 0,
+                'max': round(latencies[-1], 3) if latencies else 0,
+            },
+        }
+
+    def run_group(self, access_token: str, wallets: list, close_connections: bool = True):
+        """
+        Returns (status of each wallet, seconds), status is success, failed or skipped.
+        """
+        if time.perf_counter() >= self.deadline:
+            return ['skipped'] * len(wallets), None
+
+        started = time.perf_counter()
+        try:
+            statuses = self.import_group(access_token, wallets)
+        finally:
+            if close_connections:
+                connections.close_all()
+        return statuses, time.perf_counter() - started
+
+    def import_group(self, access_token: str, wallets: list) -> list:
+        if access_token is None:
+            for wallet in wallets:
+                WalletBusiness.delete_wallet(wallet)
+            return ['success'] * len(wallets)
+
+        from_dt = wallets[0].last_import
+        to_dt = get_now().today()
+        try:
+            failures = TransactionBusiness.import_plaid_wallets(access_token, wallets, from_dt, to_dt)
+        except Exception as ex:
+            logging.exception(ex)
+            failures = {wallet.id: ex for wallet in wallets}
+
+        statuses = []
+        for wallet in wallets:
+            if wallet.id in failures:
+                self.record_error(wallet, failures[wallet.id])
+                statuses.append('failed')
+            elif self.finish_wallet(wallet, to_dt):
+                statuses.append('success')
+            else:
+                statuses.append('failed')
+        return statuses
+
+    @staticmethod
+    def record_error(wallet: Wallet, ex: Exception):
+        try:
+            wallet.error = str(ex)
+            wallet.error_details = ''.join(traceback.format_exception(type(ex), ex, ex.__traceback__))
+            wallet.error_at = get_now()
+            wallet.error_count += 1
+            wallet.retry_at = ImportScheduler.get_retry_at(wallet.error_count)
+            wallet.save()
+        except Exception as save_ex:
+            logging.exception(save_ex)
+
+    def finish_wallet(self, wallet: Wallet, to_dt) -> bool:
+        try:
+            wallet.last_import = to_dt
+            wallet.error = wallet.error_details = wallet.error_at = wallet.retry_at = None
+            wallet.error_count = 0
+            wallet.save()
+        except Exception as ex:
+            logging.exception(ex)
+            self.record_error(wallet, ex)
+            return False
+
+        try:
+            with transaction.atomic():
+                tn = TaskNote.objects.filter(user_id=wallet.user_id,
+                                             task=TASK_NOTE.first_import_transaction_notification,
+                                             obj_id=wallet.id).first()
+                if not tn:
+                    BudgetingNotification.noti_transaction_imported(wallet.user_id)
+                    TaskNote.objects.create(user_id=wallet.user_id,
+                                            task=TASK_NOTE.first_import_transaction_notification,
+                                            obj_id=wallet.id,
+                                            count=1)
+        except Exception as noti_ex:
+            logging.exception(noti_ex)
+
+        return True
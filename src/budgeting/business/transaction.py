@@ -1,71 +1,239 @@
 import json
 import logging
-from datetime import timedelta
+from collections import OrderedDict
+from datetime import timedelta, datetime
 from decimal import Decimal
 
+from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
+from budgeting.business.aggregate import TransactionAggregateBusiness, TransactionEntry
+from budgeting.business.budget import BudgetProgressBusiness
 from budgeting.business.category import CategoryBusiness
 from budgeting.business.wallet import WalletBusiness
 from budgeting.constants import DIRECTION
-from budgeting.models import Transaction, Wallet, Category
-from common.business import get_now
+from budgeting.models import Transaction, Wallet, Category, TransactionDetail
+from common.business import get_now, round_currency
+from common.query_cache import batch_invalidation
 from constant_core.business import ConstantCoreBusiness
 from integration_3rdparty.plaid import PlaidManagement
 
 
+# Columns a re-import refreshes, the note stays as the user may have edited it
+PLAID_UPDATE_FIELDS = ('amount', 'currency', 'direction', 'transaction_at', 'category', 'category_text',
+                       'plaid_account_id', 'merchant_name', 'location', 'location_name', 'pending', 'updated_at')
+
+
 class TransactionBusiness:
     @staticmethod
     def import_transaction_from_plaid(user_id: int, wallet: Wallet, from_date=None, to_date=None):
-        from_date = from_date.strftime('%Y-%m-%d') if from_date else get_now().strftime('%Y-%m-%d')
-        to_date = to_date.strftime('%Y-%m-%d') if to_date else (get_now() + timedelta(days=1)).strftime('%Y-%m-%d')
-
         plaid_account = ConstantCoreBusiness.get_plaid_account(wallet.plaid_id)
         if not plaid_account:
             WalletBusiness.delete_wallet(wallet)
             return
 
-        transactions = PlaidManagement.get_transaction(plaid_account.access_token, from_date, to_date)
+        failures = TransactionBusiness.import_plaid_wallets(plaid_account.access_token, [wallet], from_date, to_date)
+        if failures:
+            raise failures[wallet.id]
+
+    @staticmethod
+    def import_plaid_wallets(access_token: str, wallets: list, from_date=None, to_date=None) -> dict:
+        """
+        Fetch the transactions of an access token once and route them to its wallets by Plaid
+        account_id, a wallet whose account_id cannot be resolved gets all of them.
+        A failed fetch raises, returns {wallet id: exception} of the wallets that failed to save.
+        """
+        TransactionBusiness.resolve_plaid_account_ids(access_token, wallets)
+        from_date = from_date.strftime('%Y-%m-%d') if from_date else get_now().strftime('%Y-%m-%d')
+        to_date = to_date.strftime('%Y-%m-%d') if to_date else (get_now() + timedelta(days=1)).strftime('%Y-%m-%d')
+
+        pages = PlaidManagement.get_transaction_pages(access_token, from_date, to_date)
+
+        # Written page by page to keep memory bounded on long backfills,
+        # with one invalidation for the whole import instead of one per transaction
+        failures = {}
+        with batch_invalidation():
+            for transactions in pages:
+                for wallet in wallets:
+                    if wallet.id in failures:
+                        continue
+                    items = [item for item in transactions
+                             if not wallet.plaid_account_id or item.get('account_id') == wallet.plaid_account_id]
+                    if not items:
+                        continue
+                    try:
+                        TransactionBusiness.save_plaid_transactions(wallet.user_id, wallet, items)
+                    except Exception as ex:
+                        logging.exception(ex)
+                        failures[wallet.id] = ex
+
+        return failures
+
+    @staticmethod
+    def resolve_plaid_account_ids(access_token: str, wallets: list):
+        """
+        Wallets added before plaid_account_id was recorded get it from the accounts of their Plaid item:
+        its only account, or its only account with the subtype of the wallet's plaid account. A wallet
+        that matches none is not looked up again for PLAID_IMPORT['ACCOUNT_RECHECK_DAYS'].
+        """
+        now = get_now()
+        recheck_before = now - timedelta(days=settings.PLAID_IMPORT['ACCOUNT_RECHECK_DAYS'])
+        unresolved = [wallet for wallet in wallets if not wallet.plaid_account_id and
+                      (not wallet.plaid_account_checked_at or wallet.plaid_account_checked_at <= recheck_before)]
+        if not unresolved:
+            return
+        try:
+            accounts = PlaidManagement.get_accounts(access_token)
+            plaid_accounts = ConstantCoreBusiness.get_plaid_accounts([wallet.plaid_id for wallet in unresolved])
+        except Exception as ex:
+            # Routed as before, tried again on the next import
+            logging.exception(ex)
+            return
+
+        for wallet in unresolved:
+            candidates = accounts
+            if len(candidates) > 1:
+                plaid_account = plaid_accounts.get(wallet.plaid_id)
+                candidates = [account for account in accounts
+                              if plaid_account and account.get('subtype') == plaid_account.account_subtype]
+            if len(candidates) != 1:
+                wallet.plaid_account_checked_at = now
+                wallet.save(update_fields=['plaid_account_checked_at', 'updated_at'])
+                continue
+            wallet.plaid_account_id = candidates[0]['account_id']
+            wallet.plaid_account_checked_at = None
+            wallet.save(update_fields=['plaid_account_id', 'plaid_account_checked_at', 'updated_at'])
 
-        default_category = Category.DEFAULT_CODE
+    @staticmethod
+    def save_plaid_transactions(user_id: int, wallet: Wallet, transactions: list):
+        """
+        Upsert the Plaid transactions of a wallet on (wallet, external_id): one query for the rows
+        already imported, then bulk inserts/updates in chunks of PLAID_IMPORT['BATCH_SIZE'].
+        Returns (created, updated) counts.
+        """
         cache_category_mapping = CategoryBusiness.load_category_mapping()
+        batch_size = settings.PLAID_IMPORT['BATCH_SIZE']
 
-        for transaction in transactions:
+        # Later rows win if Plaid sends the same transaction twice
+        incoming = OrderedDict()
+        payloads = {}
+        for item in transactions:
             try:
-                amount = Decimal(transaction['amount'])
-                direction = DIRECTION.income if amount < 0 else DIRECTION.expense
-                amount = amount * Decimal(-1) if amount < 0 else amount
-                note = '{}'.format(transaction.get('name'))
-                picked_cat = None
-                cats = transaction.get('category', [])
-                cats = cats if cats else []
-                if cats:
-                    cats.reverse()
-                    for cat in cats:
-                        if cat in cache_category_mapping[direction]:
-                            picked_cat = cache_category_mapping[direction][cat]
-                            break
-                    else:
-                        picked_cat = cache_category_mapping[direction][default_category]
-
-                obj, created = Transaction.objects.get_or_create(
-                    user_id=user_id,
-                    amount=amount,
-                    currency=transaction['iso_currency_code'],
-                    direction=direction,
-                    external_id=transaction['transaction_id'],
-                    wallet=wallet,
-                    defaults={
-                        'note': note,
-                        'transaction_at': transaction['date'],
-                        'detail': json.dumps(transaction, cls=DjangoJSONEncoder),
-                        'category': picked_cat,
-                        'category_text': ','.join(cats),
-                    }
-                )
-                if not created:
-                    if obj.category_id and obj.category_id != picked_cat.id:
-                        obj.category = picked_cat
-                        obj.save()
+                values = TransactionBusiness.parse_plaid_transaction(item, cache_category_mapping)
             except Exception as ex:
                 logging.exception(ex)
+                continue
+            payloads[item['transaction_id']] = values.pop('payload')
+            incoming[item['transaction_id']] = values
+
+        with transaction.atomic():
+            # Imports of the same wallet run one after the other
+            Wallet.objects.select_for_update().filter(pk=wallet.pk).first()
+            existing = {obj.external_id: obj for obj in
+                        Transaction.objects.filter(wallet=wallet, external_id__in=list(incoming.keys()))
+                        .defer('detail')}
+
+            to_create, to_update, removed = [], [], []
+            for external_id, values in incoming.items():
+                obj = existing.get(external_id)
+                if obj is None:
+                    to_create.append(Transaction(user_id=user_id, wallet=wallet, external_id=external_id, **values))
+                    continue
+
+                category = values.pop('category')
+                # The note stays as the user may have edited it
+                values.pop('note', None)
+                old_entry = TransactionEntry.from_instance(obj)
+                changed = any(getattr(obj, field) != value for field, value in values.items())
+                # The user may have picked another category, only a mapped one that changed is applied
+                if obj.category_id and category and obj.category_id != category.id:
+                    obj.category = category
+                    changed = True
+                if not changed:
+                    continue
+
+                for field, value in values.items():
+                    setattr(obj, field, value)
+                obj.updated_at = get_now()
+                to_update.append(obj)
+                removed.append(old_entry)
+
+            Transaction.objects.bulk_create(to_create, batch_size=batch_size)
+            Transaction.objects.bulk_update(to_update, PLAID_UPDATE_FIELDS, batch_size=batch_size)
+            TransactionBusiness.save_plaid_payloads(wallet, [obj.external_id for obj in to_create + to_update],
+                                                    payloads, batch_size)
+
+            # Bulk writes skip the model signals, move the aggregates explicitly
+            added = [TransactionEntry.from_instance(obj) for obj in to_create + to_update]
+            TransactionAggregateBusiness.apply(removed=removed, added=added)
+            # Only the budgets the written rows fall in are checked
+            BudgetProgressBusiness.notify_over_budgets(added)
+
+        return len(to_create), len(to_update)
+
+    @staticmethod
+    def save_plaid_payloads(wallet: Wallet, external_ids: list, payloads: dict, batch_size: int):
+        """
+        Replace the TransactionDetail of the written rows, bulk_create does not return the ids on MySQL
+        so they are read back by external_id.
+        """
+        if not external_ids:
+            return
+        ids = dict(Transaction.objects.filter(wallet=wallet, external_id__in=external_ids)
+                   .values_list('external_id', 'id'))
+        TransactionDetail.objects.filter(transaction_id__in=list(ids.values())).delete()
+        TransactionDetail.objects.bulk_create([TransactionDetail(transaction_id=transaction_id,
+                                                                 payload=payloads[external_id])
+                                               for external_id, transaction_id in ids.items()],
+                                              batch_size=batch_size)
+
+    @staticmethod
+    def get_plaid_columns(item: dict) -> dict:
+        """
+        The fields of a Plaid payload read by the lists, stored as columns.
+        """
+        # location is returned as Plaid sent it, null keys included
+        location = item.get('location')
+        return {
+            'plaid_account_id': item.get('account_id'),
+            'merchant_name': (item.get('merchant_name') or '')[:255] or None,
+            'location': json.dumps(location, cls=DjangoJSONEncoder) if location is not None else None,
+            'location_name': (item.get('location_name') or '')[:255] or None,
+            'pending': bool(item.get('pending')),
+        }
+
+    @staticmethod
+    def parse_plaid_transaction(item: dict, cache_category_mapping: dict) -> dict:
+        amount = Decimal(str(item['amount']))
+        direction = DIRECTION.income if amount < 0 else DIRECTION.expense
+        amount = amount * Decimal(-1) if amount < 0 else amount
+        picked_cat = None
+        cats = item.get('category', [])
+        cats = list(reversed(cats)) if cats else []
+        if cats:
+            for cat in cats:
+                if cat in cache_category_mapping[direction]:
+                    picked_cat = cache_category_mapping[direction][cat]
+                    break
+            else:
+                picked_cat = cache_category_mapping[direction][Category.DEFAULT_CODE]
+
+        day = item['date']
+        if isinstance(day, str):
+            day = parse_date(day)
+
+        values = {
+            'amount': round_currency(amount),
+            'currency': item['iso_currency_code'],
+            'direction': direction,
+            'note': '{}'.format(item.get('name')),
+            'transaction_at': datetime(day.year, day.month, day.day, tzinfo=timezone.utc),
+            'payload': json.dumps(item, cls=DjangoJSONEncoder),
+            'category': picked_cat,
+            'category_text': ','.join(cats),
+        }
+        values.update(TransactionBusiness.get_plaid_columns(item))
+        return values
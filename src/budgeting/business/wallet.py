@@ -9,7 +9,7 @@ from constant_core.business import ConstantCoreBusiness
 
 class WalletBusiness:
     @staticmethod
-    def add_wallet(user: ConstUser, plaid_id: int):
+    def add_wallet(user: ConstUser, plaid_id: int, plaid_account_id: str = None):
         plaid = ConstantCoreBusiness.get_plaid_account(plaid_id)
         if not plaid:
             raise ValidationError('Invalid plaid_id')
@@ -19,6 +19,8 @@ class WalletBusiness:
             if wallet.deleted_at:
                 wallet.deleted_at = None
                 wallet.last_import = date.today()
+            if plaid_account_id:
+                wallet.plaid_account_id = plaid_account_id
             wallet.save()
         else:
             last_day_of_prev_month = date.today().replace(day=1) - timedelta(days=1)
@@ -26,6 +28,7 @@ class WalletBusiness:
             wallet = Wallet.objects.create(
                 user_id=user.user_id,
                 plaid_id=plaid.id,
+                plaid_account_id=plaid_account_id,
                 name=plaid.institution_name,
                 sub_name=plaid.account_subtype,
                 last_import=start_day_of_prev_month,
@@ -6,6 +6,12 @@ NOTIFICATION_TYPE = Choices(
     ('budget_over', 'Budget over'),
 )
 
+OUTBOX_STATUS = Choices(
+    ('pending', 'Pending'),
+    ('sent', 'Sent'),
+    ('failed', 'Failed'),
+)
+
 DIRECTION = Choices(
     ('income', 'Income'),
     ('expense', 'Expense')
@@ -13,5 +19,7 @@ DIRECTION = Choices(
 
 TASK_NOTE = Choices(
     ('first_import_transaction_notification', 'First import transaction notification'),
-    ('over_budget_notification', 'over_budget_notification')
+    ('over_budget_notification', 'over_budget_notification'),
+    ('aggregate_backfill', 'Aggregate backfill'),
+    ('end_budget_notification', 'End budget notification'),
 )
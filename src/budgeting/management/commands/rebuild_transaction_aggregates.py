@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from budgeting.business.aggregate import TransactionAggregateBusiness
+from budgeting.constants import TASK_NOTE
+from budgeting.models import Transaction, TaskNote
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the maintained transaction aggregates from budgeting_transaction, user by user. ' \
+           'Progress is checkpointed so an interrupted run resumes where it stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100, help='Users rebuilt between checkpoints')
+        parser.add_argument('--user-id', type=int, action='append', dest='user_ids',
+                            help='Only rebuild this user, can be repeated')
+        parser.add_argument('--restart', action='store_true', help='Ignore the saved checkpoint')
+
+    def handle(self, *args, **options):
+        if options['user_ids']:
+            for user_id in options['user_ids']:
+                TransactionAggregateBusiness.rebuild_user(user_id)
+            self.stdout.write('Rebuilt {} users'.format(len(options['user_ids'])))
+            return
+
+        checkpoint, _ = TaskNote.objects.get_or_create(user_id=settings.SYSTEM_ACCOUNT,
+                                                       task=TASK_NOTE.aggregate_backfill)
+        if options['restart']:
+            checkpoint.obj_id = None
+            checkpoint.count = 0
+        last_user_id = checkpoint.obj_id or 0
+        if last_user_id:
+            self.stdout.write('Resuming after user {}'.format(last_user_id))
+
+        while True:
+            user_ids = list(Transaction.objects.filter(user_id__gt=last_user_id)
+                            .order_by('user_id')
+                            .values_list('user_id', flat=True)
+                            .distinct()[:options['chunk_size']])
+            if not user_ids:
+                break
+
+            for user_id in user_ids:
+                TransactionAggregateBusiness.rebuild_user(user_id)
+
+            last_user_id = user_ids[-1]
+            checkpoint.obj_id = last_user_id
+            checkpoint.count += len(user_ids)
+            checkpoint.save()
+            self.stdout.write('Rebuilt {} users, up to user {}'.format(checkpoint.count, last_user_id))
+
+        # Done, the next run starts over
+        checkpoint.delete()
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,84 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from budgeting.business.aggregate import TransactionAggregateBusiness
+from budgeting.constants import DIRECTION
+from budgeting.models import Transaction, WalletBalanceCounter
+
+
+class Command(BaseCommand):
+    help = 'Compare budgeting_walletbalancecounter with the balances computed from budgeting_transaction ' \
+           'and report the wallets that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100, help='Users checked per batch')
+        parser.add_argument('--user-id', type=int, action='append', dest='user_ids',
+                            help='Only check this user, can be repeated')
+        parser.add_argument('--fix', action='store_true', help='Rebuild the aggregates of the drifted users')
+
+    def handle(self, *args, **options):
+        drifted_users = set()
+        for user_ids in self.iter_user_ids(options['user_ids'], options['chunk_size']):
+            expected = self.expected_balances(user_ids)
+            actual = {
+                (c.user_id, c.wallet_id): (c.income_amount, c.expense_amount, c.balance)
+                for c in WalletBalanceCounter.objects.filter(user_id__in=user_ids)
+            }
+
+            zero = (Decimal(0), Decimal(0), Decimal(0))
+            for key in sorted(set(expected) | set(actual)):
+                if expected.get(key, zero) != actual.get(key, zero):
+                    drifted_users.add(key[0])
+                    self.stdout.write('User {} wallet {}: expected {}, counter {}'.format(
+                        key[0], key[1], expected.get(key, zero), actual.get(key, zero)))
+
+        if not drifted_users:
+            self.stdout.write(self.style.SUCCESS('No drift'))
+            return
+
+        if options['fix']:
+            for user_id in sorted(drifted_users):
+                TransactionAggregateBusiness.rebuild_user(user_id)
+            self.stdout.write(self.style.SUCCESS('Rebuilt {} users'.format(len(drifted_users))))
+        else:
+            raise CommandError('{} users drifted'.format(len(drifted_users)))
+
+    @staticmethod
+    def iter_user_ids(user_ids, chunk_size):
+        if user_ids:
+            yield user_ids
+            return
+
+        last_user_id = 0
+        while True:
+            user_ids = list(Transaction.objects.filter(user_id__gt=last_user_id)
+                            .order_by('user_id')
+                            .values_list('user_id', flat=True)
+                            .distinct()[:chunk_size])
+            # Users whose transactions are all gone can still have counters left
+            user_ids = sorted(set(user_ids) | set(
+                WalletBalanceCounter.objects.filter(user_id__gt=last_user_id)
+                .order_by('user_id')
+                .values_list('user_id', flat=True)
+                .distinct()[:chunk_size]))[:chunk_size]
+            if not user_ids:
+                return
+            yield user_ids
+            last_user_id = user_ids[-1]
+
+    @staticmethod
+    def expected_balances(user_ids) -> dict:
+        amounts = defaultdict(lambda: {DIRECTION.income: Decimal(0), DIRECTION.expense: Decimal(0)})
+        rows = Transaction.objects.filter(user_id__in=user_ids).order_by() \
+            .values('user_id', 'wallet_id', 'direction') \
+            .annotate(amount_sum=Sum('amount'))
+        for row in rows:
+            amounts[(row['user_id'], row['wallet_id'] or 0)][row['direction']] += row['amount_sum']
+
+        return {
+            key: (value[DIRECTION.income], value[DIRECTION.expense], value[DIRECTION.income] - value[DIRECTION.expense])
+            for key, value in amounts.items()
+        }
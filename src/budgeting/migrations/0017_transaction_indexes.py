@@ -0,0 +1,21 @@
+# Generated by Django 3.1.4 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting', '0016_auto_20210301_1041'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user_id', 'transaction_at'], name='budgeting_tx_user_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user_id', 'wallet', 'transaction_at'], name='budgeting_tx_user_wlt_at_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.1.4 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting', '0017_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionDailyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('wallet_id', models.IntegerField(default=0)),
+                ('category_id', models.IntegerField(default=0)),
+                ('direction', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=50)),
+                ('day', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transactiondailyrollup',
+            index=models.Index(fields=['user_id', 'day'], name='budgeting_rollup_user_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='transactiondailyrollup',
+            constraint=models.UniqueConstraint(fields=('user_id', 'wallet_id', 'day', 'category_id', 'direction'),
+                                               name='budgeting_rollup_key_uniq'),
+        ),
+        migrations.AlterField(
+            model_name='tasknote',
+            name='task',
+            field=models.CharField(choices=[('first_import_transaction_notification', 'First import transaction notification'), ('over_budget_notification', 'over_budget_notification'), ('aggregate_backfill', 'Aggregate backfill')], max_length=255),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.1.4 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting', '0018_transactiondailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionMonthlyBalance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('wallet_id', models.IntegerField(default=0)),
+                ('month', models.DateField()),
+                ('income_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('expense_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('closing_balance', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='transactionmonthlybalance',
+            constraint=models.UniqueConstraint(fields=('user_id', 'wallet_id', 'month'),
+                                               name='budgeting_ledger_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.4 on 2026-10-18 11:05
+
+from django.db import migrations
+
+from budgeting.migrations._aggregates import rebuild_aggregates
+
+
+def backfill(apps, schema_editor):
+    # The summaries, balances and budget progress read these tables from this deploy on,
+    # they must not start empty for the existing transactions
+    rebuild_aggregates(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting', '0020_walletbalancecounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
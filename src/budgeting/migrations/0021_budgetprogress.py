@@ -0,0 +1,70 @@
+# Generated by Django 3.1.4 on 2026-10-18 11:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_progress(apps, schema_editor):
+    Budget = apps.get_model('budgeting', 'Budget')
+    BudgetProgress = apps.get_model('budgeting', 'BudgetProgress')
+    TransactionDailyRollup = apps.get_model('budgeting', 'TransactionDailyRollup')
+
+    for budget in Budget.objects.all().iterator():
+        current_amount = 0
+        if budget.category_id:
+            current_amount = TransactionDailyRollup.objects.filter(
+                user_id=budget.user_id,
+                wallet_id=budget.wallet_id or 0,
+                category_id=budget.category_id,
+                day__gte=budget.from_date,
+                day__lte=budget.to_date,
+            ).aggregate(amount_sum=models.Sum('amount'))['amount_sum'] or 0
+        BudgetProgress.objects.create(
+            budget_id=budget.id,
+            user_id=budget.user_id,
+            wallet_id=budget.wallet_id or 0,
+            category_id=budget.category_id or 0,
+            amount=budget.amount,
+            current_amount=current_amount,
+            is_over=current_amount > budget.amount,
+            from_date=budget.from_date,
+            to_date=budget.to_date,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting', '0020_backfill_transaction_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BudgetProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('wallet_id', models.IntegerField(default=0)),
+                ('category_id', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('current_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('is_over', models.BooleanField(default=False)),
+                ('from_date', models.DateField()),
+                ('to_date', models.DateField()),
+                ('budget', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='budgeting.budget')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='budgetprogress',
+            index=models.Index(fields=['user_id', 'wallet_id', 'category_id', 'from_date'], name='budgeting_bp_match_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='budgetprogress',
+            index=models.Index(fields=['user_id', 'wallet_id', 'is_over'], name='budgeting_bp_over_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='budgetprogress',
+            index=models.Index(fields=['user_id', 'wallet_id', 'to_date'], name='budgeting_bp_end_idx'),
+        ),
+        migrations.RunPython(create_progress, migrations.RunPython.noop),
+    ]
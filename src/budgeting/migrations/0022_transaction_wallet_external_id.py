@@ -0,0 +1,40 @@
+# Generated by Django 3.1.4 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+from budgeting.migrations._aggregates import rebuild_aggregates
+
+
+def remove_duplicates(apps, schema_editor):
+    # Re-imports whose amount changed used to create a second row, keep the latest one.
+    # The deletes skip the signals, the aggregates of the affected users are rebuilt after them.
+    Transaction = apps.get_model('budgeting', 'Transaction')
+    user_ids = set()
+
+    duplicates = Transaction.objects.filter(wallet__isnull=False, external_id__isnull=False) \
+        .order_by() \
+        .values('wallet_id', 'external_id') \
+        .annotate(row_count=models.Count('id'), keep_id=models.Max('id')) \
+        .filter(row_count__gt=1)
+    for item in duplicates.iterator():
+        qs = Transaction.objects.filter(wallet_id=item['wallet_id'], external_id=item['external_id']) \
+            .exclude(id=item['keep_id'])
+        user_ids.update(qs.values_list('user_id', flat=True))
+        qs.delete()
+
+    rebuild_aggregates(apps, sorted(user_ids))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting', '0021_budgetprogress'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(fields=('wallet', 'external_id'), name='budgeting_tx_wallet_ext_uniq'),
+        ),
+    ]
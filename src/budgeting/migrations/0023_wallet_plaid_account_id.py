@@ -0,0 +1,18 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting', '0022_transaction_wallet_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='plaid_account_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
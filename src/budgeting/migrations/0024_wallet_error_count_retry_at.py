@@ -0,0 +1,23 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting', '0023_wallet_plaid_account_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='error_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='retry_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.4 on 2026-10-18 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting', '0025_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user_id', 'created_at', 'id'], name='budgeting_tx_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting', '0026_transaction_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='plaid_account_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='merchant_name',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='location',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='location_name',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='TransactionDetail',
+            fields=[
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True,
+                                                     related_name='transaction_detail', serialize=False,
+                                                     to='budgeting.transaction')),
+                ('payload', models.TextField()),
+            ],
+        ),
+    ]
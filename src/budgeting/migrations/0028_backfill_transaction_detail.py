@@ -0,0 +1,23 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:25
+
+from django.db import migrations
+
+from budgeting.migrations._transaction_detail import backfill_transaction_detail
+
+
+def backfill(apps, schema_editor):
+    # The lists read the location columns from this deploy on
+    backfill_transaction_detail(apps)
+
+
+class Migration(migrations.Migration):
+    # Chunks commit on their own, an interrupted run resumes with the rows still having detail
+    atomic = False
+
+    dependencies = [
+        ('budgeting', '0027_transaction_detail_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting', '0028_backfill_transaction_detail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tasknote',
+            name='task',
+            field=models.CharField(choices=[('first_import_transaction_notification', 'First import transaction notification'), ('over_budget_notification', 'over_budget_notification'), ('aggregate_backfill', 'Aggregate backfill'), ('end_budget_notification', 'End budget notification')], max_length=255),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting', '0029_alter_tasknote_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='plaid_account_checked_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+BACKFILL_FIELDS = ('plaid_account_id', 'merchant_name', 'location', 'location_name', 'pending', 'detail')
+
+
+def get_plaid_columns(item: dict) -> dict:
+    # TransactionBusiness.get_plaid_columns when this was written, kept here as the historical version
+    location = item.get('location')
+    return {
+        'plaid_account_id': item.get('account_id'),
+        'merchant_name': (item.get('merchant_name') or '')[:255] or None,
+        'location': json.dumps(location, cls=DjangoJSONEncoder) if location is not None else None,
+        'location_name': (item.get('location_name') or '')[:255] or None,
+        'pending': bool(item.get('pending')),
+    }
+
+
+def backfill_transaction_detail(apps, chunk_size=1000):
+    """
+    Move the Plaid payload of budgeting_transaction.detail to budgeting_transactiondetail and fill the
+    columns read from it, chunk by chunk. Moved rows get detail NULL.
+    """
+    Transaction = apps.get_model('budgeting', 'Transaction')
+    TransactionDetail = apps.get_model('budgeting', 'TransactionDetail')
+
+    last_id = 0
+    while True:
+        rows = list(Transaction.objects.filter(id__gt=last_id, detail__isnull=False)
+                    .order_by('id')
+                    .only('id', 'detail')[:chunk_size])
+        if not rows:
+            break
+
+        # Rows re-imported since 0027 already have a newer payload and columns
+        existing = set(TransactionDetail.objects.filter(transaction_id__in=[row.id for row in rows])
+                       .values_list('transaction_id', flat=True))
+        details = []
+        for row in rows:
+            if row.id not in existing:
+                try:
+                    item = json.loads(row.detail)
+                except ValueError:
+                    item = None
+                item = item if isinstance(item, dict) else {}
+                for field, value in get_plaid_columns(item).items():
+                    setattr(row, field, value)
+                details.append(TransactionDetail(transaction_id=row.id, payload=row.detail))
+            row.detail = None
+
+        with transaction.atomic():
+            TransactionDetail.objects.bulk_create(details)
+            Transaction.objects.bulk_update([row for row in rows if row.id not in existing], BACKFILL_FIELDS)
+            Transaction.objects.filter(id__in=list(existing)).update(detail=None)
+
+        last_id = rows[-1].id
@@ -7,7 +7,7 @@ from django.db import models
 from django.utils import timezone
 from django.utils.functional import cached_property
 
-from budgeting.constants import DIRECTION, TASK_NOTE
+from budgeting.constants import DIRECTION, TASK_NOTE, NOTIFICATION_TYPE, OUTBOX_STATUS
 from constant_core.business import ConstantCoreBusiness
 from constant_core.models import User as CoreUser
 
@@ -30,37 +30,42 @@ class ConstUser(User):
     def get_db_user(self) -> CoreUser:
         return ConstantCoreBusiness.get_user(self.user_id)
 
+    @cached_property
+    def profile(self) -> CoreUser:
+        # Cached subset of the core user, enough for everything but the balances
+        return ConstantCoreBusiness.get_user_profile(self.user_id)
+
     @property
     def c_first_name(self):
-        return self.get_db_user.first_name
+        return self.profile.first_name
 
     @property
     def c_middle_name(self):
-        return self.get_db_user.middle_name
+        return self.profile.middle_name
 
     @property
     def c_last_name(self):
-        return self.get_db_user.last_name
+        return self.profile.last_name
 
     @property
     def role_id(self) -> int:
-        return self.get_db_user.user_role_id
+        return self.profile.user_role_id
 
     @property
     def full_name(self) -> str:
-        return self.get_db_user.full_name
+        return self.profile.full_name
 
     @property
     def dob(self) -> str:
-        return self.get_db_user.dob
+        return self.profile.dob
 
     @property
     def phone_number(self) -> str:
-        return self.get_db_user.phone_number
+        return self.profile.phone_number
 
     @property
     def verified_level(self) -> int:
-        return self.get_db_user.verified_level
+        return self.profile.verified_level
 
     @property
     def constant_balance(self) -> Decimal:
@@ -72,35 +77,35 @@ class ConstUser(User):
 
     @property
     def pro_saving_user(self) -> bool:
-        return self.get_db_user.pro_saving_user
+        return self.profile.pro_saving_user
 
     @property
     def agent_user(self) -> bool:
-        return self.get_db_user.agent_user
+        return self.profile.agent_user
 
     @property
     def lo_user(self) -> bool:
-        return self.get_db_user.lo_user
+        return self.profile.lo_user
 
     @property
     def language(self) -> str:
-        return self.get_db_user.language
+        return self.profile.language
 
     @property
     def white_label(self) -> bool:
-        return self.get_db_user.white_label
+        return self.profile.white_label
 
     @property
     def permissions(self) -> str:
-        return self.get_db_user.permissions
+        return self.profile.permissions
 
     @property
     def membership(self) -> int:
-        return self.get_db_user.membership
+        return self.profile.membership
 
     @property
     def withdraw_confirmed_email_on(self) -> bool:
-        return self.get_db_user.withdraw_confirmed_email_on
+        return self.profile.withdraw_confirmed_email_on
 
     @property
     def is_kyc(self) -> bool:
@@ -108,19 +113,19 @@ class ConstUser(User):
 
     @property
     def tax_country(self) -> str:
-        return self.get_db_user.tax_country
+        return self.profile.tax_country
 
     @property
     def suspend_withdrawal_to(self) -> datetime:
-        return self.get_db_user.suspend_withdrawal_to
+        return self.profile.suspend_withdrawal_to
 
     @property
     def account_type(self) -> int:
-        return self.get_db_user.account_type
+        return self.profile.account_type
 
     @property
     def internal_user(self) -> bool:
-        return self.get_db_user.internal_user
+        return self.profile.internal_user
 
     def build_dict(self) -> dict:
         return {
@@ -227,14 +232,31 @@ class Wallet(TimestampedModel):
     name = models.CharField(max_length=255, null=True, blank=True)
     sub_name = models.CharField(max_length=255, null=True, blank=True)
     plaid_id = models.IntegerField(null=True)
+    # Plaid account_id inside the item, none gets every transaction of the access token
+    plaid_account_id = models.CharField(max_length=255, null=True, blank=True)
+    # Last failed lookup of plaid_account_id, it is not looked up again before PLAID_IMPORT['ACCOUNT_RECHECK_DAYS']
+    plaid_account_checked_at = models.DateTimeField(null=True)
     last_import = models.DateField(default=timezone.now)
     error = models.CharField(max_length=255, null=True, blank=True)
     error_details = models.TextField(null=True, blank=True)
     error_at = models.DateTimeField(null=True)
+    # Consecutive failed imports, the wallet is not imported again before retry_at
+    error_count = models.IntegerField(default=0)
+    retry_at = models.DateTimeField(null=True)
     deleted_at = models.DateTimeField(null=True)
 
 
 class Transaction(TimestampedModel):
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'transaction_at'], name='budgeting_tx_user_at_idx'),
+            models.Index(fields=['user_id', 'wallet', 'transaction_at'], name='budgeting_tx_user_wlt_at_idx'),
+            models.Index(fields=['user_id', 'created_at', 'id'], name='budgeting_tx_user_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'external_id'], name='budgeting_tx_wallet_ext_uniq'),
+        ]
+
     user_id = models.IntegerField()
     category = models.ForeignKey(Category,
                                  related_name='category_transactions',
@@ -249,16 +271,98 @@ class Transaction(TimestampedModel):
                                on_delete=models.SET_NULL, null=True)
     transaction_at = models.DateTimeField(null=True, default=timezone.now)
     external_id = models.CharField(max_length=255, null=True, blank=True)
+    # Read from the Plaid payload at import, location is its JSON
+    plaid_account_id = models.CharField(max_length=255, null=True, blank=True)
+    merchant_name = models.CharField(max_length=255, null=True, blank=True)
+    location = models.TextField(null=True, blank=True)
+    location_name = models.CharField(max_length=255, null=True, blank=True)
+    pending = models.BooleanField(default=False)
+    # Legacy copy of the Plaid payload, emptied into TransactionDetail by migration 0028
     detail = models.TextField(null=True, blank=True)
 
+    @cached_property
+    def location_dict(self):
+        try:
+            return json.loads(self.location) if self.location else None
+        except ValueError:
+            return None
+
     @cached_property
     def detail_dict(self):
+        """
+        The Plaid payload, one more query: it is kept out of budgeting_transaction.
+        """
+        try:
+            payload = self.transaction_detail.payload
+        except TransactionDetail.DoesNotExist:
+            payload = self.detail
         try:
-            return json.loads(self.detail)
+            return json.loads(payload)
         except:
             return {}
 
 
+class TransactionDetail(models.Model):
+    # The raw Plaid payload of a transaction, out of the rows the lists and summaries scan
+    transaction = models.OneToOneField(Transaction, related_name='transaction_detail', primary_key=True,
+                                       on_delete=models.CASCADE)
+    payload = models.TextField()
+
+
+class TransactionDailyRollup(models.Model):
+    # Totals of a user's transactions per day, maintained by TransactionAggregateBusiness.
+    # wallet_id / category_id are 0 for the manual wallet / uncategorized transactions.
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'wallet_id', 'day', 'category_id', 'direction'],
+                                    name='budgeting_rollup_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user_id', 'day'], name='budgeting_rollup_user_day_idx'),
+        ]
+
+    user_id = models.IntegerField()
+    wallet_id = models.IntegerField(default=0)
+    category_id = models.IntegerField(default=0)
+    direction = models.CharField(max_length=50, choices=DIRECTION)
+    day = models.DateField()
+    amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+
+class TransactionMonthlyBalance(models.Model):
+    # Income, expense and closing balance of a user's wallet for every month that has transactions,
+    # maintained by TransactionAggregateBusiness. wallet_id ALL_WALLETS holds the total of all wallets.
+    ALL_WALLETS = -1
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'wallet_id', 'month'], name='budgeting_ledger_key_uniq'),
+        ]
+
+    user_id = models.IntegerField()
+    wallet_id = models.IntegerField(default=0)
+    month = models.DateField()
+    income_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    expense_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    closing_balance = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+
+class WalletBalanceCounter(models.Model):
+    # Lifetime income, expense and balance of a user's wallet (0 for the manual wallet),
+    # maintained by TransactionAggregateBusiness
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'wallet_id'], name='budgeting_wallet_counter_uniq'),
+        ]
+
+    user_id = models.IntegerField()
+    wallet_id = models.IntegerField(default=0)
+    income_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    expense_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+
 class Budget(TimestampedModel):
     user_id = models.IntegerField()
     category = models.ForeignKey(Category,
@@ -272,6 +376,27 @@ class Budget(TimestampedModel):
     to_date = models.DateField()
 
 
+class BudgetProgress(models.Model):
+    # Spending of a budget so far, maintained by BudgetProgressBusiness.
+    # is_end is not stored, it is read as to_date < now() on the to_date index.
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'wallet_id', 'category_id', 'from_date'], name='budgeting_bp_match_idx'),
+            models.Index(fields=['user_id', 'wallet_id', 'is_over'], name='budgeting_bp_over_idx'),
+            models.Index(fields=['user_id', 'wallet_id', 'to_date'], name='budgeting_bp_end_idx'),
+        ]
+
+    budget = models.OneToOneField(Budget, related_name='progress', on_delete=models.CASCADE)
+    user_id = models.IntegerField()
+    wallet_id = models.IntegerField(default=0)
+    category_id = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=18, decimal_places=2)
+    current_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    is_over = models.BooleanField(default=False)
+    from_date = models.DateField()
+    to_date = models.DateField()
+
+
 class TaskNote(TimestampedModel):
     user_id = models.IntegerField()
     task = models.CharField(max_length=255, choices=TASK_NOTE)
@@ -280,6 +405,23 @@ class TaskNote(TimestampedModel):
     data = models.TextField(null=True, blank=True)
 
 
+class NotificationOutbox(TimestampedModel):
+    # Written in the transaction of the change that triggers the notification, sent by NotificationDispatcher
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='budgeting_outbox_due_idx'),
+        ]
+
+    user_id = models.IntegerField()
+    notification_type = models.CharField(max_length=50, choices=NOTIFICATION_TYPE)
+    data = models.TextField(null=True, blank=True)
+    status = models.CharField(max_length=50, choices=OUTBOX_STATUS, default=OUTBOX_STATUS.pending)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True)
+    error = models.TextField(null=True, blank=True)
+
+
 class TransactionByDay(models.Model):
     class Meta:
         managed = False
@@ -1,77 +1,88 @@
+from collections import OrderedDict, defaultdict
 from decimal import Decimal
 
 from django.db import connection
 
-from budgeting.models import TransactionByDay, WalletBalance, TransactionByCategory, BudgetDetail
-from common.business import build_month_table, get_now
+from budgeting.models import TransactionByDay, WalletBalance, TransactionByCategory, BudgetDetail, \
+    TransactionMonthlyBalance
+from common.business import get_now, get_period_range, get_month_range
+from common.query_cache import cached_query
 
 
 class TransactionQueries:
+    # by-month, month-summary, summary and summary-by-category read budgeting_transactiondailyrollup,
+    # their cost depends on the number of days in the range rather than on the transaction history.
+
     @staticmethod
+    @cached_query('transaction_by_month')
     def get_transaction_by_month(user_id: int, month: str, wallet_id: int = None):
         wallet_cond = ''
         if wallet_id:
             if wallet_id == '0':
-                wallet_cond = 'and t.wallet_id is null'
+                wallet_cond = 'and r.wallet_id = 0'
             else:
-                wallet_cond = 'and t.wallet_id = %(wallet_id)s'
-
-        txt = '''select t.user_id as id, 
-       t.user_id,
-       sum(if(t.direction = 'expense', t.amount, 0)) as expense_amount,
-       sum(if(t.direction = 'income', t.amount, 0)) as income_amount,
-       date(t.transaction_at) as transaction_at
-from budgeting_transaction t
+                wallet_cond = 'and r.wallet_id = %(wallet_id)s'
+        from_dt, to_dt = get_period_range('month', month)
+
+        txt = '''select r.user_id as id, 
+       r.user_id,
+       sum(if(r.direction = 'expense', r.amount, 0)) as expense_amount,
+       sum(if(r.direction = 'income', r.amount, 0)) as income_amount,
+       r.day as transaction_at
+from budgeting_transactiondailyrollup r
 where 1=1
-and DATE_FORMAT(t.transaction_at, '%%Y-%%m') = %(month)s
-and t.user_id = %(user_id)s
+and r.user_id = %(user_id)s
+and r.day >= %(from_dt)s
+and r.day < %(to_dt)s
 {wallet_cond}
-group by t.user_id, date(t.transaction_at)
+group by r.user_id, r.day
+having sum(r.count) > 0
 '''.format(wallet_cond=wallet_cond)
 
-        qs = TransactionByDay.objects.raw(txt, {'month': month, 'user_id': user_id, 'wallet_id': wallet_id})
+        qs = TransactionByDay.objects.raw(txt, {
+            'user_id': user_id, 'wallet_id': wallet_id, 'from_dt': from_dt, 'to_dt': to_dt
+        })
 
         return qs
 
     @staticmethod
+    @cached_query('transaction_summary')
     def get_transaction_summary(user_id: int, t: str, month: str, wallet_id: int = None):
         wallet_cond = ''
         if wallet_id:
             if wallet_id == '0':
-                wallet_cond = 'and t.wallet_id is null'
+                wallet_cond = 'and r.wallet_id = 0'
             else:
-                wallet_cond = 'and t.wallet_id = %(wallet_id)s'
-        dt_cond = ''
-        prev_dt_cond = 'and 0=1'
-        if t == 'month':
-            dt_cond = "and DATE_FORMAT(t.transaction_at, '%%Y-%%m') = %(month)s"
-            prev_dt_cond = "and DATE_FORMAT(t.transaction_at, '%%Y-%%m') < %(month)s"
-        elif t == 'year':
-            dt_cond = "and DATE_FORMAT(t.transaction_at, '%%Y') = %(month)s"
-            prev_dt_cond = "and DATE_FORMAT(t.transaction_at, '%%Y') < %(month)s"
+                wallet_cond = 'and r.wallet_id = %(wallet_id)s'
+        from_dt, to_dt = get_period_range(t, month)
+        dt_cond = 'and r.day >= %(from_dt)s and r.day < %(to_dt)s'
+        ledger_wallet_id = TransactionMonthlyBalance.ALL_WALLETS
+        if wallet_id:
+            ledger_wallet_id = wallet_id
 
         txt1 = '''select
-    sum(if(t.direction = 'income', t.amount, 0)) as income,
-    sum(if(t.direction = 'expense', t.amount, 0)) as expense,
-    sum(if(t.direction = 'income', t.amount, 0)) - sum(if(t.direction = 'expense', t.amount, 0)) as balance
-from budgeting_transaction t
+    sum(if(r.direction = 'income', r.amount, 0)) as income,
+    sum(if(r.direction = 'expense', r.amount, 0)) as expense,
+    sum(if(r.direction = 'income', r.amount, 0)) - sum(if(r.direction = 'expense', r.amount, 0)) as balance
+from budgeting_transactiondailyrollup r
 where 1=1
-and t.user_id = %(user_id)s
+and r.user_id = %(user_id)s
 {dt_cond}
 {wallet_cond}
-group by t.user_id
+group by r.user_id
 '''.format(wallet_cond=wallet_cond,
            dt_cond=dt_cond)
 
-        txt2 = '''select sum(if(t.direction = 'income', t.amount, 0)) - sum(if(t.direction = 'expense', t.amount, 0)) as balance
-from budgeting_transaction t
+        # Closing balance of the last month before the period, one lookup on the ledger key
+        txt2 = '''select l.closing_balance
+from budgeting_transactionmonthlybalance l
 where 1=1
-and t.user_id = %(user_id)s
-{prev_dt_cond}
-{wallet_cond}
-group by t.user_id
-'''.format(wallet_cond=wallet_cond,
-           prev_dt_cond=prev_dt_cond)
+and l.user_id = %(user_id)s
+and l.wallet_id = %(ledger_wallet_id)s
+and l.month < %(from_dt)s
+order by l.month desc
+limit 1
+'''
 
         data = {
             'expense_amount': 0,
@@ -80,14 +91,16 @@ group by t.user_id
             'previous_balance': 0,
             'balance': 0,
         }
+        params = {'user_id': user_id, 'wallet_id': wallet_id, 'from_dt': from_dt, 'to_dt': to_dt,
+                  'ledger_wallet_id': ledger_wallet_id}
         with connection.cursor() as cursor:
-            cursor.execute(txt1, {'month': month, 'user_id': user_id, 'wallet_id': wallet_id})
+            cursor.execute(txt1, params)
             row = cursor.fetchone()
             if row:
                 data['income_amount'] = row[0]
                 data['expense_amount'] = row[1]
                 data['current_balance'] = row[2]
-            cursor.execute(txt2, {'month': month, 'user_id': user_id, 'wallet_id': wallet_id})
+            cursor.execute(txt2, params)
             row = cursor.fetchone()
             if row:
                 data['previous_balance'] = row[0]
@@ -96,111 +109,192 @@ group by t.user_id
         return data
 
     @staticmethod
+    @cached_query('transaction_summaries')
+    def get_transaction_summaries(user_id: int, t: str, periods: list, wallet_ids: list = None):
+        """
+        get_transaction_summary for several months or years at once, from one query on the ledger.
+        Balances are carried forward in a single pass over the months, so periods do not need to be
+        contiguous. wallet_ids are summed together, '0' is the manual wallet, none means all wallets.
+        """
+        ranges = sorted((get_period_range(t, period), period) for period in set(periods))
+        from_dt, to_dt = ranges[0][0][0], ranges[-1][0][1]
+        ledger_wallet_ids = [int(wallet_id) for wallet_id in wallet_ids] if wallet_ids \
+            else [TransactionMonthlyBalance.ALL_WALLETS]
+
+        # Rows of the span plus, per wallet, the last row before it for the opening balance
+        txt = '''select l.wallet_id, l.month, l.income_amount, l.expense_amount, l.closing_balance
+from budgeting_transactionmonthlybalance l
+left join (
+    select p.wallet_id, max(p.month) as month
+    from budgeting_transactionmonthlybalance p
+    where 1=1
+    and p.user_id = %(user_id)s
+    and p.wallet_id in %(wallet_ids)s
+    and p.month < %(from_dt)s
+    group by p.wallet_id
+) as o on o.wallet_id = l.wallet_id
+where 1=1
+and l.user_id = %(user_id)s
+and l.wallet_id in %(wallet_ids)s
+and l.month >= coalesce(o.month, %(from_dt)s)
+and l.month < %(to_dt)s
+'''
+
+        balance = Decimal(0)
+        months = defaultdict(lambda: [Decimal(0), Decimal(0)])
+        with connection.cursor() as cursor:
+            cursor.execute(txt, {'user_id': user_id, 'wallet_ids': tuple(ledger_wallet_ids),
+                                 'from_dt': from_dt, 'to_dt': to_dt})
+            for _, month, income, expense, closing_balance in cursor.fetchall():
+                if month < from_dt:
+                    balance += closing_balance
+                else:
+                    months[month][0] += income
+                    months[month][1] += expense
+
+        result = []
+        months = sorted(months.items())
+        i = 0
+        for (start, end), period in ranges:
+            # Months between two requested periods only move the balance
+            while i < len(months) and months[i][0] < start:
+                balance += months[i][1][0] - months[i][1][1]
+                i += 1
+            previous_balance = balance
+            income = expense = Decimal(0)
+            while i < len(months) and months[i][0] < end:
+                income += months[i][1][0]
+                expense += months[i][1][1]
+                i += 1
+            balance = previous_balance + income - expense
+            result.append({
+                'period': period,
+                'income_amount': income,
+                'expense_amount': expense,
+                'current_balance': income - expense,
+                'previous_balance': previous_balance,
+                'balance': balance,
+            })
+
+        return result
+
+    @staticmethod
+    @cached_query('transaction_summary_by_category')
     def get_transaction_summary_by_category(user_id: int, t: str, direction: str, month: str,
                                             wallet_id: int = None):
         wallet_cond = ''
         if wallet_id:
             if wallet_id == '0':
-                wallet_cond = 'and t.wallet_id is null'
+                wallet_cond = 'and r.wallet_id = 0'
             else:
-                wallet_cond = 'and t.wallet_id = %(wallet_id)s'
-        dt_cond = ''
-        if t == 'month':
-            dt_cond = "and DATE_FORMAT(t.transaction_at, '%%Y-%%m') = %(month)s"
-        elif t == 'year':
-            dt_cond = "and DATE_FORMAT(t.transaction_at, '%%Y') = %(month)s"
+                wallet_cond = 'and r.wallet_id = %(wallet_id)s'
+        from_dt, to_dt = get_period_range(t, month)
 
         txt = '''
 select bc.id as id, bc.id as category_id, bc.code as category_code, bc.name as category_name, 
-    sum(t.amount) as amount
-from budgeting_transaction t
-join budgeting_category bc on t.category_id = bc.id
+    sum(r.amount) as amount
+from budgeting_transactiondailyrollup r
+join budgeting_category bc on r.category_id = bc.id
 where 1=1
-and t.user_id = %(user_id)s
-and t.direction = %(direction)s
-{dt_cond}
+and r.user_id = %(user_id)s
+and r.day >= %(from_dt)s
+and r.day < %(to_dt)s
+and r.direction = %(direction)s
 {wallet_cond}
 group by bc.id, bc.code, bc.name
-order by sum(t.amount) desc
-'''.format(wallet_cond=wallet_cond, dt_cond=dt_cond)
+having sum(r.count) > 0
+order by sum(r.amount) desc
+'''.format(wallet_cond=wallet_cond)
 
         qs = TransactionByCategory.objects.raw(txt, {
-            'month': month, 'user_id': user_id, 'direction': direction, 'wallet_id': wallet_id
+            'user_id': user_id, 'direction': direction, 'wallet_id': wallet_id, 'from_dt': from_dt, 'to_dt': to_dt
         })
 
         return qs
 
     @staticmethod
-    def get_transaction_summary_category_by_month(user_id: int, category_id: int,
+    @cached_query('transaction_summary_category_by_month')
+    def get_transaction_summary_category_by_month(user_id: int, category_ids: list,
                                                   from_month: str = None, to_month: str = None,
                                                   wallet_id: int = None):
+        """
+        Monthly amounts of each category, one grouped query on the rollup, months without
+        transactions are filled in here. Missing bounds default to the first/last month with data.
+        """
         wallet_cond = ''
         if wallet_id:
             if wallet_id == '0':
-                wallet_cond = 'and t.wallet_id is null'
-            else:
-                wallet_cond = 'and t.wallet_id = %(wallet_id)s'
-
-        txt_month = '''
-select DATE_FORMAT(min(t.transaction_at), '%%Y-%%m'), DATE_FORMAT(max(t.transaction_at), '%%Y-%%m')
-from budgeting_transaction t
-where 1=1
-and t.user_id = %(user_id)s
-and t.category_id = %(category_id)s
-{wallet_cond}
-group by t.user_id, t.category_id
-'''.format(wallet_cond=wallet_cond)
-        with connection.cursor() as cursor:
-            cursor.execute(txt_month, {
-                'user_id': user_id,
-                'wallet_id': wallet_id,
-                'category_id': category_id
-            })
-            months = cursor.fetchone()
-            if months:
-                if not from_month:
-                    from_month = months[0]
-                if not to_month:
-                    to_month = months[1]
+                wallet_cond = 'and r.wallet_id = 0'
             else:
-                from_month = to_month = get_now().strftime('%Y-%m')
-
-        month_table = build_month_table(from_month, to_month)
+                wallet_cond = 'and r.wallet_id = %(wallet_id)s'
+        dt_cond = ''
+        if from_month:
+            dt_cond += 'and r.day >= %(from_dt)s '
+        if to_month:
+            dt_cond += 'and r.day < %(to_dt)s '
 
         txt = '''
-select dt.mth,
-    sum(coalesce(t.amount, 0)) as amount
-from (
-{month_table}
-    ) as dt
-left join budgeting_transaction t on dt.mth = DATE_FORMAT(t.transaction_at, '%%Y-%%m') 
-                                         and t.user_id = %(user_id)s
-                                         and t.category_id = %(category_id)s
-                                         {wallet_cond}
+select r.category_id, DATE_FORMAT(r.day, '%%Y-%%m') as mth, sum(r.amount) as amount
+from budgeting_transactiondailyrollup r
 where 1=1
-group by dt.mth
-order by dt.mth;
-'''.format(wallet_cond=wallet_cond, month_table=month_table)
+and r.user_id = %(user_id)s
+and r.category_id in %(category_ids)s
+{dt_cond}
+{wallet_cond}
+group by r.category_id, mth
+having sum(r.count) > 0
+'''.format(wallet_cond=wallet_cond, dt_cond=dt_cond)
 
-        result = []
+        amounts = {}
         with connection.cursor() as cursor:
             cursor.execute(txt, {
                 'user_id': user_id,
                 'wallet_id': wallet_id,
-                'category_id': category_id
+                'category_ids': tuple(category_ids),
+                'from_dt': get_period_range('month', from_month)[0] if from_month else None,
+                'to_dt': get_period_range('month', to_month)[1] if to_month else None,
             })
-            rows = cursor.fetchall()
-            for row in rows:
-                result.append({
-                    'month': row[0],
-                    'amount': Decimal(row[1])
+            for row in cursor.fetchall():
+                amounts[(row[0], row[1])] = Decimal(row[2])
+
+        if not from_month or not to_month:
+            # From all the data of the categories, not only the months the other bound kept
+            txt_bounds = '''
+select DATE_FORMAT(min(r.day), '%%Y-%%m'), DATE_FORMAT(max(r.day), '%%Y-%%m')
+from budgeting_transactiondailyrollup r
+where 1=1
+and r.user_id = %(user_id)s
+and r.category_id in %(category_ids)s
+and r.count > 0
+{wallet_cond}
+'''.format(wallet_cond=wallet_cond)
+            with connection.cursor() as cursor:
+                cursor.execute(txt_bounds, {
+                    'user_id': user_id,
+                    'wallet_id': wallet_id,
+                    'category_ids': tuple(category_ids),
                 })
+                first_month, last_month = cursor.fetchone()
+            if first_month:
+                from_month = from_month or first_month
+                to_month = to_month or last_month
+            else:
+                from_month = to_month = get_now().strftime('%Y-%m')
 
-        return result
+        months = get_month_range(from_month, to_month)
+        return OrderedDict(
+            (category_id, [{'month': month, 'amount': amounts.get((category_id, month), Decimal(0))}
+                           for month in months])
+            for category_id in category_ids
+        )
 
 
 class WalletQueries:
+    # Balances come from budgeting_walletbalancecounter, one row per wallet of the user, so the cost
+    # does not grow with the transaction history. verify_wallet_balance checks the counters.
+
     @staticmethod
+    @cached_query('wallet_balance')
     def wallet_balance(user_id: int):
         txt = '''
 select *
@@ -212,80 +306,43 @@ select bw.user_id as id,
        bw.name,
        bw.sub_name,
        'linked_bank' as `type`,
-       sum(if(t.direction = 'income', t.amount, 0)) as income_amount,
-       sum(if(t.direction = 'expense', t.amount, 0)) as expense_amount,
-       sum(if(t.direction = 'income', t.amount, 0)) - sum(if(t.direction = 'expense', t.amount, 0)) as balance
+       coalesce(c.income_amount, 0) as income_amount,
+       coalesce(c.expense_amount, 0) as expense_amount,
+       coalesce(c.balance, 0) as balance
 from budgeting_wallet bw
-left join budgeting_transaction t on t.wallet_id = bw.id
+left join budgeting_walletbalancecounter c on c.user_id = bw.user_id and c.wallet_id = bw.id
 where 1=1
 and bw.deleted_at is null
 and bw.user_id = %(user_id)s
-group by bw.user_id, bw.id, bw.plaid_id
 union all
-select r1.id, r1.user_id, r1.wallet_id, r1.plaid_id, r1.name, r1.sub_name, r1.type, 
-       sum(r1.income_amount) as income_amount, sum(r1.expense_amount) as expense_amount, sum(r1.balance) as balance
-from
-(
-    select t.user_id as id,
-           t.user_id,
-           0 as wallet_id,
-           0 as plaid_id,
-           'Manual Balance' as `name`,
-           '' as `sub_name`,
-           'manual_balance' as `type`,
-           sum(if(t.direction = 'income', t.amount, 0)) as income_amount,
-           sum(if(t.direction = 'expense', t.amount, 0)) as expense_amount,
-           sum(if(t.direction = 'income', t.amount, 0)) - sum(if(t.direction = 'expense', t.amount, 0)) as balance
-    from budgeting_transaction t
-    where 1=1
-    and t.wallet_id is null
-    and t.user_id = %(user_id)s
-    group by t.user_id
-    union all
-    select %(user_id)s as id,
-           %(user_id)s as user_id,
-           0 as wallet_id,
-           0 as plaid_id,
-           'Manual Balance' as name,
-           '' as sub_name,
-           'manual_balance' as type,
-           0 as income_amount,
-           0 as expense_amount,
-           0 as balance
-) as r1
-group by r1.id, r1.user_id, r1.wallet_id, r1.plaid_id, r1.name, r1.sub_name, r1.type
+select %(user_id)s as id,
+       %(user_id)s as user_id,
+       0 as wallet_id,
+       0 as plaid_id,
+       'Manual Balance' as `name`,
+       '' as `sub_name`,
+       'manual_balance' as `type`,
+       coalesce(sum(c.income_amount), 0) as income_amount,
+       coalesce(sum(c.expense_amount), 0) as expense_amount,
+       coalesce(sum(c.balance), 0) as balance
+from budgeting_walletbalancecounter c
+where 1=1
+and c.user_id = %(user_id)s
+and c.wallet_id = 0
 union all
-select r2.id, r2.user_id, r2.wallet_id, r2.plaid_id, r2.name, r2.sub_name, r2.type, 
-       sum(r2.income_amount) as income_amount, sum(r2.expense_amount) as expense_amount, sum(r2.balance) as balance
-from
-(
-    select t.user_id as id,
-           t.user_id,
-           null as wallet_id,
-           0 as plaid_id,
-           'Total Balance' as `name`,
-           '' as `sub_name`,
-           'total_balance' as `type`,
-           sum(if(t.direction = 'income', t.amount, 0)) as income_amount,
-           sum(if(t.direction = 'expense', t.amount, 0)) as expense_amount,
-           sum(if(t.direction = 'income', t.amount, 0)) - sum(if(t.direction = 'expense', t.amount, 0)) as balance
-    from budgeting_transaction t
-    where 1=1
-    and t.user_id = %(user_id)s
-    group by t.user_id
-    union all
-    select %(user_id)s as id,
-           %(user_id)s as user_id,
-           null as wallet_id,
-           0 as plaid_id,
-           'Total Balance' as name,
-           '' as sub_name,
-           'total_balance' as type,
-           0 as income_amount,
-           0 as expense_amount,
-           0 as balance
-) as r2
-group by r2.id, r2.user_id, r2.wallet_id, r2.plaid_id, r2.name, r2.sub_name, r2.type
+select %(user_id)s as id,
+       %(user_id)s as user_id,
+       null as wallet_id,
+       0 as plaid_id,
+       'Total Balance' as `name`,
+       '' as `sub_name`,
+       'total_balance' as `type`,
+       coalesce(sum(c.income_amount), 0) as income_amount,
+       coalesce(sum(c.expense_amount), 0) as expense_amount,
+       coalesce(sum(c.balance), 0) as balance
+from budgeting_walletbalancecounter c
+where 1=1
+and c.user_id = %(user_id)s
 ) as r order by r.wallet_id;
 '''
 
@@ -295,45 +352,38 @@ group by r2.id, r2.user_id, r2.wallet_id, r2.plaid_id, r2.name, r2.sub_name, r2.
 
 class BudgetQueries:
     @staticmethod
+    @cached_query('budget_details')
     def get_budget_details(user_id: int, wallet_id: int,
                            is_end: str = None, is_over: str = None):
-
+        # Reads budgeting_budgetprogress, kept up to date on every transaction and budget write
         wallet_cond = ''
         if wallet_id:
             if wallet_id == '0':
-                wallet_cond = 'and b.wallet_id is null'
+                wallet_cond = 'and p.wallet_id = 0'
             else:
-                wallet_cond = 'and b.wallet_id = %(wallet_id)s'
+                wallet_cond = 'and p.wallet_id = %(wallet_id)s'
         is_over_cond = ''
         if is_over is not None:
-            is_over_cond = 'and is_over = {}'.format('1' if str(is_over) == '1' else '0')
+            is_over_cond = 'and p.is_over = {}'.format('1' if str(is_over) == '1' else '0')
         is_end_cond = ''
         if is_end is not None:
-            is_end_cond = 'and is_end = {}'.format('1' if str(is_end) == '1' else '0')
+            is_end_cond = 'and p.to_date {} now()'.format('<' if str(is_end) == '1' else '>=')
 
         txt = '''
-select *
-from
-(
-select b.id,
+select b.id, p.user_id,
        bc.id as category_id, bc.code as category_code, bc.name as category_name,
-       ifnull(b.wallet_id, 0) as wallet_id, b.amount, coalesce(sum(t.amount), 0) as current_amount,
-       if(now() > b.to_date, 1, 0) as is_end,
-       if(sum(t.amount) > b.amount, 1, 0) as is_over,
-       b.from_date, b.to_date
-from budgeting_budget b
+       p.wallet_id, p.amount, p.current_amount,
+       if(now() > p.to_date, 1, 0) as is_end,
+       p.is_over,
+       p.from_date, p.to_date
+from budgeting_budgetprogress p
+join budgeting_budget b on b.id = p.budget_id
 join budgeting_category bc on b.category_id = bc.id
-left join budgeting_transaction t on t.category_id = b.category_id
-                                         and ifnull(b.wallet_id, 0) = ifnull(t.wallet_id, 0)
-                                         and (b.from_date <= t.transaction_at and t.transaction_at < DATE_ADD(b.to_date, interval 1 day))
-where b.user_id = %(user_id)s
+where p.user_id = %(user_id)s
 {wallet_cond}
-group by b.id, bc.id
-) as r
-where 
-1=1
 {is_over_cond}
 {is_end_cond}
+order by b.id
 ;
 '''.format(wallet_cond=wallet_cond, is_over_cond=is_over_cond, is_end_cond=is_end_cond)
 
@@ -1,7 +1,10 @@
+from collections import OrderedDict
 from datetime import date, timedelta
 
+from django.db import transaction
 from django.db.models import Q
 from django_filters import rest_framework as filters
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status
 
@@ -13,6 +16,7 @@ from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet, ModelViewSet, GenericViewSet
 
 from budgeting.business.category import CategoryBusiness
+from budgeting.business.category_tree import CategoryTreeBusiness
 from budgeting.business.wallet import WalletBusiness
 from budgeting.constants import DIRECTION
 from budgeting.models import Category, Transaction, Wallet, CategoryGroup, Budget
@@ -20,8 +24,9 @@ from budgeting.queries import TransactionQueries, WalletQueries, BudgetQueries
 from budgeting.serializers import CategorySerializer, TransactionSerializer, TransactionByDaySerializer, \
     WalletSerializer, CategoryGroupSerializer, WalletBalanceSerializer, TransactionLinkedBankSerializer, \
     WriteCategorySerializer, TransactionByCategorySerializer, BudgetSerializer, BudgetDetailSerializer
-from common.business import get_now
-from common.http import StandardPagination
+from common.business import get_now, get_month_range, get_period_range
+from common.http import StandardPagination, StandardCursorPagination, ndjson_response, csv_response
+from common.models import iter_keyset
 from constant_core.business import ConstantCoreBusiness
 
 
@@ -35,23 +40,19 @@ class CategoryGroupViewSet(ReadOnlyModelViewSet):
         return qs
 
     def list(self, request, *args, **kwargs):
-        # Inherited
-        queryset = self.filter_queryset(self.get_queryset())
-
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(queryset, many=True)
-        # End
-
-        # Hack serializer
-        data = serializer.data
-        result = [item for item in data if len(item['categories']) > 0]
-        # End
+        # Global categories plus the caller's own, from CategoryTreeBusiness's cache.
+        # The ETag changes with any category write, If-None-Match revalidates without a query.
+        user_id = request.user.user_id
+        direction = request.query_params.get('direction')
+        versions = CategoryTreeBusiness.get_versions(user_id)
+        etag = CategoryTreeBusiness.get_etag(versions, direction) if versions else None
+        if etag and etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
 
-        return Response(result)
+        response = Response(CategoryTreeBusiness.get_tree(user_id, versions, direction))
+        if etag:
+            response['ETag'] = etag
+        return response
 
 
 class CategoryFilter(filters.FilterSet):
@@ -120,7 +121,7 @@ class WalletViewSet(mixins.CreateModelMixin,
         if not plaid_id:
             raise ValidationError('plaid_id is required')
 
-        wallet = WalletBusiness.add_wallet(request.user, plaid_id)
+        wallet = WalletBusiness.add_wallet(request.user, plaid_id, request.data.get('plaid_account_id'))
 
         serializer = WalletSerializer(wallet)
         headers = self.get_success_headers(serializer.data)
@@ -160,10 +161,21 @@ class TransactionViewSet(ModelViewSet):
     serializer_class = TransactionSerializer
     queryset = Transaction.objects.none()
     pagination_class = StandardPagination
+    MAX_SUMMARY_PERIODS = 120
+
+    @property
+    def paginator(self):
+        # ?pagination=cursor opts in to cursor pagination on created_at (no count query), for infinite scroll
+        if not hasattr(self, '_paginator') and self.pagination_class is not None \
+                and self.request.query_params.get('pagination') == 'cursor':
+            self._paginator = StandardCursorPagination()
+        return super(TransactionViewSet, self).paginator
 
     def get_queryset(self):
         qs = Transaction.objects.filter(user_id=self.request.user.user_id,
-                                        wallet__deleted_at__isnull=True)
+                                        wallet__deleted_at__isnull=True) \
+            .select_related('category') \
+            .defer('detail')
         wallet_id = self.request.query_params.get('wallet_id')
         if wallet_id is not None:
             if wallet_id == '0':
@@ -179,7 +191,7 @@ class TransactionViewSet(ModelViewSet):
                 else:
                     qs = qs.filter(category=cat)
 
-        qs = qs.order_by('-created_at')
+        qs = qs.order_by('-created_at', '-id')
 
         return qs
 
@@ -188,9 +200,18 @@ class TransactionViewSet(ModelViewSet):
         if not request.user.user_id == obj.user_id:
             self.permission_denied(request)
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(user_id=self.request.user.user_id)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
     def get_serializer(self, *args, **kwargs):
         serializer_class = self.get_serializer_class()
 
@@ -247,6 +268,46 @@ class TransactionViewSet(ModelViewSet):
 
         return Response(data)
 
+    @action(detail=False, methods=['get'], url_path='summaries')
+    def summaries(self, request):
+        # Format: periods=2021-01,2021-03 or from=2021-01&to=2021-06 (YYYY with type=year)
+        t = request.query_params.get('type', 'month')
+        if t not in ('year', 'month'):
+            raise ValidationError('Invalid type. Possible values: year|month')
+        periods = [item for value in request.query_params.getlist('periods')
+                   for item in value.split(',') if item]
+        from_period = request.query_params.get('from')
+        to_period = request.query_params.get('to')
+        if not periods:
+            if not from_period or not to_period:
+                raise ValidationError('periods or from/to is required as format YYYY|YYYY-MM')
+            # Counted before expanding, a huge from/to is rejected without building the list
+            if t == 'month':
+                from_dt = get_period_range('month', from_period)[0]
+                to_dt = get_period_range('month', to_period)[0]
+                span = (to_dt.year - from_dt.year) * 12 + to_dt.month - from_dt.month + 1
+            elif from_period.isdigit() and to_period.isdigit():
+                span = int(to_period) - int(from_period) + 1
+            else:
+                span = 0
+            if span > self.MAX_SUMMARY_PERIODS:
+                raise ValidationError('At most {} periods'.format(self.MAX_SUMMARY_PERIODS))
+            if span > 0:
+                periods = get_month_range(from_period, to_period) if t == 'month' else \
+                    [str(year) for year in range(int(from_period), int(to_period) + 1)]
+        if not periods:
+            raise ValidationError('Invalid from/to')
+        if len(periods) > self.MAX_SUMMARY_PERIODS:
+            raise ValidationError('At most {} periods'.format(self.MAX_SUMMARY_PERIODS))
+        wallet_ids = [item for value in request.query_params.getlist('wallet')
+                      for item in value.split(',') if item]
+        if not all(wallet_id.isdigit() for wallet_id in wallet_ids):
+            raise ValidationError('Invalid wallet')
+
+        data = TransactionQueries.get_transaction_summaries(request.user.user_id, t, periods, wallet_ids=wallet_ids)
+
+        return Response(data)
+
     @action(detail=False, methods=['get'], url_path='summary-by-category')
     def summary_by_category(self, request):
         # Format: 2021-02 / 2021
@@ -273,18 +334,42 @@ class TransactionViewSet(ModelViewSet):
         from_month = request.query_params.get('from_month')
         to_month = request.query_params.get('to_month')
         wallet_id = request.query_params.get('wallet')
-        category_id = request.query_params.get('category_id')
-        if not category_id:
+        # Several categories: ?category_id=1&category_id=2 or ?category_id=1,2
+        category_ids = [item for value in request.query_params.getlist('category_id')
+                        for item in value.split(',') if item]
+        if not category_ids:
             raise ValidationError('category_id is required')
+        try:
+            category_ids = list(OrderedDict.fromkeys(int(item) for item in category_ids))
+        except ValueError:
+            raise ValidationError('Invalid category_id')
 
         data = TransactionQueries.get_transaction_summary_category_by_month(
-            request.user.user_id, category_id, from_month, to_month, wallet_id=wallet_id)
+            request.user.user_id, category_ids, from_month, to_month, wallet_id=wallet_id)
 
-        return Response(data)
+        if len(category_ids) == 1:
+            return Response(data[category_ids[0]])
+        return Response([{'category_id': category_id, 'months': months} for category_id, months in data.items()])
 
 
 class TransactionNoPagingViewSet(TransactionViewSet):
     pagination_class = None
+    STREAM_CHUNK_SIZE = 500
+
+    def list(self, request, *args, **kwargs):
+        # ?stream=ndjson|csv streams the rows as they are read, memory stays flat whatever the history size
+        stream = request.query_params.get('stream')
+        if stream is None:
+            return super(TransactionNoPagingViewSet, self).list(request, *args, **kwargs)
+        if stream not in ('ndjson', 'csv'):
+            raise ValidationError('stream must be ndjson or csv')
+
+        serializer = self.get_serializer()
+        qs = self.filter_queryset(self.get_queryset())
+        rows = (serializer.to_representation(obj) for obj in iter_keyset(qs, self.STREAM_CHUNK_SIZE))
+        if stream == 'ndjson':
+            return ndjson_response(rows)
+        return csv_response(rows, serializer.Meta.fields, 'transactions.csv')
 
 
 class BudgetViewSet(ModelViewSet):
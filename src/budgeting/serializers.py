@@ -1,3 +1,4 @@
+from django.db.models import Q
 from rest_framework import serializers
 
 from budgeting.business.category import CategoryBusiness
@@ -37,6 +38,8 @@ class CategoryGroupSerializer(serializers.ModelSerializer):
     def get_categories(self, instance):
         qs = instance.group_categories.filter(deleted_at__isnull=True)
         if 'request' in self.context:
+            # Global categories and the caller's own
+            qs = qs.filter(Q(user_id__isnull=True) | Q(user_id=self.context['request'].user.user_id))
             direction = self.context['request'].query_params.get('direction')
             if direction:
                 qs = qs.filter(direction=direction)
@@ -48,7 +51,7 @@ class CategoryGroupSerializer(serializers.ModelSerializer):
 class WalletSerializer(serializers.ModelSerializer):
     class Meta:
         model = Wallet
-        fields = ('id', 'name', 'sub_name', 'plaid_id')
+        fields = ('id', 'name', 'sub_name', 'plaid_id', 'plaid_account_id')
 
 
 class WalletBalanceSerializer(serializers.ModelSerializer):
@@ -75,14 +78,20 @@ class TransactionSerializer(serializers.ModelSerializer):
         return instance.wallet_id if instance.wallet_id else 0
 
     def get_category_detail(self, instance):
-        category = instance.category
-        if not category:
-            category = CategoryBusiness.default_category(instance.direction)
-
-        return {
-            'code': category.code if category else Category.DEFAULT_CODE,
-            'name': category.name if category else 'Others'
-        }
+        # A list reuses one serializer for every row, each category is resolved once
+        if not hasattr(self, '_category_details'):
+            self._category_details = {}
+        key = instance.category_id or instance.direction
+        if key not in self._category_details:
+            category = instance.category
+            if not category:
+                category = CategoryBusiness.default_category(instance.direction)
+
+            self._category_details[key] = {
+                'code': category.code if category else Category.DEFAULT_CODE,
+                'name': category.name if category else 'Others'
+            }
+        return self._category_details[key]
 
     def get_category_code(self, instance):
         return self.get_category_detail(instance)['code']
@@ -91,10 +100,10 @@ class TransactionSerializer(serializers.ModelSerializer):
         return self.get_category_detail(instance)['name']
 
     def get_location_name(self, instance):
-        return instance.detail_dict.get('location_name')
+        return instance.location_name
 
     def get_location(self, instance):
-        return instance.detail_dict.get('location')
+        return instance.location_dict
 
     def validate(self, attrs):
         if 'category' not in attrs:
@@ -0,0 +1,93 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from budgeting.business.aggregate import TransactionAggregateBusiness, TransactionEntry, ENTRY_FIELDS
+from budgeting.business.budget import BudgetProgressBusiness
+from budgeting.business.category_tree import category_scope
+from budgeting.models import Transaction, Budget, Wallet, Category, CategoryGroup
+from common.query_cache import bump_generation, GLOBAL
+
+
+@receiver(pre_save, sender=Transaction)
+def transaction_pre_save(sender, instance, raw=False, **kwargs):
+    instance._aggregate_entry = None
+    if raw or instance._state.adding:
+        return
+
+    values = Transaction.objects.filter(pk=instance.pk).values(*ENTRY_FIELDS).first()
+    if values:
+        instance._aggregate_entry = TransactionEntry.from_values(values)
+
+
+@receiver(post_save, sender=Transaction)
+def transaction_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    old_entry = getattr(instance, '_aggregate_entry', None)
+    new_entry = TransactionEntry.from_instance(instance)
+    if old_entry != new_entry:
+        TransactionAggregateBusiness.apply(removed=[old_entry] if old_entry else [], added=[new_entry])
+    instance._aggregate_entry = new_entry
+
+
+@receiver(post_delete, sender=Transaction)
+def transaction_post_delete(sender, instance, **kwargs):
+    TransactionAggregateBusiness.apply(removed=[TransactionEntry.from_instance(instance)])
+
+
+# Deleting a category or a wallet sets it NULL on its transactions with one UPDATE, without their signals
+DETACHED_FIELD = {
+    Category: 'category_id',
+    Wallet: 'wallet_id',
+}
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Wallet)
+def detach_transactions_pre_delete(sender, instance, **kwargs):
+    instance._aggregate_entries = TransactionEntry.aggregate(
+        Transaction.objects.filter(**{DETACHED_FIELD[sender]: instance.pk}))
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Wallet)
+def detach_transactions_post_delete(sender, instance, **kwargs):
+    entries = getattr(instance, '_aggregate_entries', None)
+    if entries:
+        TransactionAggregateBusiness.apply(removed=entries,
+                                           added=[entry._replace(**{DETACHED_FIELD[sender]: None})
+                                                  for entry in entries])
+
+
+@receiver(post_save, sender=Budget)
+def budget_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    BudgetProgressBusiness.refresh(instance)
+    bump_generation(instance.user_id)
+
+
+@receiver(post_delete, sender=Budget)
+@receiver(post_save, sender=Wallet)
+@receiver(post_delete, sender=Wallet)
+def user_data_changed(sender, instance, **kwargs):
+    bump_generation(instance.user_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Categories without user are shared by everyone
+    if instance.user_id:
+        bump_generation(instance.user_id)
+        bump_generation(category_scope(instance.user_id))
+    else:
+        bump_generation(GLOBAL)
+
+
+@receiver(post_save, sender=CategoryGroup)
+@receiver(post_delete, sender=CategoryGroup)
+def category_group_changed(sender, instance, **kwargs):
+    bump_generation(GLOBAL)
@@ -0,0 +1,59 @@
+"""
+Benchmark, not part of the default test run (test*.py), run it explicitly:
+
+    python manage.py test budgeting.tests.bench_import --settings=conf.settings.test
+
+Plaid is replaced by PlaidManagementMock with a simulated network latency, workers need their own
+connections so the data is committed (TransactionTestCase).
+"""
+import time
+from datetime import timedelta
+
+from django.test import TransactionTestCase
+
+from budgeting.business.category import CategoryBusiness
+from budgeting.business.plaid_import import PlaidImportRunner
+from budgeting.constants import DIRECTION
+from budgeting.factories import WalletFactory, CategoryFactory
+from budgeting.models import Category
+from common.business import get_now
+from common.test_mocks import CoreMock, PlaidManagementMock, BudgetingNotificationMock
+
+
+class PlaidImportBenchmark(TransactionTestCase):
+    wallet_count = 40
+    transaction_count = 20
+    plaid_latency = 0.1
+
+    def setUp(self):
+        CategoryBusiness.category_default = None
+        CategoryFactory(code=Category.DEFAULT_CODE, direction=DIRECTION.income)
+        CategoryFactory(code=Category.DEFAULT_CODE, direction=DIRECTION.expense)
+        CoreMock().get_plaid_accounts()
+        PlaidManagementMock().get_accounts()
+        BudgetingNotificationMock().noti_transaction_imported()
+
+        transactions = [{
+            'transaction_id': 'tx-{}'.format(i),
+            'amount': 10 + i,
+            'iso_currency_code': 'USD',
+            'name': 'Coffee',
+            'date': get_now().strftime('%Y-%m-%d'),
+            'category': [],
+        } for i in range(self.transaction_count)]
+        plaid_mock = PlaidManagementMock().get_transaction_pages(transactions)
+        plaid_mock.side_effect = lambda *args, **kwargs: time.sleep(self.plaid_latency) or iter([transactions])
+
+    def reset_wallets(self):
+        last_import = get_now().today() - timedelta(days=1)
+        # One Plaid item per wallet, every wallet is a fetch of its own
+        return [WalletFactory(user_id=1, last_import=last_import, plaid_id=i + 1) for i in range(self.wallet_count)]
+
+    def test_import(self):
+        for max_workers in (1, 4, 8):
+            self.reset_wallets()
+            summary = PlaidImportRunner(max_workers=max_workers, max_wallets=self.wallet_count).run()
+            self.assertEqual(summary['success'], self.wallet_count)
+            print('\n{} wallets, {} workers: {:.2f}s, {} wallets/s, latency avg {}s max {}s'.format(
+                self.wallet_count, max_workers, summary['elapsed'], summary['wallets_per_second'],
+                summary['latency']['avg'], summary['latency']['max']))
@@ -0,0 +1,102 @@
+"""
+Benchmark, not part of the default test run (test*.py), run it explicitly:
+
+    python manage.py test budgeting.tests.bench_plaid_pages --settings=conf.settings.test
+
+Peak RSS only grows within a process, the streaming import runs first and the accumulating one
+(every page in one list, the previous behaviour) after it.
+"""
+import resource
+import time
+from datetime import date, timedelta
+from unittest.mock import MagicMock
+
+from django.test import TestCase
+
+from budgeting.business.category import CategoryBusiness
+from budgeting.business.transaction import TransactionBusiness
+from budgeting.constants import DIRECTION
+from budgeting.factories import WalletFactory, CategoryFactory
+from budgeting.models import Category, Transaction
+from common.test_mocks import CoreMock
+from integration_3rdparty import plaid
+from integration_3rdparty.plaid import PlaidManagement
+
+
+class SyntheticPlaidTransactions(object):
+    """
+    Plaid /transactions/get of an account with `total` transactions, pages are built on request.
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+
+    def get(self, access_token, start_date, end_date, count=100, offset=0):
+        return {
+            'transactions': [self.transaction(i) for i in range(offset, min(offset + count, self.total))],
+            'total_transactions': self.total,
+        }
+
+    @staticmethod
+    def transaction(i: int):
+        return {
+            'transaction_id': 'synthetic-{}'.format(i),
+            'account_id': 'synthetic-account',
+            'amount': (i % 200) - 50.25,
+            'iso_currency_code': 'USD',
+            'name': 'Merchant {}'.format(i % 500),
+            'merchant_name': 'Merchant {}'.format(i % 500),
+            'date': (date(2021, 1, 1) + timedelta(days=i % 60)).strftime('%Y-%m-%d'),
+            'category': ['Food and Drink', 'Restaurants'],
+            'category_id': '13005000',
+            'location': {'address': None, 'city': 'San Francisco', 'region': 'CA', 'postal_code': None,
+                         'country': 'US', 'lat': None, 'lon': None},
+            'payment_channel': 'in store',
+            'pending': False,
+        }
+
+
+class PlaidPagesBenchmark(TestCase):
+    transaction_count = 50000
+
+    def setUp(self):
+        CategoryBusiness.category_default = None
+        CategoryFactory(code=Category.DEFAULT_CODE, direction=DIRECTION.income)
+        CategoryFactory(code=Category.DEFAULT_CODE, direction=DIRECTION.expense)
+        CoreMock().get_plaid_account()
+        CoreMock().get_plaid_accounts()
+
+        self.client_original = plaid.client
+        plaid.client = MagicMock()
+        plaid.client.Transactions = SyntheticPlaidTransactions(self.transaction_count)
+        plaid.client.Accounts.get.return_value = {'accounts': []}
+
+    def tearDown(self):
+        plaid.client = self.client_original
+
+    def measure(self, func):
+        wallet = WalletFactory(user_id=1, plaid_id=1)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        func(wallet)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(Transaction.objects.filter(wallet=wallet).count(), self.transaction_count)
+        # KiB on Linux
+        return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+    @staticmethod
+    def import_streaming(wallet):
+        TransactionBusiness.import_transaction_from_plaid(wallet.user_id, wallet)
+
+    @staticmethod
+    def import_accumulated(wallet):
+        transactions = []
+        for page in PlaidManagement.get_transaction_pages('token', '2021-01-01', '2021-03-01'):
+            transactions.extend(page)
+        TransactionBusiness.save_plaid_transactions(wallet.user_id, wallet, transactions)
+
+    def test_peak_rss(self):
+        streaming_time, streaming_rss = self.measure(self.import_streaming)
+        accumulated_time, accumulated_rss = self.measure(self.import_accumulated)
+        print('\n{} transactions: streaming {:.1f}s / +{} KiB peak RSS, accumulated {:.1f}s / +{} KiB peak RSS'.format(
+            self.transaction_count, streaming_time, streaming_rss, accumulated_time, accumulated_rss))
@@ -0,0 +1,58 @@
+"""
+Benchmark, not part of the default test run (test*.py), run it explicitly:
+
+    python manage.py test budgeting.tests.bench_summaries --settings=conf.settings.test
+"""
+import time
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from budgeting.constants import DIRECTION
+from budgeting.factories import TransactionFactory
+from budgeting.queries import TransactionQueries
+
+
+class SummariesBenchmark(TestCase):
+    user_id = 1
+    month_count = 24
+    rounds = 5
+
+    def setUp(self):
+        start = datetime(2019, 1, 1)
+        for i in range(self.month_count):
+            TransactionFactory.create_batch(3, user_id=self.user_id, transaction_at=start + relativedelta(months=i),
+                                            direction=DIRECTION.income)
+            TransactionFactory.create_batch(2, user_id=self.user_id, transaction_at=start + relativedelta(months=i),
+                                            direction=DIRECTION.expense)
+        self.months = [(start + relativedelta(months=i)).strftime('%Y-%m') for i in range(self.month_count)]
+
+    def run_sequential(self):
+        return [TransactionQueries.get_transaction_summary(self.user_id, 'month', month) for month in self.months]
+
+    def run_batch(self):
+        return TransactionQueries.get_transaction_summaries(self.user_id, 'month', self.months)
+
+    def measure(self, func):
+        with CaptureQueriesContext(connection) as ctx:
+            result = func()
+        started = time.perf_counter()
+        for _ in range(self.rounds):
+            func()
+        return result, len(ctx.captured_queries), (time.perf_counter() - started) / self.rounds
+
+    def test_summaries(self):
+        sequential, sequential_queries, sequential_time = self.measure(self.run_sequential)
+        batch, batch_queries, batch_time = self.measure(self.run_batch)
+
+        for expected, item in zip(sequential, batch):
+            for key in expected:
+                self.assertEqual(expected[key], item[key])
+
+        print('\n{} months: {} x get_transaction_summary {:.2f} ms / {} queries, '
+              'get_transaction_summaries {:.2f} ms / {} queries'.format(
+                  self.month_count, self.month_count, sequential_time * 1000, sequential_queries,
+                  batch_time * 1000, batch_queries))
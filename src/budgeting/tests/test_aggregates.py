@@ -0,0 +1,192 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.apps import apps
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from budgeting.business.aggregate import TransactionAggregateBusiness
+from budgeting.business.category import CategoryBusiness
+from budgeting.constants import DIRECTION
+from budgeting.factories import CategoryFactory, TransactionFactory, WalletFactory
+from budgeting.migrations._aggregates import rebuild_aggregates
+from budgeting.models import TransactionDailyRollup, Category, TransactionMonthlyBalance, WalletBalanceCounter
+from common.test_utils import AuthenticationUtils
+
+
+class TransactionRollupTests(APITestCase):
+    def setUp(self):
+        self.auth_utils = AuthenticationUtils(self.client)
+        self.user_id = self.auth_utils.user_login()
+        self.url = reverse('budget:transaction-list')
+        CategoryBusiness.category_default = None
+
+    def get_rollup(self):
+        return {
+            (r.wallet_id, r.day, r.category_id, r.direction): (r.amount, r.count)
+            for r in TransactionDailyRollup.objects.filter(user_id=self.user_id) if r.count
+        }
+
+    def get_ledger(self):
+        return {
+            (b.wallet_id, b.month): (b.income_amount, b.expense_amount, b.closing_balance)
+            for b in TransactionMonthlyBalance.objects.filter(user_id=self.user_id)
+            if b.income_amount or b.expense_amount
+        }
+
+    def get_counters(self):
+        return {
+            c.wallet_id: (c.income_amount, c.expense_amount, c.balance)
+            for c in WalletBalanceCounter.objects.filter(user_id=self.user_id)
+            if c.income_amount or c.expense_amount
+        }
+
+    def assertRollupConsistent(self):
+        rollup, ledger, counters = self.get_rollup(), self.get_ledger(), self.get_counters()
+        TransactionAggregateBusiness.rebuild_user(self.user_id)
+        self.assertEqual(rollup, self.get_rollup())
+        self.assertEqual(ledger, self.get_ledger())
+        self.assertEqual(counters, self.get_counters())
+
+    def test_create(self):
+        cat = CategoryFactory()
+        wallet = WalletFactory(user_id=self.user_id)
+        TransactionFactory.create_batch(3, user_id=self.user_id, transaction_at=datetime(2021, 1, 1),
+                                        direction=DIRECTION.expense, category=cat, wallet=wallet)
+        data = {
+            'category': cat.id,
+            'amount': '10.00',
+            'direction': DIRECTION.expense,
+            'transaction_at': '2021-01-01T10:00:00',
+        }
+        response = self.client.post(self.url, data=data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        rollup = self.get_rollup()
+        self.assertEqual(rollup[(wallet.id, date(2021, 1, 1), cat.id, DIRECTION.expense)], (Decimal(30), 3))
+        self.assertEqual(rollup[(0, date(2021, 1, 1), cat.id, DIRECTION.expense)], (Decimal(10), 1))
+        self.assertRollupConsistent()
+
+    def test_update(self):
+        cat_1 = CategoryFactory()
+        cat_2 = CategoryFactory()
+        obj = TransactionFactory(user_id=self.user_id, transaction_at=datetime(2021, 1, 1),
+                                 direction=DIRECTION.expense, category=cat_1)
+        data = {
+            'category': cat_2.id,
+            'amount': '25.00',
+            'direction': DIRECTION.income,
+            'transaction_at': '2021-02-03T00:00:00',
+        }
+        response = self.client.put(self.url + '{}/'.format(obj.id), data=data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        rollup = self.get_rollup()
+        self.assertEqual(len(rollup), 1)
+        self.assertEqual(rollup[(0, date(2021, 2, 3), cat_2.id, DIRECTION.income)], (Decimal(25), 1))
+        self.assertRollupConsistent()
+
+    def test_delete(self):
+        cat = CategoryFactory()
+        obj = TransactionFactory(user_id=self.user_id, transaction_at=datetime(2021, 1, 1), category=cat)
+        TransactionFactory(user_id=self.user_id, transaction_at=datetime(2021, 1, 1), category=cat)
+
+        response = self.client.delete(self.url + '{}/'.format(obj.id), format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.get_rollup()[(0, date(2021, 1, 1), cat.id, DIRECTION.expense)], (Decimal(10), 1))
+        self.assertRollupConsistent()
+
+    def test_remove_user_category(self):
+        default_cat = CategoryFactory(code=Category.DEFAULT_CODE, direction=DIRECTION.income)
+        cat = CategoryFactory(user_id=self.user_id, direction=DIRECTION.income)
+        TransactionFactory.create_batch(2, user_id=self.user_id, transaction_at=datetime(2021, 1, 1),
+                                        direction=DIRECTION.income, category=cat)
+
+        CategoryBusiness.remove_user_category(cat)
+
+        rollup = self.get_rollup()
+        self.assertEqual(len(rollup), 1)
+        self.assertEqual(rollup[(0, date(2021, 1, 1), default_cat.id, DIRECTION.income)], (Decimal(20), 2))
+        self.assertRollupConsistent()
+
+    def test_remove_user_category_other_rows(self):
+        default_cat = CategoryFactory(code=Category.DEFAULT_CODE, direction=DIRECTION.income)
+        cat = CategoryFactory(user_id=self.user_id, direction=DIRECTION.income)
+        TransactionFactory(user_id=self.user_id, transaction_at=datetime(2021, 1, 1),
+                           direction=DIRECTION.income, category=cat)
+        # Not moved to the default category, left to the delete
+        TransactionFactory(user_id=self.user_id, transaction_at=datetime(2021, 1, 1),
+                           direction=DIRECTION.expense, category=cat, amount=Decimal(4))
+        TransactionFactory(user_id=self.user_id + 1, transaction_at=datetime(2021, 1, 1),
+                           direction=DIRECTION.income, category=cat)
+
+        CategoryBusiness.remove_user_category(cat)
+
+        self.assertEqual(self.get_rollup(), {
+            (0, date(2021, 1, 1), default_cat.id, DIRECTION.income): (Decimal(10), 1),
+            (0, date(2021, 1, 1), 0, DIRECTION.expense): (Decimal(4), 1),
+        })
+        self.assertEqual(self.get_ledger()[(TransactionMonthlyBalance.ALL_WALLETS, date(2021, 1, 1))],
+                         (Decimal(10), Decimal(4), Decimal(6)))
+        self.assertRollupConsistent()
+        other = TransactionDailyRollup.objects.filter(user_id=self.user_id + 1, count__gt=0)
+        self.assertEqual([(r.category_id, r.amount, r.count) for r in other], [(0, Decimal(10), 1)])
+
+    def test_hard_delete_category_and_wallet(self):
+        cat = CategoryFactory(user_id=self.user_id)
+        wallet = WalletFactory(user_id=self.user_id)
+        TransactionFactory.create_batch(2, user_id=self.user_id, transaction_at=datetime(2021, 1, 1),
+                                        category=cat, wallet=wallet)
+
+        Category.objects.filter(id=cat.id).delete()
+        self.assertEqual(self.get_rollup(), {(wallet.id, date(2021, 1, 1), 0, DIRECTION.expense): (Decimal(20), 2)})
+        self.assertRollupConsistent()
+
+        wallet.delete()
+        self.assertEqual(self.get_rollup(), {(0, date(2021, 1, 1), 0, DIRECTION.expense): (Decimal(20), 2)})
+        self.assertEqual(self.get_counters(), {0: (Decimal(0), Decimal(20), Decimal(-20))})
+        self.assertRollupConsistent()
+
+    def test_migration_backfill(self):
+        wallet = WalletFactory(user_id=self.user_id)
+        TransactionFactory(user_id=self.user_id, wallet=wallet, transaction_at=datetime(2021, 1, 5),
+                           direction=DIRECTION.income, amount=Decimal(100))
+        TransactionFactory(user_id=self.user_id, transaction_at=datetime(2021, 2, 5), category=CategoryFactory())
+        TransactionFactory(user_id=self.user_id, transaction_at=None)
+        rollup, ledger, counters = self.get_rollup(), self.get_ledger(), self.get_counters()
+        for model in (TransactionDailyRollup, TransactionMonthlyBalance, WalletBalanceCounter):
+            model.objects.all().delete()
+
+        rebuild_aggregates(apps, [self.user_id])
+        self.assertEqual(rollup, self.get_rollup())
+        self.assertEqual(ledger, self.get_ledger())
+        self.assertEqual(counters, self.get_counters())
+
+    def test_backdated_update(self):
+        TransactionFactory(user_id=self.user_id, transaction_at=datetime(2021, 1, 5), direction=DIRECTION.income)
+        TransactionFactory(user_id=self.user_id, transaction_at=datetime(2021, 3, 5), direction=DIRECTION.expense)
+        obj = TransactionFactory(user_id=self.user_id, transaction_at=datetime(2021, 3, 6),
+                                 direction=DIRECTION.income, amount=Decimal(50))
+
+        # Move the income back to February, January is untouched and March is carried forward
+        obj.transaction_at = datetime(2021, 2, 1)
+        obj.save()
+
+        all_wallets = TransactionMonthlyBalance.ALL_WALLETS
+        ledger = self.get_ledger()
+        self.assertEqual(ledger[(all_wallets, date(2021, 1, 1))][2], Decimal(10))
+        self.assertEqual(ledger[(all_wallets, date(2021, 2, 1))][2], Decimal(60))
+        self.assertEqual(ledger[(all_wallets, date(2021, 3, 1))][2], Decimal(50))
+        self.assertRollupConsistent()
+
+    def test_wallet_balance_counter(self):
+        wallet = WalletFactory(user_id=self.user_id)
+        TransactionFactory(user_id=self.user_id, wallet=wallet, direction=DIRECTION.income, amount=100)
+        TransactionFactory(user_id=self.user_id, wallet=wallet, direction=DIRECTION.expense, amount=30)
+        TransactionFactory(user_id=self.user_id, direction=DIRECTION.expense, amount=5, transaction_at=None)
+
+        counters = self.get_counters()
+        self.assertEqual(counters[wallet.id], (Decimal(100), Decimal(30), Decimal(70)))
+        self.assertEqual(counters[0], (Decimal(0), Decimal(5), Decimal(-5)))
+        self.assertRollupConsistent()
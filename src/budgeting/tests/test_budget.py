@@ -1,11 +1,15 @@
-from datetime import datetime
+from datetime import datetime, date
 from decimal import Decimal
 
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from budgeting.business.aggregate import TransactionEntry
+from budgeting.business.budget import BudgetProgressBusiness
+from budgeting.constants import DIRECTION, TASK_NOTE, NOTIFICATION_TYPE
 from budgeting.factories import WalletFactory, CategoryFactory, BudgetFactory, TransactionFactory
+from budgeting.models import BudgetProgress, TaskNote, NotificationOutbox
 from common.test_utils import AuthenticationUtils
 
 
@@ -130,3 +134,59 @@ class BudgetTests(APITestCase):
         self.assertEqual(Decimal(data[0]['current_amount']), Decimal(60))
         self.assertEqual(Decimal(data[0]['is_end']), True)
         self.assertEqual(Decimal(data[0]['is_over']), False)
+
+    def test_progress_follows_writes(self):
+        wallet = WalletFactory()
+        cat = CategoryFactory()
+        budget = BudgetFactory(user_id=self.user_id, wallet=wallet, category=cat, amount=Decimal(25),
+                               from_date=datetime(2021, 1, 1), to_date=datetime(2100, 1, 31))
+        txs = TransactionFactory.create_batch(3, user_id=self.user_id, transaction_at=datetime(2021, 1, 1),
+                                              wallet=wallet, category=cat)
+        self.assertEqual(BudgetProgress.objects.get(budget=budget).is_over, True)
+
+        # Moved out of the budget window
+        txs[0].transaction_at = datetime(2020, 12, 31)
+        txs[0].save()
+        progress = BudgetProgress.objects.get(budget=budget)
+        self.assertEqual(progress.current_amount, Decimal(20))
+        self.assertEqual(progress.is_over, False)
+
+        budget.amount = Decimal(15)
+        budget.save()
+        progress = BudgetProgress.objects.get(budget=budget)
+        self.assertEqual(progress.current_amount, Decimal(20))
+        self.assertEqual(progress.is_over, True)
+
+    def over_budgets(self, count):
+        wallet = WalletFactory(user_id=self.user_id)
+        budgets = []
+        for _ in range(count):
+            cat = CategoryFactory()
+            budgets.append(BudgetFactory(user_id=self.user_id, wallet=wallet, category=cat, amount=Decimal(5),
+                                         from_date=datetime(2021, 1, 1), to_date=datetime(2021, 1, 31)))
+            TransactionFactory(user_id=self.user_id, transaction_at=datetime(2021, 1, 10), wallet=wallet,
+                               category=cat)
+        entries = [TransactionEntry(self.user_id, wallet.id, budget.category_id, DIRECTION.expense,
+                                    date(2021, 1, 10), Decimal(10), 1) for budget in budgets]
+        return budgets, entries
+
+    def test_notify_over_budgets(self):
+        budgets, entries = self.over_budgets(2)
+        outside = [entry._replace(day=date(2021, 2, 1)) for entry in entries]
+        self.assertEqual(BudgetProgressBusiness.notify_over_budgets(outside), [])
+
+        notified = BudgetProgressBusiness.notify_over_budgets(entries)
+        self.assertEqual(sorted(progress.budget_id for progress in notified), sorted(budget.id for budget in budgets))
+        self.assertEqual(TaskNote.objects.filter(task=TASK_NOTE.over_budget_notification).count(), 2)
+        self.assertEqual(NotificationOutbox.objects.filter(notification_type=NOTIFICATION_TYPE.budget_over).count(), 2)
+        # Notified once
+        self.assertEqual(BudgetProgressBusiness.notify_over_budgets(entries), [])
+
+    def test_notify_over_budgets_queries(self):
+        _, few = self.over_budgets(1)
+        _, many = self.over_budgets(20)
+        # Progress rows, notified budgets, task notes, outbox
+        with self.assertNumQueries(4):
+            BudgetProgressBusiness.notify_over_budgets(few)
+        with self.assertNumQueries(4):
+            BudgetProgressBusiness.notify_over_budgets(many)
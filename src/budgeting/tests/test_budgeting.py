@@ -1,13 +1,20 @@
+import csv
+import json
 from datetime import datetime
 from decimal import Decimal
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from budgeting.business.category import CategoryBusiness
 from budgeting.constants import DIRECTION
 from budgeting.factories import CategoryFactory, TransactionFactory, WalletFactory, CategoryGroupFactory
-from budgeting.models import Transaction, Wallet, Category
+from budgeting.models import Transaction, Wallet, Category, CategoryGroup
+from budgeting.queries import TransactionQueries
+from budgeting.resource import TransactionNoPagingViewSet
 from common.business import get_now
 from common.test_mocks import CoreMock
 from common.test_utils import AuthenticationUtils
@@ -34,6 +41,19 @@ class CategoryGroupTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.json()), 1)
 
+    def test_list_custom(self):
+        group = CategoryGroup.objects.get(name='Group 1')
+        own = CategoryFactory(group=group, direction=DIRECTION.income, user_id=self.user_id, order=-1)
+        CategoryFactory(group=group, direction=DIRECTION.income, user_id=self.user_id + 1)
+        CategoryFactory(group=CategoryGroupFactory(name='Group 3'), user_id=self.user_id + 1)
+
+        response = self.client.get(self.url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([item['name'] for item in data], ['Group 1', 'Group 2'])
+        self.assertEqual(len(data[0]['categories']), 6)
+        self.assertEqual(data[0]['categories'][0]['id'], own.id)
+
 
 class CategoryTests(APITestCase):
     def setUp(self):
@@ -339,6 +359,28 @@ class TransactionFilterTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.json()['results']), 10)
 
+    def test_cursor_pagination(self):
+        wallet = WalletFactory(user_id=self.user_id)
+        TransactionFactory.create_batch(5, user_id=1, wallet=wallet, direction=DIRECTION.expense)
+        TransactionFactory.create_batch(2, user_id=1, wallet=wallet, direction=DIRECTION.income)
+        TransactionFactory.create_batch(3, user_id=1, direction=DIRECTION.expense)
+        expected = list(Transaction.objects.filter(user_id=1, wallet=wallet, direction=DIRECTION.expense)
+                        .order_by('-created_at').values_list('id', flat=True))
+
+        ids = []
+        url = self.url + '?pagination=cursor&page_size=2&direction={}&wallet_id={}'.format(DIRECTION.expense,
+                                                                                           wallet.id)
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse([q for q in ctx.captured_queries if 'COUNT(' in q['sql'].upper()])
+            data = response.json()
+            self.assertNotIn('count', data)
+            ids.extend(item['id'] for item in data['results'])
+            url = data['next']
+        self.assertEqual(ids, expected)
+
     def test_by_month_filter(self):
         TransactionFactory.create_batch(5, user_id=1, transaction_at=datetime(2021, 2, 20))
 
@@ -379,6 +421,42 @@ class TransactionFilterTests(APITestCase):
         self.assertEqual(Decimal(data['previous_balance']), Decimal(30))
         self.assertEqual(Decimal(data['balance']), Decimal(50))
 
+    def test_summaries(self):
+        wallet = WalletFactory(user_id=self.user_id)
+        # +50
+        TransactionFactory.create_batch(5, user_id=1, transaction_at=datetime(2021, 1, 1), direction=DIRECTION.income)
+        # -20
+        TransactionFactory.create_batch(2, user_id=1, transaction_at=datetime(2021, 1, 1), direction=DIRECTION.expense,
+                                        wallet=wallet)
+        # +30
+        TransactionFactory.create_batch(3, user_id=1, transaction_at=datetime(2021, 3, 1), direction=DIRECTION.income)
+
+        url = reverse('budget:transaction-summaries')
+        response = self.client.get(url + '?from=2020-12&to=2021-03', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([item['period'] for item in data], ['2020-12', '2021-01', '2021-02', '2021-03'])
+        for item in data:
+            expected = TransactionQueries.get_transaction_summary(self.user_id, 'month', item['period'])
+            for key in ('income_amount', 'expense_amount', 'current_balance', 'previous_balance', 'balance'):
+                self.assertEqual(Decimal(item[key]), Decimal(expected[key]))
+        self.assertEqual(Decimal(data[3]['previous_balance']), Decimal(30))
+        self.assertEqual(Decimal(data[3]['balance']), Decimal(60))
+
+        response = self.client.get(url + '?periods=2021-03&wallet=0', format='json')
+        data = response.json()
+        self.assertEqual(Decimal(data[0]['previous_balance']), Decimal(50))
+        self.assertEqual(Decimal(data[0]['balance']), Decimal(80))
+
+        response = self.client.get(url + '?type=year&periods=2021&wallet={}'.format(wallet.id), format='json')
+        data = response.json()
+        self.assertEqual(Decimal(data[0]['expense_amount']), Decimal(20))
+        self.assertEqual(Decimal(data[0]['balance']), Decimal(-20))
+
+        for query in ('?from=0001-01&to=9999-12', '?type=year&from=1&to=999999999', '?from=2021-03&to=2021-01'):
+            response = self.client.get(url + query, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_by_month_summary_wallet(self):
         wallet = WalletFactory(user_id=self.user_id)
         # +50
@@ -558,6 +636,33 @@ class TransactionFilterTests(APITestCase):
         self.assertEqual(Decimal(data[1]['amount']), Decimal(30))
         self.assertEqual(data[1]['month'], '2021-02')
 
+    def test_summary_category_by_month_multiple(self):
+        cat1 = CategoryFactory(code='1')
+        cat2 = CategoryFactory(code='2')
+        TransactionFactory.create_batch(5, user_id=1, transaction_at=datetime(2021, 1, 1),
+                                        direction=DIRECTION.income, category=cat1)
+        TransactionFactory.create_batch(2, user_id=1, transaction_at=datetime(2021, 3, 1),
+                                        direction=DIRECTION.expense, category=cat2)
+
+        url = reverse('budget:transaction-summary-category-by-month')
+        response = self.client.get(url + '?category_id={},{}'.format(cat2.id, cat1.id), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(len(data), 2)
+        self.assertEqual(data[0]['category_id'], cat2.id)
+        self.assertEqual([item['month'] for item in data[0]['months']], ['2021-01', '2021-02', '2021-03'])
+        self.assertEqual([Decimal(item['amount']) for item in data[0]['months']],
+                         [Decimal(0), Decimal(0), Decimal(20)])
+        self.assertEqual(data[1]['category_id'], cat1.id)
+        self.assertEqual([Decimal(item['amount']) for item in data[1]['months']],
+                         [Decimal(50), Decimal(0), Decimal(0)])
+
+        # The missing bound is the last month of all the data, even when it is before from_month
+        response = self.client.get(url + '?category_id={},{}&from_month=2021-04'.format(cat2.id, cat1.id),
+                                   format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]['months'], [])
+
 
 class TransactionNoPagingTests(APITestCase):
     def setUp(self):
@@ -571,3 +676,79 @@ class TransactionNoPagingTests(APITestCase):
         response = self.client.get(self.url, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.json()), 10)
+
+    def test_list_query_count(self):
+        # The default categories are loaded once per process
+        CategoryBusiness.default_category(DIRECTION.expense)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, format='json')
+        self.assertEqual(len(response.json()), 10)
+
+        for i in range(5):
+            TransactionFactory.create_batch(8, user_id=1, category=CategoryFactory(code='code{}'.format(i)),
+                                            location=json.dumps({'lat': 1, 'lon': 2}), location_name='Shop')
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, format='json')
+        data = response.json()
+        self.assertEqual(len(data), 50)
+        self.assertEqual(len({item['category_code'] for item in data}), 6)
+        self.assertEqual(len([item for item in data if item['location_name'] == 'Shop']), 40)
+
+    def test_stream_ndjson(self):
+        TransactionNoPagingViewSet.STREAM_CHUNK_SIZE = 3
+        try:
+            response = self.client.get(self.url + '?stream=ndjson', format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode()
+        finally:
+            TransactionNoPagingViewSet.STREAM_CHUNK_SIZE = 500
+        rows = [json.loads(line) for line in content.splitlines()]
+        expected = self.client.get(self.url, format='json').json()
+        self.assertEqual(sorted(row['id'] for row in rows), sorted(item['id'] for item in expected))
+        self.assertEqual(len(set(row['id'] for row in rows)), 10)
+
+    def test_stream_csv(self):
+        response = self.client.get(self.url + '?stream=csv', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][0], 'id')
+        self.assertEqual(len(rows), 11)
+
+        response = self.client.get(self.url + '?stream=xml', format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DashboardTests(APITestCase):
+    def setUp(self):
+        self.auth_utils = AuthenticationUtils(self.client)
+        self.user_id = self.auth_utils.user_login()
+        self.url = reverse('budget:dashboard')
+
+    def test_dashboard(self):
+        cat = CategoryFactory(code='1', direction=DIRECTION.income)
+        TransactionFactory.create_batch(5, user_id=1, transaction_at=datetime(2021, 1, 1),
+                                        direction=DIRECTION.income, category=cat)
+        TransactionFactory.create_batch(3, user_id=1, transaction_at=datetime(2021, 2, 1),
+                                        direction=DIRECTION.income, category=cat)
+        TransactionFactory.create_batch(1, user_id=1, transaction_at=datetime(2021, 2, 1),
+                                        direction=DIRECTION.expense)
+
+        response = self.client.get(self.url + '?month=2021-02', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(Decimal(data['wallets'][0]['balance']), Decimal(70))
+        self.assertEqual(Decimal(data['month_summary']['previous_balance']), Decimal(50))
+        self.assertEqual(Decimal(data['month_summary']['balance']), Decimal(70))
+        self.assertEqual(Decimal(data['income_by_category'][0]['amount']), Decimal(30))
+        self.assertEqual(len(data['expense_by_category']), 0)
+        self.assertEqual(data['budgets'], [])
+        self.assertIn('month_summary;dur=', response['Server-Timing'])
+
+        with self.settings(DASHBOARD={'MAX_WORKERS': 1, 'SERVER_TIMING': False}):
+            response = self.client.get(self.url + '?month=2021-02', format='json')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_dashboard_invalid_month(self):
+        response = self.client.get(self.url + '?month=2021-2x', format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
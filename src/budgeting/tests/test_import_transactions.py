@@ -1,16 +1,33 @@
-from datetime import timedelta
+import json
+from datetime import timedelta, date
+from decimal import Decimal
+from unittest.mock import MagicMock
 
+from django.apps import apps
+from django.conf import settings
+from django.test import SimpleTestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from budgeting.business.category import CategoryBusiness
+from budgeting.business.import_schedule import ImportScheduler
+from budgeting.business.plaid_import import PlaidImportRunner
 from budgeting.business.transaction import TransactionBusiness
 from budgeting.constants import DIRECTION
-from budgeting.factories import WalletFactory, CategoryFactory
-from budgeting.models import Category
+from budgeting.factories import WalletFactory, CategoryFactory, TransactionFactory
+from budgeting.migrations._transaction_detail import backfill_transaction_detail
+from budgeting.models import Category, Transaction, TransactionDailyRollup, TransactionDetail, Wallet
+from budgeting_job.business import JobQueue
+from budgeting_job.constants import JOB_TYPE, JOB_STATUS
 from common.business import get_now
 from common.test_mocks import TransactionBusinessMock, BudgetingNotificationMock, CoreMock, PlaidManagementMock
 from common.test_utils import AuthenticationUtils
+from integration_3rdparty import plaid
+from integration_3rdparty.plaid import PlaidManagement, TRANSACTION_PAGE_SIZE
+
+# PlaidManagementMock replaces it for the other tests
+get_transaction_pages = PlaidManagement.get_transaction_pages
 
 
 class ImportPlaidTransactionJobTests(APITestCase):
@@ -19,37 +36,106 @@ class ImportPlaidTransactionJobTests(APITestCase):
         self.user_id = self.auth_utils.system_login()
 
         self.url = reverse('budget-job:import-plaid-transaction-view')
+        self.core_mock = CoreMock()
         self.transaction_business_mock = TransactionBusinessMock()
-        self.import_transaction_from_plaid_mock, self.import_transaction_from_plaid_original = \
-            self.transaction_business_mock.import_transaction_from_plaid()
+        self.import_plaid_wallets_mock, self.import_plaid_wallets_original = \
+            self.transaction_business_mock.import_plaid_wallets()
         self.notification_mock = BudgetingNotificationMock()
 
     def tearDown(self):
-        TransactionBusiness.import_transaction_from_plaid = self.import_transaction_from_plaid_original
+        TransactionBusiness.import_plaid_wallets = self.import_plaid_wallets_original
 
     def test_run_1(self):
+        self.core_mock.get_plaid_accounts(access_token='access-token')
         noti_transaction_imported_mock = self.notification_mock.noti_transaction_imported()
         last_import = get_now().today() - timedelta(days=1)
         WalletFactory.create_batch(5, user_id=1, last_import=last_import, plaid_id=1)
         response = self.client.post(self.url, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        data = response.json()
+        self.assertEqual(response.json()['job_type'], JOB_TYPE.import_plaid_transaction)
+
+        jobs = JobQueue.drain('test-worker', [JOB_TYPE.import_plaid_transaction])
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0].status, JOB_STATUS.success)
+        data = json.loads(jobs[0].result)
         self.assertEqual(data['success'], 5)
         self.assertEqual(data['failed'], 0)
         self.assertEqual(noti_transaction_imported_mock.call_count, 5)
+        self.assertEqual(data['skipped'], 0)
+        self.assertIn('wallets_per_second', data)
+        # Same access token and window, fetched once
+        self.assertEqual(data['fetches'], 1)
+        self.assertEqual(self.import_plaid_wallets_mock.call_count, 1)
+
+    def test_run_failure_isolated(self):
+        self.core_mock.get_plaid_accounts()
+        self.notification_mock.noti_transaction_imported()
+        last_import = get_now().today() - timedelta(days=1)
+        wallets = [WalletFactory(user_id=1, last_import=last_import, plaid_id=i + 1) for i in range(3)]
+
+        def import_plaid_wallets(access_token, group, from_date, to_date):
+            if wallets[1].id in [wallet.id for wallet in group]:
+                raise Exception('Plaid is down')
+            return {}
+        self.import_plaid_wallets_mock.side_effect = import_plaid_wallets
+
+        data = PlaidImportRunner().run()
+        self.assertEqual(data['success'], 2)
+        self.assertEqual(data['failed'], 1)
+        failed = Wallet.objects.get(id=wallets[1].id)
+        self.assertEqual(failed.error, 'Plaid is down')
+        self.assertEqual(failed.error_count, 1)
+        self.assertGreater(failed.retry_at, get_now())
+        self.assertEqual(failed.last_import, last_import.date())
+        self.assertEqual(Wallet.objects.get(id=wallets[0].id).last_import, get_now().today().date())
+
+    def test_run_time_budget(self):
+        self.core_mock.get_plaid_accounts()
+        last_import = get_now().today() - timedelta(days=1)
+        WalletFactory.create_batch(3, user_id=1, last_import=last_import, plaid_id=1)
+        data = PlaidImportRunner(time_budget=1e-9).run()
+        self.assertEqual(data['skipped'], 3)
+        self.assertEqual(self.import_plaid_wallets_mock.call_count, 0)
+
+
+class ImportSchedulerTests(APITestCase):
+    def test_order(self):
+        today = get_now().today()
+        stale = WalletFactory(user_id=1, last_import=today - timedelta(days=5), plaid_id=1)
+        quiet = WalletFactory(user_id=2, last_import=today - timedelta(days=1), plaid_id=2)
+        active = WalletFactory(user_id=3, last_import=today - timedelta(days=1), plaid_id=3)
+        TransactionFactory.create_batch(10, user_id=3, wallet=active, transaction_at=get_now() - timedelta(days=2))
+        failing = WalletFactory(user_id=4, last_import=today - timedelta(days=9), plaid_id=4, error_count=3,
+                                retry_at=get_now() + timedelta(hours=1))
+        backed_off = WalletFactory(user_id=5, last_import=today - timedelta(days=9), plaid_id=5, error_count=2,
+                                   retry_at=get_now() - timedelta(minutes=1))
+
+        wallets = ImportScheduler.get_due_wallets(10)
+        self.assertNotIn(failing.id, [wallet.id for wallet in wallets])
+        # 1 day + 2 * ln(1 + 10 transactions) = 5.8, 5 days, 9 days / (1 + 2 failures) = 3, 1 day
+        self.assertEqual([wallet.id for wallet in wallets], [active.id, stale.id, backed_off.id, quiet.id])
+        self.assertEqual([wallet.id for wallet in ImportScheduler.get_due_wallets(1)], [active.id])
+
+    def test_retry_at(self):
+        first = ImportScheduler.get_retry_at(1)
+        self.assertLess(first, ImportScheduler.get_retry_at(2))
+        self.assertLessEqual(ImportScheduler.get_retry_at(50),
+                             get_now() + timedelta(seconds=settings.IMPORT_SCHEDULER['ERROR_BACKOFF_MAX']))
 
 
 class ImportPlaidTransactionTests(APITestCase):
     def setUp(self) -> None:
         self.core_mock = CoreMock()
         self.plaid_management_mock = PlaidManagementMock()
+        self.core_mock.get_plaid_accounts()
+        self.plaid_management_mock.get_accounts()
 
         CategoryFactory(code=Category.DEFAULT_CODE, direction=DIRECTION.income)
         CategoryFactory(code=Category.DEFAULT_CODE, direction=DIRECTION.expense)
 
     def test_run_1(self):
         get_plaid_account_mock = self.core_mock.get_plaid_account()
-        get_transaction_mock = self.plaid_management_mock.get_transaction()
+        get_transaction_mock = self.plaid_management_mock.get_transaction_pages()
 
         user_id = 1
         to_date = get_now().today()
@@ -60,3 +146,148 @@ class ImportPlaidTransactionTests(APITestCase):
 
         self.assertEqual(get_plaid_account_mock.call_count, 1)
         self.assertEqual(get_transaction_mock.call_count, 1)
+
+    def plaid_transaction(self, transaction_id, amount, day='2021-01-05', category=None):
+        return {
+            'transaction_id': transaction_id,
+            'amount': amount,
+            'iso_currency_code': 'USD',
+            'name': 'Coffee',
+            'date': day,
+            'category': category or [],
+        }
+
+    def test_upsert(self):
+        CategoryBusiness.category_default = None
+        self.core_mock.get_plaid_account()
+        user_id = 1
+        wallet = WalletFactory(user_id=user_id, plaid_id=1)
+        self.plaid_management_mock.get_transaction_pages([
+            self.plaid_transaction('a', 10),
+            self.plaid_transaction('b', -25, category=['Unknown']),
+        ])
+        TransactionBusiness.import_transaction_from_plaid(user_id, wallet=wallet)
+
+        # Amount of a changed and c new on a second page, b untouched
+        self.plaid_management_mock.get_transaction_pages([
+            dict(self.plaid_transaction('a', 12), location={'city': 'Austin', 'lat': None}, pending=True),
+            self.plaid_transaction('b', -25, category=['Unknown']),
+            self.plaid_transaction('c', 5, day='2021-01-06'),
+        ], page_size=2)
+        TransactionBusiness.import_transaction_from_plaid(user_id, wallet=wallet)
+
+        rows = {obj.external_id: obj for obj in Transaction.objects.filter(wallet=wallet)}
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows['a'].amount, Decimal(12))
+        self.assertEqual(rows['b'].direction, DIRECTION.income)
+        self.assertEqual(rows['b'].category.code, Category.DEFAULT_CODE)
+        self.assertEqual((rows['a'].location_dict, rows['a'].pending), ({'city': 'Austin', 'lat': None}, True))
+        self.assertIsNone(rows['a'].detail)
+        self.assertEqual(rows['a'].detail_dict['amount'], 12)
+        self.assertEqual(TransactionDetail.objects.filter(transaction__wallet=wallet).count(), 3)
+        rollup = TransactionDailyRollup.objects.get(user_id=user_id, wallet_id=wallet.id, day=date(2021, 1, 5),
+                                                    direction=DIRECTION.expense)
+        self.assertEqual((rollup.amount, rollup.count), (Decimal(12), 1))
+
+    def test_route_by_account(self):
+        CategoryBusiness.category_default = None
+        checking = WalletFactory(user_id=1, plaid_id=1, plaid_account_id='checking')
+        savings = WalletFactory(user_id=1, plaid_id=2, plaid_account_id='savings')
+        legacy = WalletFactory(user_id=1, plaid_id=3)
+        transactions = [
+            dict(self.plaid_transaction('a', 10), account_id='checking'),
+            dict(self.plaid_transaction('b', 20), account_id='savings'),
+            dict(self.plaid_transaction('c', 30), account_id='savings'),
+        ]
+        get_transaction_pages_mock = self.plaid_management_mock.get_transaction_pages(transactions, page_size=2)
+
+        failures = TransactionBusiness.import_plaid_wallets('access-token', [checking, savings, legacy])
+        self.assertEqual(failures, {})
+        self.assertEqual(get_transaction_pages_mock.call_count, 1)
+
+        def external_ids(wallet):
+            return sorted(Transaction.objects.filter(wallet=wallet).values_list('external_id', flat=True))
+        self.assertEqual(external_ids(checking), ['a'])
+        self.assertEqual(external_ids(savings), ['b', 'c'])
+        # No account id, everything of the access token as before
+        self.assertEqual(external_ids(legacy), ['a', 'b', 'c'])
+
+    def test_resolve_account_ids(self):
+        CategoryBusiness.category_default = None
+        # The core plaid account of CoreMock is a savings one
+        legacy = WalletFactory(user_id=1, plaid_id=1)
+        self.plaid_management_mock.get_accounts([
+            {'account_id': 'checking', 'subtype': 'checking'},
+            {'account_id': 'savings', 'subtype': 'savings'},
+        ])
+        self.plaid_management_mock.get_transaction_pages([
+            dict(self.plaid_transaction('a', 10), account_id='checking'),
+            dict(self.plaid_transaction('b', 20), account_id='savings'),
+        ])
+
+        self.assertEqual(TransactionBusiness.import_plaid_wallets('access-token', [legacy]), {})
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.plaid_account_id, 'savings')
+        self.assertEqual(list(Transaction.objects.filter(wallet=legacy).values_list('external_id', flat=True)),
+                         ['b'])
+
+        # Two accounts of the subtype, nothing to pick from: everything as before
+        ambiguous = WalletFactory(user_id=1, plaid_id=2)
+        accounts_mock = self.plaid_management_mock.get_accounts([
+            {'account_id': 'savings-1', 'subtype': 'savings'},
+            {'account_id': 'savings-2', 'subtype': 'savings'},
+        ])
+        TransactionBusiness.resolve_plaid_account_ids('access-token', [ambiguous])
+        ambiguous.refresh_from_db()
+        self.assertIsNone(ambiguous.plaid_account_id)
+        self.assertIsNotNone(ambiguous.plaid_account_checked_at)
+
+        # The failed lookup is recorded, the next imports do not ask Plaid again
+        TransactionBusiness.resolve_plaid_account_ids('access-token', [ambiguous])
+        self.assertEqual(accounts_mock.call_count, 1)
+
+        # Until ACCOUNT_RECHECK_DAYS have passed
+        ambiguous.plaid_account_checked_at -= timedelta(days=settings.PLAID_IMPORT['ACCOUNT_RECHECK_DAYS'])
+        TransactionBusiness.resolve_plaid_account_ids('access-token', [ambiguous])
+        self.assertEqual(accounts_mock.call_count, 2)
+
+    def test_backfill_detail(self):
+        legacy = TransactionFactory(user_id=1, detail=json.dumps(dict(
+            self.plaid_transaction('a', 10), account_id='checking', merchant_name='Cafe',
+            location={'city': 'Austin', 'lat': None})))
+        reimported = TransactionFactory(user_id=1, detail='{}', location_name='New')
+        TransactionDetail.objects.create(transaction=reimported, payload='{"name": "New"}')
+        broken = TransactionFactory(user_id=1, detail='not json')
+
+        backfill_transaction_detail(apps, chunk_size=2)
+
+        legacy.refresh_from_db()
+        self.assertEqual((legacy.plaid_account_id, legacy.merchant_name, legacy.location_dict),
+                         ('checking', 'Cafe', {'city': 'Austin', 'lat': None}))
+        self.assertEqual(legacy.detail_dict['transaction_id'], 'a')
+        reimported.refresh_from_db()
+        self.assertEqual((reimported.location_name, reimported.detail_dict), ('New', {'name': 'New'}))
+        self.assertEqual(TransactionDetail.objects.get(transaction=broken).payload, 'not json')
+        self.assertFalse(Transaction.objects.filter(detail__isnull=False).exists())
+
+
+class PlaidTransactionPagesTests(SimpleTestCase):
+    def setUp(self):
+        self.client_original = plaid.client
+
+    def tearDown(self):
+        plaid.client = self.client_original
+
+    def test_pages(self):
+        total = TRANSACTION_PAGE_SIZE + 10
+        transactions_get = MagicMock(side_effect=lambda *args, count, offset, **kwargs: {
+            'transactions': [{'transaction_id': str(i)} for i in range(offset, min(offset + count, total))],
+            'total_transactions': total,
+        })
+        plaid.client = MagicMock()
+        plaid.client.Transactions.get = transactions_get
+
+        pages = get_transaction_pages('token', '2021-01-01', '2021-01-31')
+        self.assertEqual(transactions_get.call_count, 0)
+        self.assertEqual([len(page) for page in pages], [TRANSACTION_PAGE_SIZE, 10])
+        self.assertEqual([call[1]['offset'] for call in transactions_get.call_args_list], [0, TRANSACTION_PAGE_SIZE])
@@ -1,11 +1,19 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
+from unittest.mock import MagicMock
 
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from budgeting.constants import NOTIFICATION_TYPE
 from budgeting.factories import WalletFactory, CategoryFactory, BudgetFactory, TransactionFactory
+from budgeting.models import NotificationOutbox
+from budgeting.queries import BudgetQueries
+from budgeting_job.business import JobQueue, HANDLERS, end_budget_notify
+from budgeting_job.constants import JOB_TYPE, JOB_STATUS
+from budgeting_job.models import Job
+from common.business import get_now
 from common.test_utils import AuthenticationUtils
 
 
@@ -24,3 +32,62 @@ class JobTests(APITestCase):
         response = self.client.post(url, format='json')
         data = response.json()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(data['status'], JOB_STATUS.pending)
+
+        jobs = JobQueue.drain('test-worker', [JOB_TYPE.end_budget_notify])
+        self.assertEqual([job.id for job in jobs], [data['id']])
+        self.assertEqual(Job.objects.get(id=data['id']).status, JOB_STATUS.success)
+
+    def test_end_budget_notify_retried(self):
+        get_end_budget_to_notify_original = BudgetQueries.get_end_budget_to_notify
+        BudgetQueries.get_end_budget_to_notify = MagicMock(return_value=[
+            {'user_id': self.user_id, 'budget_id': budget_id} for budget_id in (1, 2)
+        ])
+        try:
+            self.assertEqual(end_budget_notify({})['count'], 2)
+            # The lease expired after the notifications were enqueued, the retry sends nothing again
+            self.assertEqual(end_budget_notify({})['count'], 0)
+        finally:
+            BudgetQueries.get_end_budget_to_notify = get_end_budget_to_notify_original
+        self.assertEqual(NotificationOutbox.objects.filter(notification_type=NOTIFICATION_TYPE.budget_end).count(), 2)
+
+
+class JobQueueTests(APITestCase):
+    def setUp(self):
+        self.handler_original = HANDLERS[JOB_TYPE.end_budget_notify]
+
+    def tearDown(self):
+        HANDLERS[JOB_TYPE.end_budget_notify] = self.handler_original
+
+    def test_enqueue_once(self):
+        job = JobQueue.enqueue(JOB_TYPE.end_budget_notify)
+        self.assertEqual(JobQueue.enqueue(JOB_TYPE.end_budget_notify).id, job.id)
+        self.assertNotEqual(JobQueue.enqueue(JOB_TYPE.import_plaid_transaction).id, job.id)
+
+    def test_lease_expired(self):
+        job = JobQueue.enqueue(JOB_TYPE.end_budget_notify)
+        self.assertEqual(JobQueue.claim('worker-1').id, job.id)
+        # Leased to worker-1
+        self.assertIsNone(JobQueue.claim('worker-2'))
+
+        Job.objects.filter(id=job.id).update(locked_until=get_now() - timedelta(seconds=1))
+        claimed = JobQueue.claim('worker-2')
+        self.assertEqual((claimed.id, claimed.locked_by, claimed.attempts), (job.id, 'worker-2', 2))
+
+    def test_retry_backoff(self):
+        HANDLERS[JOB_TYPE.end_budget_notify] = MagicMock(side_effect=Exception('Hook is down'))
+        job = JobQueue.enqueue(JOB_TYPE.end_budget_notify)
+        JobQueue.run_next('worker-1')
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JOB_STATUS.pending, 1))
+        self.assertGreater(job.run_at, get_now())
+        self.assertIsNotNone(job.duration)
+        # Not due before its backoff
+        self.assertIsNone(JobQueue.run_next('worker-1'))
+
+        Job.objects.filter(id=job.id).update(run_at=get_now(), attempts=job.max_attempts - 1)
+        JobQueue.run_next('worker-1')
+        job.refresh_from_db()
+        self.assertEqual(job.status, JOB_STATUS.failed)
+        self.assertIn('Hook is down', job.error)
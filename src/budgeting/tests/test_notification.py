@@ -0,0 +1,63 @@
+from unittest.mock import MagicMock
+
+from rest_framework.test import APITestCase
+
+from budgeting.business.notification import BudgetingNotification, NotificationDispatcher
+from budgeting.constants import OUTBOX_STATUS, NOTIFICATION_TYPE
+from budgeting.models import NotificationOutbox
+from common.business import get_now
+from constant_core.business import ConstantCoreBusiness
+from constant_core.models import User
+from integration_3rdparty.const_hook import ConstantHookManagement
+
+
+class NotificationOutboxTests(APITestCase):
+    def setUp(self):
+        self.send_notification_original = ConstantHookManagement.send_notification
+        self.send_notification_mock = MagicMock(return_value=None)
+        ConstantHookManagement.send_notification = self.send_notification_mock
+        self.get_user_profiles_original = ConstantCoreBusiness.get_user_profiles
+        self.get_user_profiles_mock = MagicMock(side_effect=lambda user_ids: {
+            user_id: User(id=user_id, device_token='device-{}'.format(user_id)) for user_id in user_ids
+        })
+        ConstantCoreBusiness.get_user_profiles = self.get_user_profiles_mock
+
+    def tearDown(self):
+        ConstantHookManagement.send_notification = self.send_notification_original
+        ConstantCoreBusiness.get_user_profiles = self.get_user_profiles_original
+
+    def test_enqueue(self):
+        BudgetingNotification.noti_budget_over(1, data={'budget_id': 2})
+        item = NotificationOutbox.objects.get()
+        self.assertEqual((item.user_id, item.notification_type, item.status),
+                         (1, NOTIFICATION_TYPE.budget_over, OUTBOX_STATUS.pending))
+        # Nothing leaves before the dispatcher runs
+        self.assertEqual(self.send_notification_mock.call_count, 0)
+
+    def test_dispatch(self):
+        for user_id in (1, 2, 3):
+            BudgetingNotification.noti_transaction_imported(user_id)
+
+        self.assertEqual(NotificationDispatcher.dispatch(), {'sent': 3, 'failed': 0})
+        # Device tokens of the whole batch in one call
+        self.assertEqual(self.get_user_profiles_mock.call_count, 1)
+        self.assertEqual(self.send_notification_mock.call_count, 3)
+        data = self.send_notification_mock.call_args_list[0][0][0]
+        self.assertEqual(data['player_ids'], ['device-1'])
+        self.assertEqual(data['type'], NOTIFICATION_TYPE.transaction_imported)
+        self.assertEqual(NotificationOutbox.objects.filter(status=OUTBOX_STATUS.sent).count(), 3)
+        self.assertEqual(NotificationDispatcher.dispatch(), {'sent': 0, 'failed': 0})
+
+    def test_retry(self):
+        self.send_notification_mock.side_effect = Exception('Hook is down')
+        item = BudgetingNotification.noti_budget_end(1)
+
+        self.assertEqual(NotificationDispatcher.dispatch(), {'sent': 0, 'failed': 1})
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.attempts), (OUTBOX_STATUS.pending, 1))
+        self.assertGreater(item.next_attempt_at, get_now())
+        self.assertEqual(NotificationDispatcher.dispatch(), {'sent': 0, 'failed': 0})
+
+        self.send_notification_mock.side_effect = None
+        NotificationOutbox.objects.filter(id=item.id).update(next_attempt_at=get_now())
+        self.assertEqual(NotificationDispatcher.dispatch(), {'sent': 1, 'failed': 0})
@@ -0,0 +1,151 @@
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from budgeting.constants import DIRECTION
+from budgeting.factories import CategoryFactory, CategoryGroupFactory, TransactionFactory
+from budgeting.queries import TransactionQueries
+from common.business import get_now
+from common.metrics import metrics
+from common.query_cache import batch_invalidation, get_generations
+from common.test_utils import AuthenticationUtils, UNAVAILABLE_CACHES
+from constant_core.business import ConstantCoreBusiness
+from constant_core.models import User
+
+# CoreMock replaces the loader on the class once a test uses it
+get_user_profiles = ConstantCoreBusiness.get_user_profiles
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-query-cache',
+    }
+})
+class QueryCacheTests(APITestCase):
+    def setUp(self):
+        self.auth_utils = AuthenticationUtils(self.client)
+        self.user_id = self.auth_utils.user_login()
+        caches['default'].clear()
+        metrics.reset()
+
+    def test_hit_and_invalidate(self):
+        TransactionFactory.create_batch(2, user_id=self.user_id, transaction_at=datetime(2021, 1, 1),
+                                        direction=DIRECTION.income)
+        data = TransactionQueries.get_transaction_summary(self.user_id, 'month', '2021-01')
+        self.assertEqual(data['income_amount'], Decimal(20))
+
+    def test_user_profiles_without_cache(self):
+        with patch.object(User, 'objects') as objects:
+            objects.filter.return_value.values.return_value = [{'id': 1, 'email': 'user-1@email.com'}]
+            users = get_user_profiles([1, 2])
+        self.assertEqual(list(users), [1])
+        self.assertEqual(users[1].email, 'user-1@email.com')
+        # Both ids are read from the database in one query
+        self.assertEqual(sorted(objects.filter.call_args[1]['id__in']), [1, 2])
+
+        with self.assertNumQueries(0):
+            TransactionQueries.get_transaction_summary(self.user_id, 'month', '2021-01')
+        self.assertEqual(metrics.get('query_cache.hit'), 1)
+
+        TransactionFactory(user_id=self.user_id, transaction_at=datetime(2021, 1, 1), direction=DIRECTION.income)
+        data = TransactionQueries.get_transaction_summary(self.user_id, 'month', '2021-01')
+        self.assertEqual(data['income_amount'], Decimal(30))
+
+    def test_other_user_not_invalidated(self):
+        TransactionQueries.get_transaction_summary(self.user_id, 'month', '2021-01')
+        TransactionFactory(user_id=self.user_id + 1, transaction_at=datetime(2021, 1, 1))
+        with self.assertNumQueries(0):
+            TransactionQueries.get_transaction_summary(self.user_id, 'month', '2021-01')
+
+    def test_global_category_invalidates_everyone(self):
+        TransactionQueries.get_transaction_summary(self.user_id, 'month', '2021-01')
+        CategoryFactory(user_id=None)
+        with self.assertNumQueries(2):
+            TransactionQueries.get_transaction_summary(self.user_id, 'month', '2021-01')
+
+    def test_batch_bumps_once(self):
+        generation = get_generations(self.user_id)[0]
+        with batch_invalidation():
+            TransactionFactory.create_batch(5, user_id=self.user_id, transaction_at=datetime(2021, 1, 1))
+        # Bumped on exit and again on commit, which runs immediately outside of a transaction
+        self.assertLessEqual(get_generations(self.user_id)[0] - generation, 2)
+
+    def test_metrics_view(self):
+        TransactionQueries.get_transaction_summary(self.user_id, 'month', '2021-01')
+        self.auth_utils.system_login()
+        response = self.client.get(reverse('budget-job:metrics-view'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['query_cache.miss'], 1)
+
+
+@override_settings(CACHES=UNAVAILABLE_CACHES)
+class QueryCacheUnavailableTests(APITestCase):
+    def setUp(self):
+        self.auth_utils = AuthenticationUtils(self.client)
+        self.user_id = self.auth_utils.user_login()
+        metrics.reset()
+
+    def test_writes_and_reads_without_cache(self):
+        TransactionFactory.create_batch(2, user_id=self.user_id, transaction_at=datetime(2021, 1, 1),
+                                        direction=DIRECTION.income)
+        self.assertGreater(metrics.get('query_cache.invalidation_error'), 0)
+        data = TransactionQueries.get_transaction_summary(self.user_id, 'month', '2021-01')
+        self.assertEqual(data['income_amount'], Decimal(20))
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-category-tree',
+    }
+})
+class CategoryTreeCacheTests(APITestCase):
+    def setUp(self):
+        self.auth_utils = AuthenticationUtils(self.client)
+        self.user_id = self.auth_utils.user_login()
+        caches['default'].clear()
+
+        self.group = CategoryGroupFactory(name='Group 1')
+        CategoryFactory.create_batch(3, group=self.group)
+        self.url = reverse('budget:categorygroup-list')
+
+    def test_etag(self):
+        response = self.client.get(self.url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, format='json')
+        self.assertEqual(len(response.json()[0]['categories']), 3)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Another user's category changes neither the tree nor the ETag
+        CategoryFactory(group=self.group, user_id=self.user_id + 1)
+        response = self.client.get(self.url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        CategoryFactory(group=self.group, user_id=self.user_id)
+        response = self.client.get(self.url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()[0]['categories']), 4)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_global_write_invalidates(self):
+        etag = self.client.get(self.url, format='json')['ETag']
+        CategoryFactory(group=self.group)
+        response = self.client.get(self.url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()[0]['categories']), 4)
+
+        self.group.deleted_at = get_now()
+        self.group.save()
+        self.assertEqual(self.client.get(self.url, format='json').json(), [])
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from budgeting.constants import DIRECTION
+from budgeting.factories import CategoryFactory, TransactionFactory, WalletFactory, BudgetFactory
+from budgeting.queries import TransactionQueries, BudgetQueries
+
+
+class TransactionQueryPlanTests(TransactionTestCase):
+    """
+    EXPLAIN every summary query and fail if MySQL falls back to scanning a whole table.
+    TransactionTestCase because ANALYZE TABLE commits implicitly.
+    """
+    # Tables (or their aliases in the raw SQL) that must always be reached through an index
+    indexed_tables = ('t', 'budgeting_transaction', 'r', 'budgeting_transactiondailyrollup',
+                      'l', 'budgeting_transactionmonthlybalance', 'p', 'budgeting_budgetprogress')
+
+    def setUp(self):
+        self.user_id = 1
+        self.wallet = WalletFactory(user_id=self.user_id)
+        self.cat = CategoryFactory(code='1')
+
+        # Other users' history so that the user filter is selective
+        for user_id in range(2, 22):
+            TransactionFactory.create_batch(5, user_id=user_id, transaction_at=datetime(2021, 1, 1),
+                                            direction=DIRECTION.income, category=self.cat)
+        TransactionFactory.create_batch(3, user_id=self.user_id, transaction_at=datetime(2021, 1, 1),
+                                        direction=DIRECTION.income, category=self.cat)
+        TransactionFactory.create_batch(3, user_id=self.user_id, transaction_at=datetime(2021, 2, 1),
+                                        direction=DIRECTION.expense, category=self.cat, wallet=self.wallet)
+        for user_id in range(1, 22):
+            BudgetFactory(user_id=user_id, wallet=self.wallet, category=self.cat,
+                          from_date=datetime(2021, 1, 1), to_date=datetime(2021, 1, 31))
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE TABLE budgeting_transaction, budgeting_transactiondailyrollup, '
+                           'budgeting_transactionmonthlybalance, budgeting_budgetprogress')
+            cursor.fetchall()
+
+    def assertNoFullScan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql)
+            columns = [col[0] for col in cursor.description]
+            for row in cursor.fetchall():
+                plan = dict(zip(columns, row))
+                if plan['table'] in self.indexed_tables:
+                    self.assertNotIn(plan['type'], ('ALL', 'index'),
+                                     'Full scan on {}: {}'.format(plan['table'], sql))
+
+    def assertQueriesUseIndex(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            result = func(*args, **kwargs)
+            # Raw querysets are lazy
+            list(result)
+        self.assertTrue(ctx.captured_queries)
+        for query in ctx.captured_queries:
+            self.assertNoFullScan(query['sql'])
+
+    def test_by_month(self):
+        self.assertQueriesUseIndex(TransactionQueries.get_transaction_by_month, self.user_id, '2021-02')
+        self.assertQueriesUseIndex(TransactionQueries.get_transaction_by_month, self.user_id, '2021-02',
+                                   wallet_id=str(self.wallet.id))
+
+    def test_summary(self):
+        self.assertQueriesUseIndex(TransactionQueries.get_transaction_summary, self.user_id, 'month', '2021-02')
+        self.assertQueriesUseIndex(TransactionQueries.get_transaction_summary, self.user_id, 'year', '2021')
+        self.assertQueriesUseIndex(TransactionQueries.get_transaction_summary, self.user_id, 'month', '2021-02',
+                                   wallet_id=str(self.wallet.id))
+
+    def test_summary_by_category(self):
+        self.assertQueriesUseIndex(TransactionQueries.get_transaction_summary_by_category,
+                                   self.user_id, 'month', DIRECTION.income, '2021-01')
+        self.assertQueriesUseIndex(TransactionQueries.get_transaction_summary_by_category,
+                                   self.user_id, 'year', DIRECTION.expense, '2021', wallet_id='0')
+
+    def test_summary_category_by_month(self):
+        self.assertQueriesUseIndex(TransactionQueries.get_transaction_summary_category_by_month,
+                                   self.user_id, [self.cat.id])
+        self.assertQueriesUseIndex(TransactionQueries.get_transaction_summary_category_by_month,
+                                   self.user_id, [self.cat.id], '2020-12', '2021-03', wallet_id='0')
+
+    def test_budget_details(self):
+        self.assertQueriesUseIndex(BudgetQueries.get_budget_details, self.user_id, str(self.wallet.id))
+        self.assertQueriesUseIndex(BudgetQueries.get_budget_details, self.user_id, str(self.wallet.id), is_over='1')
+        self.assertQueriesUseIndex(BudgetQueries.get_budget_details, self.user_id, '0', is_end='1')
+
+    def test_summaries(self):
+        self.assertQueriesUseIndex(TransactionQueries.get_transaction_summaries, self.user_id, 'month',
+                                   ['2021-01', '2021-02'])
+        self.assertQueriesUseIndex(TransactionQueries.get_transaction_summaries, self.user_id, 'year',
+                                   ['2021'], wallet_ids=[str(self.wallet.id), '0'])
@@ -0,0 +1,45 @@
+from unittest.mock import patch, MagicMock
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import AuthenticationFailed
+
+from common.metrics import metrics
+from common.ttl_cache import TTLCache
+from integration_3rdparty import const
+
+
+class TokenCacheTests(SimpleTestCase):
+    def setUp(self):
+        const.token_cache.clear()
+        metrics.reset()
+
+    def test_cached(self):
+        profile = {'Result': {'ID': 1}}
+        with patch.object(const.client, 'auth_check', MagicMock(return_value=profile)) as auth_check:
+            self.assertEqual(const.cached_auth_check('token'), profile)
+            self.assertEqual(const.cached_auth_check('token'), profile)
+            self.assertEqual(auth_check.call_count, 1)
+        self.assertEqual(metrics.get('auth.token_cache.hit'), 1)
+        self.assertEqual(metrics.get('auth.token_cache.miss'), 1)
+
+    def test_rejected_cached(self):
+        with patch.object(const.client, 'auth_check', MagicMock(side_effect=AuthenticationFailed)) as auth_check:
+            for _ in range(2):
+                with self.assertRaises(AuthenticationFailed):
+                    const.cached_auth_check('bad-token')
+            self.assertEqual(auth_check.call_count, 1)
+        self.assertEqual(metrics.get('auth.token_cache.negative_hit'), 1)
+
+    def test_lru_eviction(self):
+        cache = TTLCache(2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+        self.assertEqual(cache.set('c', 3, 60), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+    def test_expired(self):
+        cache = TTLCache(2)
+        cache.set('a', 1, 0)
+        self.assertIsNone(cache.get('a'))
@@ -0,0 +1,30 @@
+from unittest.mock import patch, MagicMock
+
+import requests
+from django.test import SimpleTestCase
+
+from common.metrics import metrics
+from integration_3rdparty.transport import Transport
+
+
+class TransportTests(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.transport = Transport.for_client('const_hook')
+
+    def test_metrics(self):
+        with patch.object(self.transport.session, 'request', MagicMock(return_value=MagicMock(status_code=200))) \
+                as request:
+            self.transport.post('http://hook/webhook/constant', 'webhook_constant', json={})
+            self.assertEqual(request.call_args[1]['timeout'], self.transport.timeout)
+        self.assertEqual(metrics.get('http.const_hook.webhook_constant.latency_ms.count'), 1)
+        self.assertEqual(metrics.get('http.const_hook.webhook_constant.error'), 0)
+
+    def test_errors(self):
+        with patch.object(self.transport.session, 'request', MagicMock(return_value=MagicMock(status_code=502))):
+            self.transport.post('http://hook/webhook/constant', 'webhook_constant', json={})
+        with patch.object(self.transport.session, 'request', MagicMock(side_effect=requests.ConnectionError)):
+            with self.assertRaises(requests.ConnectionError):
+                self.transport.post('http://hook/webhook/constant', 'webhook_constant', json={})
+        self.assertEqual(metrics.get('http.const_hook.webhook_constant.error'), 2)
+        self.assertEqual(metrics.get('http.const_hook.webhook_constant.latency_ms.count'), 2)
@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 
 from budgeting.resource import CategoryViewSet, TransactionViewSet, WalletViewSet, CategoryGroupViewSet, \
     TransactionNoPagingViewSet, BudgetViewSet
+from budgeting.views import DashboardView
 
 router = DefaultRouter()
 router.register('category-groups', CategoryGroupViewSet)
@@ -14,6 +15,7 @@ router.register('budgets', BudgetViewSet)
 
 patterns = ([
     path('', include(router.urls)),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
 ], 'budget')
 
 urlpatterns = [
@@ -1,17 +1,23 @@
-import logging
-import traceback
+from collections import OrderedDict
 
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from budgeting.business.notification import BudgetingNotification
-from budgeting.business.transaction import TransactionBusiness
-from budgeting.constants import TASK_NOTE
-from budgeting.models import Wallet, TaskNote, Budget
-from budgeting.queries import BudgetQueries
+from budgeting.constants import DIRECTION
+from budgeting.models import Budget
+from budgeting.queries import BudgetQueries, TransactionQueries, WalletQueries
+from budgeting.serializers import WalletBalanceSerializer, TransactionByCategorySerializer, BudgetDetailSerializer
 from budgeting_auth.authentication import SystemPermission
-from common.business import get_now
+from budgeting_job.business import JobQueue
+from budgeting_job.constants import JOB_TYPE
+from budgeting_job.serializers import JobSerializer
+from common.business import get_now, get_period_range
+from common.concurrency import run_concurrently
+from common.metrics import metrics
+from common.query_cache import backend_evictions
 
 
 class StartView(APIView):
@@ -19,93 +25,73 @@ class StartView(APIView):
         return Response('API works')
 
 
+class DashboardView(APIView):
+    """
+    Everything the app shows on its first screen in one request: wallet balances, the month summary,
+    income/expense by category and budgets. The sections are independent and run concurrently.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, format=None):
+        user_id = request.user.user_id
+        # Format: 2021-02
+        month = request.query_params.get('month') or get_now().strftime('%Y-%m')
+        get_period_range('month', month)
+        wallet_id = request.query_params.get('wallet')
+        if wallet_id and not wallet_id.isdigit():
+            raise ValidationError('Invalid wallet')
+
+        tasks = OrderedDict([
+            ('wallets', lambda: WalletBalanceSerializer(
+                WalletQueries.wallet_balance(user_id), many=True).data),
+            ('month_summary', lambda: TransactionQueries.get_transaction_summary(
+                user_id, 'month', month, wallet_id=wallet_id)),
+            ('income_by_category', lambda: TransactionByCategorySerializer(
+                TransactionQueries.get_transaction_summary_by_category(
+                    user_id, 'month', DIRECTION.income, month, wallet_id=wallet_id), many=True).data),
+            ('expense_by_category', lambda: TransactionByCategorySerializer(
+                TransactionQueries.get_transaction_summary_by_category(
+                    user_id, 'month', DIRECTION.expense, month, wallet_id=wallet_id), many=True).data),
+            ('budgets', lambda: BudgetDetailSerializer(
+                BudgetQueries.get_budget_details(user_id, wallet_id), many=True).data),
+        ])
+        data, timings = run_concurrently(tasks, settings.DASHBOARD['MAX_WORKERS'])
+
+        response = Response(data)
+        if settings.DASHBOARD['SERVER_TIMING']:
+            response['Server-Timing'] = ', '.join('{};dur={:.1f}'.format(name, seconds * 1000)
+                                                  for name, seconds in timings.items())
+        return response
+
+
 class ImportPlaidTransactionView(APIView):
     permission_classes = (IsAuthenticated, SystemPermission)
 
     def post(self, request, format=None):
-        wallets = Wallet.objects.filter(plaid_id__isnull=False,
-                                        deleted_at__isnull=True,
-                                        last_import__lt=get_now().today())
-        count = 0
-        success_count = 0
-        failed_count = 0
-        for wallet in wallets:
-            try:
-                from_dt = wallet.last_import
-                to_dt = get_now().today()
-                TransactionBusiness.import_transaction_from_plaid(wallet.user_id, wallet, from_dt, to_dt)
-                wallet.last_import = to_dt
-                wallet.error = wallet.error_details = wallet.error_at = None
-                wallet.save()
-                success_count += 1
-
-                try:
-                    tn = TaskNote.objects.filter(user_id=wallet.user_id,
-                                                 task=TASK_NOTE.first_import_transaction_notification,
-                                                 obj_id=wallet.id).first()
-                    if not tn:
-                        BudgetingNotification.noti_transaction_imported(wallet.user_id)
-                        TaskNote.objects.create(user_id=wallet.user_id,
-                                                task=TASK_NOTE.first_import_transaction_notification,
-                                                obj_id=wallet.id,
-                                                count=1)
-                except Exception as noti_ex:
-                    logging.exception(noti_ex)
-
-                try:
-                    self.over_budget_notify(wallet)
-                except Exception as noti_ex:
-                    logging.exception(noti_ex)
-
-            except Exception as ex:
-                wallet.error = str(ex)
-                wallet.error_details = traceback.format_exc()
-                wallet.error_at = get_now()
-                wallet.save()
-                failed_count += 1
-
-            count += 1
-            # Ten at a time
-            if count == 10:
-                break
-
-        return Response({
-            'success': success_count,
-            'failed': failed_count,
-        })
-
-    def over_budget_notify(self, wallet):
-        qs = BudgetQueries.get_budget_details(wallet.user_id, wallet.id, is_over='1')
-        for item in qs:
-            try:
-                tn = TaskNote.objects.filter(user_id=item.user_id,
-                                             task=TASK_NOTE.over_budget_notification,
-                                             obj_id=item.wallet_id).first()
-                if not tn:
-                    BudgetingNotification.noti_transaction_imported(wallet.user_id)
-                    TaskNote.objects.create(user_id=item.user_id,
-                                            task=TASK_NOTE.over_budget_notification,
-                                            obj_id=item.id,
-                                            count=1)
-            except Exception as noti_ex:
-                logging.exception(noti_ex)
+        job = JobQueue.enqueue(JOB_TYPE.import_plaid_transaction)
+        return Response(JobSerializer(job).data)
 
 
 class EndBudgetNotifyView(APIView):
     permission_classes = (IsAuthenticated, SystemPermission)
 
     def post(self, request, format=None):
-        items = BudgetQueries.get_end_budget_to_notify()
-        success_count = failed_count = 0
-        for item in items:
-            try:
-                BudgetingNotification.noti_budget_end(item['user_id'])
-                success_count += 1
-            except Exception as noti_ex:
-                logging.exception(noti_ex)
-                failed_count += 1
-
-        return Response({
-            'count': success_count,
-            'failed': failed_count,
-        })
+        job = JobQueue.enqueue(JOB_TYPE.end_budget_notify)
+        return Response(JobSerializer(job).data)
+
+
+class DispatchNotificationsView(APIView):
+    permission_classes = (IsAuthenticated, SystemPermission)
+
+    def post(self, request, format=None):
+        job = JobQueue.enqueue(JOB_TYPE.dispatch_notifications)
+        return Response(JobSerializer(job).data)
+
+
+class MetricsView(APIView):
+    permission_classes = (IsAuthenticated, SystemPermission)
+
+    def get(self, request, format=None):
+        data = metrics.snapshot()
+        data['query_cache.backend_eviction'] = backend_evictions()
+        return Response(data)
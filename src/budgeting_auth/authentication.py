@@ -6,6 +6,7 @@ from rest_framework import authentication, permissions
 from rest_framework.authentication import get_authorization_header
 
 from constant_core.queries import BackendQuery
+from budgeting.business.import_schedule import ImportScheduler
 from budgeting.models import ConstUser, SystemConstUser
 from integration_3rdparty.const import ConstantManagement
 
@@ -37,6 +38,7 @@ class BudgetingAuthentication(authentication.BaseAuthentication):
                 email=user_data['Email'],
                 token=token
             )
+            ImportScheduler.touch(user.user_id)
         return user, None
 
     def authenticate_header(self, request):
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+
+from budgeting.business.notification import BudgetingNotification, NotificationDispatcher
+from budgeting.business.plaid_import import PlaidImportRunner
+from budgeting.constants import TASK_NOTE
+from budgeting.models import TaskNote
+from budgeting.queries import BudgetQueries
+from budgeting_job.constants import JOB_TYPE, JOB_STATUS
+from budgeting_job.models import Job
+from common.business import get_now
+from common.metrics import metrics
+
+
+def import_plaid_transaction(payload: dict) -> dict:
+    result = PlaidImportRunner().run()
+    JobQueue.enqueue(JOB_TYPE.dispatch_notifications)
+    return result
+
+
+def end_budget_notify(payload: dict) -> dict:
+    items = BudgetQueries.get_end_budget_to_notify()
+    # A retried attempt skips the budgets an earlier one already notified
+    notified = set(TaskNote.objects.filter(task=TASK_NOTE.end_budget_notification,
+                                           obj_id__in=[item['budget_id'] for item in items])
+                   .values_list('obj_id', flat=True))
+    success_count = failed_count = 0
+    for item in items:
+        if item['budget_id'] in notified:
+            continue
+        try:
+            with transaction.atomic():
+                TaskNote.objects.create(user_id=item['user_id'],
+                                        task=TASK_NOTE.end_budget_notification,
+                                        obj_id=item['budget_id'],
+                                        count=1)
+                BudgetingNotification.noti_budget_end(item['user_id'])
+            success_count += 1
+        except Exception as noti_ex:
+            logging.exception(noti_ex)
+            failed_count += 1
+    JobQueue.enqueue(JOB_TYPE.dispatch_notifications)
+
+    return {
+        'count': success_count,
+        'failed': failed_count,
+    }
+
+
+def dispatch_notifications(payload: dict) -> dict:
+    return NotificationDispatcher.drain()
+
+
+HANDLERS = {
+    JOB_TYPE.import_plaid_transaction: import_plaid_transaction,
+    JOB_TYPE.end_budget_notify: end_budget_notify,
+    JOB_TYPE.dispatch_notifications: dispatch_notifications,
+}
+
+
+def get_worker_id() -> str:
+    return '{}-{}-{}'.format(socket.gethostname(), os.getpid(), threading.get_ident())
+
+
+class JobQueue:
+    """
+    Jobs in budgeting_job_job, claimed by any number of workers with SELECT ... FOR UPDATE SKIP LOCKED.
+    A claim is a lease: a worker that dies leaves its job running until locked_until, then another
+    worker takes it over. A failed attempt is retried with exponential backoff until max_attempts.
+    """
+
+    @staticmethod
+    def enqueue(job_type: str, payload: dict = None, run_at=None) -> Job:
+        """
+        A job of the same type already waiting or running is returned instead of adding another one,
+        overlapping triggers do not queue the same work twice.
+        """
+        if job_type not in HANDLERS:
+            raise ValueError('Unknown job type {}'.format(job_type))
+
+        with transaction.atomic():
+            job = Job.objects.select_for_update() \
+                .filter(job_type=job_type, status__in=[JOB_STATUS.pending, JOB_STATUS.running]) \
+                .order_by('id').first()
+            if job:
+                return job
+            return Job.objects.create(job_type=job_type,
+                                      payload=json.dumps(payload) if payload is not None else None,
+                                      run_at=run_at or get_now(),
+                                      max_attempts=settings.JOB_QUEUE['MAX_ATTEMPTS'])
+
+    @staticmethod
+    def claim(worker_id: str, job_types: list = None):
+        now = get_now()
+        with transaction.atomic():
+            qs = Job.objects.select_for_update(skip_locked=True) \
+                .filter(Q(status=JOB_STATUS.pending, run_at__lte=now) |
+                        Q(status=JOB_STATUS.running, locked_until__lt=now))
+            if job_types:
+                qs = qs.filter(job_type__in=job_types)
+            job = qs.order_by('run_at', 'id').first()
+            if not job:
+                return None
+
+            if job.status == JOB_STATUS.running:
+                # The worker holding it died or overran its lease
+                metrics.incr('job.{}.lease_expired'.format(job.job_type))
+            job.status = JOB_STATUS.running
+            job.locked_by = worker_id
+            job.locked_until = now + timedelta(seconds=settings.JOB_QUEUE['LEASE_SECONDS'])
+            job.attempts += 1
+            job.started_at = now
+            job.finished_at = None
+            job.save()
+        return job
+
+    @staticmethod
+    def execute(job: Job):
+        started = time.perf_counter()
+        try:
+            result = HANDLERS[job.job_type](json.loads(job.payload) if job.payload else None)
+        except Exception as ex:
+            logging.exception(ex)
+            JobQueue.finish(job, time.perf_counter() - started, error=traceback.format_exc())
+        else:
+            JobQueue.finish(job, time.perf_counter() - started, result=result)
+        return job
+
+    @staticmethod
+    def finish(job: Job, seconds: float, result: dict = None, error: str = None):
+        metrics.observe('job.{}.duration_ms'.format(job.job_type), seconds * 1000)
+        job.duration = int(seconds * 1000)
+        job.finished_at = get_now()
+        job.locked_by = job.locked_until = None
+        if error is None:
+            job.status = JOB_STATUS.success
+            job.result = json.dumps(result, cls=DjangoJSONEncoder)
+            job.error = None
+        elif job.attempts < job.max_attempts:
+            metrics.incr('job.{}.retry'.format(job.job_type))
+            job.status = JOB_STATUS.pending
+            job.error = error
+            backoff = settings.JOB_QUEUE['RETRY_BACKOFF'] * 2 ** (job.attempts - 1)
+            job.run_at = get_now() + timedelta(seconds=backoff)
+        else:
+            metrics.incr('job.{}.failed'.format(job.job_type))
+            job.status = JOB_STATUS.failed
+            job.error = error
+        # Only while the lease is still ours, a worker that overran it must not clobber the new holder
+        Job.objects.filter(id=job.id, attempts=job.attempts).update(
+            status=job.status, result=job.result, error=job.error, run_at=job.run_at, duration=job.duration,
+            finished_at=job.finished_at, locked_by=None, locked_until=None, updated_at=get_now())
+
+    @staticmethod
+    def run_next(worker_id: str, job_types: list = None):
+        """
+        Claim and run one job, returns it or None when nothing is due.
+        """
+        job = JobQueue.claim(worker_id, job_types)
+        if job:
+            JobQueue.execute(job)
+        return job
+
+    @staticmethod
+    def drain(worker_id: str = None, job_types: list = None) -> list:
+        """
+        Run due jobs until none is left.
+        """
+        worker_id = worker_id or get_worker_id()
+        jobs = []
+        while True:
+            job = JobQueue.run_next(worker_id, job_types)
+            if not job:
+                return jobs
+            jobs.append(job)
@@ -0,0 +1,14 @@
+from model_utils import Choices
+
+JOB_TYPE = Choices(
+    ('import_plaid_transaction', 'Import Plaid transaction'),
+    ('end_budget_notify', 'End budget notify'),
+    ('dispatch_notifications', 'Dispatch notifications'),
+)
+
+JOB_STATUS = Choices(
+    ('pending', 'Pending'),
+    ('running', 'Running'),
+    ('success', 'Success'),
+    ('failed', 'Failed'),
+)
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from budgeting_job.business import JobQueue, get_worker_id
+from budgeting_job.constants import JOB_TYPE
+
+
+class Command(BaseCommand):
+    help = 'Run the queued budgeting jobs, any number of workers can run side by side.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job-type', action='append', dest='job_types', choices=[value for value, _ in JOB_TYPE],
+                            help='Only run this job type, can be repeated')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        worker_id = get_worker_id()
+        while True:
+            job = JobQueue.run_next(worker_id, options['job_types'])
+            if job:
+                self.stdout.write('Job {} {}: {} in {} ms'.format(job.id, job.job_type, job.status, job.duration))
+                continue
+            if options['once']:
+                return
+            time.sleep(settings.JOB_QUEUE['POLL_INTERVAL'])
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.4 on 2026-10-18 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting_job', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='job_type',
+            field=models.CharField(choices=[('import_plaid_transaction', 'Import Plaid transaction'), ('end_budget_notify', 'End budget notify'), ('dispatch_notifications', 'Dispatch notifications')], max_length=100),
+        ),
+    ]
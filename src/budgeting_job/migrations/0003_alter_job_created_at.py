@@ -0,0 +1,19 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgeting_job', '0002_alter_job_job_type'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import models
+from django.utils import timezone
+
+from budgeting.models import TimestampedModel
+from budgeting_job.constants import JOB_TYPE, JOB_STATUS
+
+
+class Job(TimestampedModel):
+    class Meta:
+        indexes = [
+            # Claim: pending jobs that are due, running jobs whose lease expired
+            models.Index(fields=['status', 'run_at'], name='budgeting_job_claim_idx'),
+            models.Index(fields=['status', 'locked_until'], name='budgeting_job_lease_idx'),
+            models.Index(fields=['job_type', 'status'], name='budgeting_job_type_idx'),
+        ]
+
+    job_type = models.CharField(max_length=100, choices=JOB_TYPE)
+    status = models.CharField(max_length=50, choices=JOB_STATUS, default=JOB_STATUS.pending)
+    payload = models.TextField(null=True)
+    result = models.TextField(null=True)
+    error = models.TextField(null=True)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, null=True)
+    locked_until = models.DateTimeField(null=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    # Milliseconds of the last attempt
+    duration = models.IntegerField(null=True)
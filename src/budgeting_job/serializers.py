@@ -0,0 +1,17 @@
+import json
+
+from rest_framework import serializers
+
+from budgeting_job.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    result = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'job_type', 'status', 'attempts', 'run_at', 'started_at', 'finished_at', 'duration',
+                  'result')
+
+    def get_result(self, instance):
+        return json.loads(instance.result) if instance.result else None
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from budgeting.views import ImportPlaidTransactionView, EndBudgetNotifyView
+from budgeting.views import ImportPlaidTransactionView, EndBudgetNotifyView, DispatchNotificationsView, MetricsView
 
 router = DefaultRouter()
 
@@ -9,6 +9,8 @@ patterns = ([
     path('', include(router.urls)),
     path('import-plaid-transaction/', ImportPlaidTransactionView.as_view(), name='import-plaid-transaction-view'),
     path('end-budget-notify/', EndBudgetNotifyView.as_view(), name='end-budget-notify-view'),
+    path('dispatch-notifications/', DispatchNotificationsView.as_view(), name='dispatch-notifications-view'),
+    path('metrics/', MetricsView.as_view(), name='metrics-view'),
 
     # path('run-pubsub/', SubView.as_view()),
 
@@ -6,6 +6,9 @@ from decimal import Decimal, ROUND_HALF_UP
 
 from dateutil.relativedelta import relativedelta
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from common.exceptions import InvalidInputDataException
 
 
 def get_now():
@@ -36,13 +39,52 @@ def round_crypto(amount: Decimal, decimal_place=6) -> Decimal:
     return amount.quantize(Decimal('.{}1'.format('0' * (decimal_place - 1))), ROUND_HALF_UP)
 
 
-def build_month_table(from_month: str, to_month: str):
-    from_date = datetime.strptime(from_month + '-01', '%Y-%m-%d')
-    to_date = datetime.strptime(to_month + '-01', '%Y-%m-%d')
-    cur_date = from_date
-    dt_strs = []
+def to_utc_date(value):
+    """
+    Calendar day, in UTC as the database stores it, of a datetime, a date or an ISO string.
+    Naive datetimes are taken as UTC, the project time zone.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        parsed = parse_datetime(value) or parse_date(value)
+        if parsed is None:
+            raise ValueError('Invalid date {}'.format(value))
+        value = parsed
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.make_naive(value, timezone.utc)
+        return value.date()
+
+    return value
+
+
+def get_period_range(t: str, period: str):
+    """
+    Half-open [start, end) date range of a period, t is 'month' (YYYY-MM) or 'year' (YYYY).
+    Filtering on a range instead of DATE_FORMAT(...) = period lets the database seek an index.
+    """
+    try:
+        if t == 'month':
+            start = datetime.strptime(period + '-01', '%Y-%m-%d').date()
+            return start, start + relativedelta(months=1)
+        if t == 'year':
+            start = datetime.strptime(period + '-01-01', '%Y-%m-%d').date()
+            return start, start + relativedelta(years=1)
+    except (TypeError, ValueError):
+        pass
+
+    raise InvalidInputDataException('Invalid {} {}'.format(t, period))
+
+
+def get_month_range(from_month: str, to_month: str):
+    """
+    Every month from from_month to to_month inclusive, as YYYY-MM.
+    """
+    cur_date = get_period_range('month', from_month)[0]
+    to_date = get_period_range('month', to_month)[0]
+    months = []
     while cur_date <= to_date:
-        dt_strs.append("select '{}' as mth ".format(cur_date.strftime('%Y-%m')))
+        months.append(cur_date.strftime('%Y-%m'))
         cur_date += relativedelta(months=1)
-    dt_str = 'union all '.join(dt_strs)
-    return dt_str
+    return months
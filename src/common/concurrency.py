@@ -0,0 +1,37 @@
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+
+def _timed(func):
+    started = time.perf_counter()
+    try:
+        return func(), time.perf_counter() - started
+    finally:
+        # Each worker thread opens its own connections, do not leave them to the server timeout
+        connections.close_all()
+
+
+def run_concurrently(tasks: OrderedDict, max_workers: int):
+    """
+    Run the independent callables of tasks (name -> callable) on a bounded thread pool.
+    Returns (results, timings in seconds), both keyed by name in the order of tasks.
+    The first failing task raises. With max_workers <= 1 everything runs inline on the
+    caller's connection, which is what tests inside a transaction need.
+    """
+    results, timings = OrderedDict(), OrderedDict()
+    if max_workers <= 1:
+        for name, func in tasks.items():
+            started = time.perf_counter()
+            results[name] = func()
+            timings[name] = time.perf_counter() - started
+        return results, timings
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        futures = OrderedDict((name, executor.submit(_timed, func)) for name, func in tasks.items())
+        for name, future in futures.items():
+            results[name], timings[name] = future.result()
+
+    return results, timings
@@ -0,0 +1,40 @@
+import threading
+from collections import defaultdict
+
+
+class MetricsRegistry:
+    """
+    In-process counters. Every worker process has its own registry, a scraper reads each worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, value: float):
+        """
+        Record a measurement (a latency in ms...) as name.count, name.sum and name.max.
+        """
+        with self._lock:
+            self._counters[name + '.count'] += 1
+            self._counters[name + '.sum'] += value
+            self._counters[name + '.max'] = max(self._counters[name + '.max'], value)
+
+    def get(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+metrics = MetricsRegistry()
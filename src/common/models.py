@@ -14,3 +14,22 @@ class ExchangeReadManager(ExchangeReadUsingDBMixin, models.Manager):
 class ExchangeDefaultManager(models.Manager):
     def get_queryset(self):
         return models.QuerySet(self.model, using='default')
+
+
+def iter_keyset(qs, chunk_size: int, field: str = 'created_at'):
+    """
+    Yield the rows of qs newest first, ordered on (field, id), one chunk_size query at a time.
+    Unlike .iterator() memory stays flat on MySQL too, whose driver reads the whole result at once.
+    """
+    qs = qs.order_by('-' + field, '-id')
+    last = None
+    while True:
+        chunk_qs = qs
+        if last is not None:
+            value = getattr(last, field)
+            chunk_qs = qs.filter(models.Q(**{field + '__lt': value}) | models.Q(**{field: value, 'id__lt': last.id}))
+        chunk = list(chunk_qs[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
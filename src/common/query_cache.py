@@ -0,0 +1,173 @@
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.query import RawQuerySet
+
+from common.metrics import metrics
+
+# Generation shared by every user, for writes that are visible to all of them (global categories)
+GLOBAL = 'global'
+
+_MISSING = object()
+_local = threading.local()
+
+
+def get_cache():
+    return caches[settings.QUERY_CACHE['CACHE_ALIAS']]
+
+
+def _generation_key(scope) -> str:
+    return 'qc:gen:{}'.format(scope)
+
+
+def _new_generation() -> int:
+    # Time based so that a generation lost by the backend never comes back with a lower value
+    return int(time.time() * 1000)
+
+
+def get_generation_values(scopes: list) -> list:
+    """
+    The current generation of each scope, started when the backend has none.
+    """
+    cache = get_cache()
+    keys = [_generation_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            metrics.incr('query_cache.generation_reset')
+            generation = _new_generation()
+            if not cache.add(key, generation, timeout=None):
+                generation = cache.get(key, generation)
+            values[key] = generation
+
+    return [values[key] for key in keys]
+
+
+def get_generations(user_id: int):
+    user_generation, global_generation = get_generation_values([user_id, GLOBAL])
+    return user_generation, global_generation
+
+
+def _bump(scope):
+    # Runs inside the writers' transactions and on commit, a cache outage must not fail the write
+    try:
+        cache = get_cache()
+        try:
+            cache.incr(_generation_key(scope))
+        except ValueError:
+            cache.add(_generation_key(scope), _new_generation(), timeout=None)
+    except Exception as ex:
+        logging.exception(ex)
+        metrics.incr('query_cache.invalidation_error')
+        return
+    metrics.incr('query_cache.invalidation')
+
+
+def bump_generation(scope):
+    """
+    Invalidate every cached query of a user (or of everyone with GLOBAL). Bumped now and again once
+    the transaction commits, so a read cached between the write and the commit does not survive.
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.add(scope)
+        return
+
+    _bump(scope)
+    transaction.on_commit(lambda: _bump(scope))
+
+
+@contextmanager
+def batch_invalidation():
+    """
+    Collect the bumps made inside the block and bump each scope once on exit.
+    """
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+
+    _local.pending = set()
+    try:
+        yield
+    finally:
+        pending, _local.pending = _local.pending, None
+        for scope in pending:
+            bump_generation(scope)
+
+
+def cached_query(name: str):
+    """
+    Cache the result of a query method taking user_id, keyed by user, query name and parameters.
+    Raw querysets are evaluated so that the result can be stored.
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not settings.QUERY_CACHE['ENABLED']:
+                result = func(*args, **kwargs)
+                return list(result) if isinstance(result, RawQuerySet) else result
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            user_id = params['user_id']
+
+            cache = get_cache()
+            try:
+                user_generation, global_generation = get_generations(user_id)
+                digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+                key = 'qc:{}:{}:{}:{}:{}'.format(name, user_id, user_generation, global_generation, digest)
+                result = cache.get(key, _MISSING)
+            except Exception as ex:
+                # The cache is an optimization, never fail the request because of it
+                logging.exception(ex)
+                key, result = None, _MISSING
+
+            if result is not _MISSING:
+                metrics.incr('query_cache.hit')
+                return result
+
+            metrics.incr('query_cache.miss')
+            result = func(*args, **kwargs)
+            if isinstance(result, RawQuerySet):
+                result = list(result)
+            if key:
+                try:
+                    cache.set(key, result, settings.QUERY_CACHE['TIMEOUT'])
+                except Exception as ex:
+                    logging.exception(ex)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def backend_evictions():
+    """
+    Keys evicted by the cache backend, when it reports them (redis, memcached), else None.
+    """
+    cache = get_cache()
+    try:
+        if hasattr(cache, 'client') and hasattr(cache.client, 'get_client'):
+            return cache.client.get_client().info('stats').get('evicted_keys')
+        if hasattr(cache, '_cache') and hasattr(cache._cache, 'get_stats'):
+            return sum(int(stats.get(b'evictions', stats.get('evictions', 0)))
+                       for _, stats in cache._cache.get_stats())
+    except Exception as ex:
+        logging.exception(ex)
+
+    return None
@@ -44,6 +44,10 @@ class CoreMock(object):
 
         mock = MagicMock(return_value=user)
         ConstantCoreBusiness.get_user = mock
+        ConstantCoreBusiness.get_user_profile = mock
+        ConstantCoreBusiness.get_user_profiles = MagicMock(side_effect=lambda user_ids: {
+            uid: user for uid in user_ids if uid == user.id
+        })
 
         return mock
 
@@ -100,6 +104,19 @@ class CoreMock(object):
 
         return mock
 
+    def get_plaid_accounts(self, access_token=None):
+        # One access token per account unless a shared one is given
+        mock = MagicMock(side_effect=lambda plaid_ids: {
+            plaid_id: PlaidAccounts(id=plaid_id,
+                                    access_token=access_token or 'access-token-{}'.format(plaid_id),
+                                    institution_name='Plaid',
+                                    account_subtype='savings')
+            for plaid_id in plaid_ids
+        })
+        ConstantCoreBusiness.get_plaid_accounts = mock
+
+        return mock
+
     def create_admin_log_action(self):
         mock = MagicMock(return_value=AdminLogActions(id=1))
         ConstantCoreBusiness.create_admin_log_action = mock
@@ -141,6 +158,12 @@ class TransactionBusinessMock(object):
         TransactionBusiness.import_transaction_from_plaid = mock
         return mock, original
 
+    def import_plaid_wallets(self):
+        mock = MagicMock(return_value={})
+        original = TransactionBusiness.import_plaid_wallets
+        TransactionBusiness.import_plaid_wallets = mock
+        return mock, original
+
 
 class BudgetingNotificationMock(object):
     def noti_transaction_imported(self):
@@ -171,8 +194,16 @@ class PubSubMock(object):
 
 
 class PlaidManagementMock(object):
-    def get_transaction(self):
-        mock = MagicMock(return_value=[])
-        PlaidManagement.get_transaction = mock
+    def get_transaction_pages(self, transactions=None, page_size=500):
+        transactions = transactions if transactions else []
+        pages = [transactions[i:i + page_size] for i in range(0, len(transactions), page_size)]
+        mock = MagicMock(side_effect=lambda *args, **kwargs: iter(pages))
+        PlaidManagement.get_transaction_pages = mock
+
+        return mock
+
+    def get_accounts(self, accounts=None):
+        mock = MagicMock(return_value=accounts or [])
+        PlaidManagement.get_accounts = mock
 
         return mock
@@ -1,6 +1,7 @@
 from unittest.mock import MagicMock
 
 from django.conf import settings
+from django.core.cache.backends.base import BaseCache
 from rest_framework.test import APIClient
 
 from budgeting_auth.authentication import ReCaptchaPermission
@@ -76,3 +77,24 @@ class AuthenticationUtils(object):
         })
         ConstantManagement.verify_otp_2 = mock
         return mock
+
+
+class UnavailableCache(BaseCache):
+    """
+    A cache backend whose server is down, every call raises.
+    """
+
+    def __init__(self, location, params):
+        super(UnavailableCache, self).__init__(params)
+
+    def _fail(self, *args, **kwargs):
+        raise ConnectionError('Cache unavailable')
+
+    add = get = set = touch = delete = clear = incr = get_many = set_many = delete_many = _fail
+
+
+UNAVAILABLE_CACHES = {
+    'default': {
+        'BACKEND': 'common.test_utils.UnavailableCache',
+    }
+}
@@ -63,6 +63,7 @@ THIRD_PARTY_APPS = [
 LOCAL_APPS = [
     'budgeting',
     'budgeting_pubsub',
+    'budgeting_job',
     'constant_core',
 ]
 
@@ -244,7 +245,37 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-budgeting',
-    }
+    },
+    # Seen by every gunicorn worker and the job workers, for state one process writes and others read
+    'shared': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+    },
+}
+
+QUERY_CACHE = {
+    'ENABLED': True,
+    # Has to be shared: a write bumps the generations in this cache, a per-process one would leave the
+    # other workers serving stale entries until TIMEOUT
+    'CACHE_ALIAS': 'shared',
+    # Writes invalidate through the generation counters, the timeout bounds now()-dependent fields
+    'TIMEOUT': 15 * 60,
+}
+
+# Profiles of constant_core users (no balances), shared by the workers through the cache
+CORE_PROFILE_CACHE = {
+    'CACHE_ALIAS': 'shared',
+    'TIMEOUT': 5 * 60,
+}
+
+DASHBOARD = {
+    # Threads running the dashboard sections, each holds its own DB connection
+    'MAX_WORKERS': 4,
+    # Send the section timings as a Server-Timing header, they expose internals: development only
+    'SERVER_TIMING': DEBUG,
 }
 
 TINYMCE_DEFAULT_CONFIG = {
@@ -283,6 +314,39 @@ CONST_API = {
     'SECRET_KEY': 'abc@123',
 }
 
+# Pooled sessions of the integration_3rdparty clients, timeouts in seconds.
+# 'default' applies to every client, a client entry overrides some of its keys.
+HTTP_TRANSPORT = {
+    'default': {
+        'CONNECT_TIMEOUT': 3.05,
+        'READ_TIMEOUT': 10,
+        'CONNECT_RETRIES': 2,
+        'READ_RETRIES': 0,
+        'BACKOFF_FACTOR': 0.5,
+        'POOL_MAXSIZE': 32,
+    },
+    'const': {
+        'READ_TIMEOUT': 5,
+    },
+    'const_budgeting': {
+        'CONNECT_TIMEOUT': 0.5,
+        'READ_TIMEOUT': 0.5,
+        'CONNECT_RETRIES': 0,
+    },
+    'const_exchange': {
+        'CONNECT_TIMEOUT': 0.5,
+        'READ_TIMEOUT': 0.5,
+        'CONNECT_RETRIES': 0,
+    },
+}
+
+# Verified tokens of CONST_API auth/check, per worker process, in seconds
+TOKEN_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'NEGATIVE_TTL': 10,
+}
+
 CONST_EXCHANGE_API = {
     'URL': 'http://exchange-backend-service:6670/exchange-api',
     'TOKEN': 'xxx',
@@ -310,6 +374,59 @@ CONST_CORE_API = {
     'URL': 'http://constant-core-service:9090'
 }
 
+PLAID_IMPORT = {
+    # Rows per bulk insert/update statement
+    'BATCH_SIZE': 500,
+    # Wallets imported concurrently, each worker holds its own DB connection
+    'MAX_WORKERS': 8,
+    # Seconds per run, wallets not started in time are left for the next run
+    'TIME_BUDGET': 50,
+    # Due wallets picked per run, the least recently imported first
+    'MAX_WALLETS': 500,
+    # Days before a wallet that matched no single Plaid account is looked up again
+    'ACCOUNT_RECHECK_DAYS': 7,
+}
+
+# Order of the due wallets in an import run, see ImportScheduler
+IMPORT_SCHEDULER = {
+    # Least recently imported due wallets scored per run
+    'CANDIDATES': 5000,
+    # Score = STALENESS_WEIGHT * days since the last import + ACTIVITY_WEIGHT * ln(1 + transactions in the
+    # last ACTIVITY_DAYS) + ENGAGEMENT_WEIGHT if the user used the app in the last ENGAGED_DAYS,
+    # divided by 1 + the consecutive failures
+    'STALENESS_WEIGHT': 1.0,
+    'ACTIVITY_WEIGHT': 2.0,
+    'ACTIVITY_DAYS': 30,
+    'ENGAGEMENT_WEIGHT': 5.0,
+    'ENGAGED_DAYS': 7,
+    # Seconds a failed wallet waits before its next import, doubled on every consecutive failure
+    'ERROR_BACKOFF': 60 * 60,
+    'ERROR_BACKOFF_MAX': 7 * 24 * 60 * 60,
+    # Users' last-seen times are shared by the workers through this cache, written once per resolution
+    'CACHE_ALIAS': 'shared',
+    'LAST_SEEN_RESOLUTION': 5 * 60,
+}
+
+JOB_QUEUE = {
+    # Seconds a claimed job stays with its worker, longer than any job runs (PLAID_IMPORT['TIME_BUDGET'])
+    'LEASE_SECONDS': 300,
+    'MAX_ATTEMPTS': 5,
+    # Seconds before the first retry, doubled on every further attempt
+    'RETRY_BACKOFF': 30,
+    # Seconds a worker sleeps when no job is due
+    'POLL_INTERVAL': 5,
+}
+
+NOTIFICATION_OUTBOX = {
+    # Notifications sent per batch, their users' device tokens are loaded in one query
+    'BATCH_SIZE': 200,
+    # Seconds a claimed batch is hidden from other dispatchers
+    'LEASE_SECONDS': 120,
+    'MAX_ATTEMPTS': 8,
+    # Seconds before the first retry, doubled on every further attempt
+    'RETRY_BACKOFF': 60,
+}
+
 PLAID_API = {
     "URL": "https://sandbox.plaid.com",
     "CLIENT_ID": "5efd315f4ba6640012dc8019",
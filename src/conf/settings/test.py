@@ -35,6 +35,17 @@ CACHES = {
         "BACKEND": "django.core.cache.backends.dummy.DummyCache",
     }
 }
+# No redis in the tests, the cache tests swap 'default' for a local one
+QUERY_CACHE = dict(QUERY_CACHE, CACHE_ALIAS='default')  # noqa
+CORE_PROFILE_CACHE = dict(CORE_PROFILE_CACHE, CACHE_ALIAS='default')  # noqa
+IMPORT_SCHEDULER = dict(IMPORT_SCHEDULER, CACHE_ALIAS='default')  # noqa
+
+# Test data lives in the test transaction, other connections would not see it
+DASHBOARD = {
+    'MAX_WORKERS': 1,
+    'SERVER_TIMING': True,
+}
+PLAID_IMPORT = dict(PLAID_IMPORT, MAX_WORKERS=1)  # noqa
 
 # When using random users make sure they're created quickly
 PASSWORD_HASHERS = (
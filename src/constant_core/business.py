@@ -2,6 +2,8 @@ import json
 import logging
 from decimal import Decimal
 
+from django.conf import settings
+from django.core.cache import caches
 from django.core.serializers.json import DjangoJSONEncoder
 
 from common.business import get_now
@@ -11,6 +13,14 @@ from integration_3rdparty.const_core import ConstantCoreManagement, TransferBala
 
 
 class ConstantCoreBusiness(object):
+    # Columns of users that describe the user, balances are not part of it and always read fresh
+    PROFILE_FIELDS = (
+        'id', 'user_name', 'full_name', 'first_name', 'middle_name', 'last_name', 'email', 'dob', 'phone_number',
+        'tax_country', 'user_role_id', 'verified_level', 'account_type', 'pro_saving_user', 'agent_user', 'lo_user',
+        'language', 'white_label', 'permissions', 'membership', 'withdraw_confirmed_email_on',
+        'suspend_withdrawal_to', 'device_token',
+    )
+
     @staticmethod
     def transfer(from_user_id: int, to_user_id: int, amount: Decimal):
         from_user = User.objects.get(id=from_user_id)
@@ -69,6 +79,52 @@ class ConstantCoreBusiness(object):
     def get_users(user_ids: list):
         return User.objects.filter(id__in=user_ids)
 
+    @staticmethod
+    def get_user_profile(user_id: int):
+        """
+        User with only PROFILE_FIELDS loaded, see get_user_profiles.
+        """
+        user = ConstantCoreBusiness.get_user_profiles([user_id]).get(user_id)
+        if not user:
+            raise User.DoesNotExist
+        return user
+
+    @staticmethod
+    def get_user_profiles(user_ids: list) -> dict:
+        """
+        Users by id with only PROFILE_FIELDS loaded, from the shared cache and, for the missing ones,
+        one query on the constant database. Unknown ids are left out.
+        """
+        cache = caches[settings.CORE_PROFILE_CACHE['CACHE_ALIAS']]
+        keys = {user_id: 'core:profile:{}'.format(user_id) for user_id in set(user_ids)}
+        try:
+            cached = cache.get_many(list(keys.values()))
+        except Exception as ex:
+            # The cache is an optimization, load everything from the database when it is down
+            logging.exception(ex)
+            cached = {}
+
+        profiles = {}
+        missing = []
+        for user_id, key in keys.items():
+            if key in cached:
+                profiles[user_id] = cached[key]
+            else:
+                missing.append(user_id)
+        if missing:
+            loaded = {
+                values['id']: values
+                for values in User.objects.filter(id__in=missing).values(*ConstantCoreBusiness.PROFILE_FIELDS)
+            }
+            try:
+                cache.set_many({keys[user_id]: values for user_id, values in loaded.items()},
+                               settings.CORE_PROFILE_CACHE['TIMEOUT'])
+            except Exception as ex:
+                logging.exception(ex)
+            profiles.update(loaded)
+
+        return {user_id: User(**values) for user_id, values in profiles.items()}
+
     @staticmethod
     def get_user_by_email(email: str):
         return User.objects.filter(email=email).first()
@@ -77,9 +133,15 @@ class ConstantCoreBusiness(object):
     def get_plaid_account(plaid_id):
         return PlaidAccounts.objects.filter(id=plaid_id, deleted_at__isnull=True).first()
 
+    @staticmethod
+    def get_plaid_accounts(plaid_ids) -> dict:
+        return {obj.id: obj for obj in PlaidAccounts.objects.filter(id__in=set(plaid_ids), deleted_at__isnull=True)}
+
     @staticmethod
     def get_device_tokens(user_ids=[]):
-        device_tokens = [t for t in User.objects.filter(id__in=user_ids).values_list('device_token', flat=True) if t]
+        profiles = ConstantCoreBusiness.get_user_profiles(user_ids)
+        device_tokens = [profiles[user_id].device_token for user_id in user_ids
+                         if user_id in profiles and profiles[user_id].device_token]
         return device_tokens
 
     @staticmethod
@@ -1,24 +1,26 @@
 import hashlib
 import logging
 
-import requests
 from django.conf import settings
-from requests.adapters import HTTPAdapter
 from rest_framework.exceptions import AuthenticationFailed
-from urllib3 import Retry
+
+from common.metrics import metrics
+from common.ttl_cache import TTLCache
+from integration_3rdparty.transport import Transport
 
 
 class Client(object):
     def __init__(self, url: str, secret_key: str):
         self.url = url
         self.secret_key = secret_key
+        self.transport = Transport.for_client('const')
 
     def get_profile(self, token):
         headers = {
             'Authorization': 'Bearer {}'.format(token),
             'Accept': 'application/json'
         }
-        resp = requests.get('{}/auth/profile'.format(self.url), headers=headers, verify=False)
+        resp = self.transport.get('{}/auth/profile'.format(self.url), 'auth_profile', headers=headers, verify=False)
         if resp.status_code == 200:
             return resp.json()
         elif resp.status_code in (401, 403, 500):
@@ -32,13 +34,7 @@ class Client(object):
             'Accept': 'application/json'
         }
 
-        session = requests.Session()
-        retry = Retry(connect=2, backoff_factor=0.5)
-        adapter = HTTPAdapter(max_retries=retry)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-
-        resp = session.get('{}/auth/check'.format(self.url), headers=headers, verify=False)
+        resp = self.transport.get('{}/auth/check'.format(self.url), 'auth_check', headers=headers, verify=False)
         if resp.status_code == 200:
             return resp.json()
         elif resp.status_code in (401, 403):
@@ -51,11 +47,11 @@ class Client(object):
             'Authorization': 'Bearer {}'.format(token),
             'Accept': 'application/json',
         }
-        resp = requests.post('{}/auth/verifyOTP'.format(self.url),
-                             json={
-                                 'OTP': code,
-                             },
-                             headers=headers, verify=False)
+        resp = self.transport.post('{}/auth/verifyOTP'.format(self.url), 'auth_verify_otp',
+                                   json={
+                                       'OTP': code,
+                                   },
+                                   headers=headers, verify=False)
 
         if resp.status_code == 200:
             return resp.json()
@@ -76,8 +72,8 @@ class Client(object):
             'OTPToken': otp_token,
             'OTPPhone': otp_phone,
         }
-        resp = requests.post('{}/auth/verify-otp'.format(self.url),
-                             headers=headers, verify=False)
+        resp = self.transport.post('{}/auth/verify-otp'.format(self.url), 'auth_verify_otp_2',
+                                   headers=headers, verify=False)
 
         if resp.status_code == 200:
             return resp.json()
@@ -93,6 +89,36 @@ class Client(object):
 
 
 client = Client(settings.CONST_API['URL'], settings.CONST_API['SECRET_KEY'])
+token_cache = TTLCache(settings.TOKEN_CACHE['MAX_SIZE'])
+# Cached in place of the profile of a token the backend rejected
+_REJECTED = object()
+
+
+def cached_auth_check(token):
+    """
+    client.auth_check behind a short-lived cache keyed on the token hash, rejected tokens are
+    remembered too so that a client retrying with a bad token does not reach the backend each time.
+    """
+    key = hashlib.sha256(token.encode()).hexdigest()
+    data = token_cache.get(key)
+    if data is _REJECTED:
+        metrics.incr('auth.token_cache.negative_hit')
+        raise AuthenticationFailed
+    if data is not None:
+        metrics.incr('auth.token_cache.hit')
+        return data
+
+    metrics.incr('auth.token_cache.miss')
+    try:
+        data = client.auth_check(token)
+    except AuthenticationFailed:
+        evicted = token_cache.set(key, _REJECTED, settings.TOKEN_CACHE['NEGATIVE_TTL'])
+        metrics.incr('auth.token_cache.eviction', evicted)
+        raise
+
+    evicted = token_cache.set(key, data, settings.TOKEN_CACHE['TTL'])
+    metrics.incr('auth.token_cache.eviction', evicted)
+    return data
 
 
 class ConstantManagement(object):
@@ -110,4 +136,4 @@ class ConstantManagement(object):
 
     @staticmethod
     def auth_check(token):
-        return client.auth_check(token)
+        return cached_auth_check(token)
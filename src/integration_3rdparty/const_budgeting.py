@@ -1,22 +1,24 @@
 from decimal import Decimal
 
-import requests
 from django.conf import settings
 from rest_framework.exceptions import AuthenticationFailed
 
+from integration_3rdparty.transport import Transport
+
 
 class Client(object):
     def __init__(self, url: str, token: str):
         self.url = url
         self.token = token
+        self.transport = Transport.for_client('const_budgeting')
 
     def send_pubsub_task(self, task, message_id, data=None):
         headers = {
             'Authorization': 'Bearer {}'.format(self.token),
             'Accept': 'application/json'
         }
-        resp = requests.post('{}/budgeting-sub/task/{}/{}/'.format(self.url, task, message_id),
-                             data=data, headers=headers, verify=False, timeout=0.5)
+        resp = self.transport.post('{}/budgeting-sub/task/{}/{}/'.format(self.url, task, message_id),
+                                   'send_pubsub_task', data=data, headers=headers, verify=False)
         if resp.status_code in (200, 201):
             return resp.json()
         elif resp.status_code in (401, 403):
@@ -1,24 +1,25 @@
 import logging
 from decimal import Decimal
 
-import requests
 from django.conf import settings
 from rest_framework.exceptions import AuthenticationFailed
 
 from constant_core.models import UserTx
 from integration_3rdparty.exceptions import ConstantCoreNotEnoughBalanceException
+from integration_3rdparty.transport import Transport
 
 
 class Client(object):
     def __init__(self, url: str):
         self.url = url
+        self.transport = Transport.for_client('const_core')
 
     def get_profile(self, token):
         headers = {
             'Authorization': 'Bearer {}'.format(token),
             'Accept': 'application/json'
         }
-        resp = requests.get('{}/auth/profile'.format(self.url), headers=headers, verify=False)
+        resp = self.transport.get('{}/auth/profile'.format(self.url), 'auth_profile', headers=headers, verify=False)
         if resp.status_code == 200:
             return resp.json()
         elif resp.status_code in (401, 403):
@@ -31,11 +32,11 @@ class Client(object):
             'Authorization': 'Bearer {}'.format(token),
             'Accept': 'application/json',
         }
-        resp = requests.post('{}/auth/verifyOTP'.format(self.url),
-                             json={
-                               'OTP': code,
-                             },
-                             headers=headers, verify=False)
+        resp = self.transport.post('{}/auth/verifyOTP'.format(self.url), 'auth_verify_otp',
+                                   json={
+                                       'OTP': code,
+                                   },
+                                   headers=headers, verify=False)
 
         if resp.status_code == 200:
             return resp.json()
@@ -48,8 +49,9 @@ class Client(object):
         headers = {
             'Accept': 'application/json',
         }
-        resp = requests.get('{}/admin/check-otp?key={}&otp={}'.format(self.url, token, code),
-                            headers=headers, verify=False)
+        resp = self.transport.get('{}/admin/check-otp'.format(self.url), 'admin_check_otp',
+                                  params={'key': token, 'otp': code},
+                                  headers=headers, verify=False)
 
         if resp.status_code == 200:
             return resp.json()
@@ -65,9 +67,9 @@ class Client(object):
         body = {
             'Data': data,
         }
-        resp = requests.post(self.url + '/user/constant-balance-custom'.format(self.url),
-                             json=body,
-                             headers=headers, verify=False)
+        resp = self.transport.post('{}/user/constant-balance-custom'.format(self.url), 'update_balance',
+                                   json=body,
+                                   headers=headers, verify=False)
 
         if resp.status_code == 200:
             return resp.json()
@@ -85,9 +87,9 @@ class Client(object):
         headers = {
             'Accept': 'application/json',
         }
-        resp = requests.post('{}/reserve/purchase/{}'.format(self.url, user_id),
-                             json=data,
-                             headers=headers, timeout=10)
+        resp = self.transport.post('{}/reserve/purchase/{}'.format(self.url, user_id), 'reserve_purchase',
+                                   json=data,
+                                   headers=headers)
 
         if resp.status_code == 200:
             if resp.content:
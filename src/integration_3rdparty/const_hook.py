@@ -1,19 +1,21 @@
-import requests
 from django.conf import settings
 from rest_framework.exceptions import AuthenticationFailed
 
+from integration_3rdparty.transport import Transport
+
 
 class Client(object):
     def __init__(self, url: str):
         self.url = url
+        self.transport = Transport.for_client('const_hook')
 
     def webhook_constant(self, data):
         headers = {
             'Accept': 'application/json',
         }
-        resp = requests.post('{}/webhook/constant'.format(self.url),
-                             json=data,
-                             headers=headers)
+        resp = self.transport.post('{}/webhook/constant'.format(self.url), 'webhook_constant',
+                                   json=data,
+                                   headers=headers)
 
         if resp.status_code == 200:
             if resp.content:
@@ -29,9 +31,9 @@ class Client(object):
         headers = {
             'Accept': 'application/json',
         }
-        resp = requests.post('{}/webhook/internal/user/{}/event'.format(self.url, user_id),
-                             json=data,
-                             headers=headers)
+        resp = self.transport.post('{}/webhook/internal/user/{}/event'.format(self.url, user_id), 'send_event',
+                                   json=data,
+                                   headers=headers)
 
         if resp.status_code == 200:
             if resp.content:
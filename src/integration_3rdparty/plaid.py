@@ -7,18 +7,32 @@ client = Client(client_id=settings.PLAID_API['CLIENT_ID'],
                 environment=settings.PLAID_API['ENVIRONMENT'])
 
 
+# Largest page Plaid returns for /transactions/get
+TRANSACTION_PAGE_SIZE = 500
+
+
 class PlaidManagement(object):
     @staticmethod
-    def get_transaction(access_token: str, from_date: str, to_date: str):
-        response = client.Transactions.get(access_token, start_date=from_date, end_date=to_date)
-        transactions = response['transactions']
-        while len(transactions) < response['total_transactions']:
+    def get_transaction_pages(access_token: str, from_date: str, to_date: str):
+        """
+        Yield the transactions page by page so only one page is held in memory at a time.
+        """
+        offset = 0
+        while True:
             response = client.Transactions.get(access_token, start_date=from_date, end_date=to_date,
-                                               offset=len(transactions)
-                                               )
-            transactions.extend(response['transactions'])
+                                               count=TRANSACTION_PAGE_SIZE, offset=offset)
+            transactions = response['transactions']
+            if not transactions:
+                break
+            yield transactions
 
-        return transactions
+            offset += len(transactions)
+            if offset >= response['total_transactions']:
+                break
+
+    @staticmethod
+    def get_accounts(access_token: str) -> list:
+        return client.Accounts.get(access_token)['accounts']
 
     @staticmethod
     def get_categories():
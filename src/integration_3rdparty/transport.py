@@ -0,0 +1,70 @@
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+
+from common.metrics import metrics
+
+
+class Transport(object):
+    """
+    Long-lived pooled HTTP session of one integration client, connections are kept alive and reused.
+    Every call has a (connect, read) timeout and is measured per endpoint:
+    http.<client>.<endpoint>.latency_ms (count/sum/max) and http.<client>.<endpoint>.error.
+    """
+
+    def __init__(self, name: str, connect_timeout: float, read_timeout: float, connect_retries: int,
+                 read_retries: int, backoff_factor: float, pool_maxsize: int):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+
+        # Connect errors are retried for every method, nothing was sent yet. Read errors only for
+        # idempotent methods, a POST is never replayed.
+        retry = Retry(total=None, connect=connect_retries, read=read_retries, status=0,
+                      backoff_factor=backoff_factor, method_whitelist=Retry.DEFAULT_METHOD_WHITELIST,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @staticmethod
+    def for_client(name: str):
+        """
+        Transport configured by HTTP_TRANSPORT['default'] overridden by HTTP_TRANSPORT[name].
+        """
+        config = dict(settings.HTTP_TRANSPORT['default'])
+        config.update(settings.HTTP_TRANSPORT.get(name, {}))
+        return Transport(
+            name,
+            connect_timeout=config['CONNECT_TIMEOUT'],
+            read_timeout=config['READ_TIMEOUT'],
+            connect_retries=config['CONNECT_RETRIES'],
+            read_retries=config['READ_RETRIES'],
+            backoff_factor=config['BACKOFF_FACTOR'],
+            pool_maxsize=config['POOL_MAXSIZE'],
+        )
+
+    def request(self, method: str, url: str, endpoint: str, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        metric = 'http.{}.{}'.format(self.name, endpoint)
+        started = time.perf_counter()
+        try:
+            resp = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            metrics.incr(metric + '.error')
+            raise
+        finally:
+            metrics.observe(metric + '.latency_ms', (time.perf_counter() - started) * 1000)
+
+        if resp.status_code >= 500:
+            metrics.incr(metric + '.error')
+        return resp
+
+    def get(self, url: str, endpoint: str, **kwargs):
+        return self.request('GET', url, endpoint, **kwargs)
+
+    def post(self, url: str, endpoint: str, **kwargs):
+        return self.request('POST', url, endpoint, **kwargs)